@@ -0,0 +1,434 @@
+# ai_file_agent/analysis_store.py
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+from file_utils import extract_template
+
+logger = logging.getLogger(__name__)
+
+STORE_PATH = os.getenv("LOG_ANALYZER_STORE_PATH", "./.cache/analysis.db")
+# Rows per executemany call when ingesting entries
+BATCH_SIZE = 5000
+# A partial ingest not heard from (no batch added) for this long is taken to be dead and may be removed
+PARTIAL_LEASE_SECONDS = float(os.getenv("LOG_ANALYZER_PARTIAL_LEASE", "3600"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    content_hash TEXT NOT NULL UNIQUE,
+    file_name TEXT NOT NULL,
+    log_type TEXT,
+    entry_count INTEGER NOT NULL DEFAULT 0,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS templates (
+    id INTEGER PRIMARY KEY,
+    fingerprint TEXT NOT NULL UNIQUE,
+    template TEXT NOT NULL,
+    occurrences INTEGER NOT NULL DEFAULT 0,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS signatures (
+    id INTEGER PRIMARY KEY,
+    fingerprint TEXT NOT NULL UNIQUE,
+    template_id INTEGER NOT NULL REFERENCES templates(id),
+    level TEXT,
+    source TEXT,
+    occurrences INTEGER NOT NULL DEFAULT 0,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    first_file_id INTEGER REFERENCES files(id)
+);
+CREATE INDEX IF NOT EXISTS idx_signatures_first_seen ON signatures(first_seen);
+CREATE TABLE IF NOT EXISTS entries (
+    file_id INTEGER NOT NULL REFERENCES files(id),
+    seq INTEGER NOT NULL,
+    signature_id INTEGER NOT NULL REFERENCES signatures(id),
+    timestamp TEXT,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (file_id, seq)
+);
+CREATE INDEX IF NOT EXISTS idx_entries_signature ON entries(signature_id);
+CREATE TABLE IF NOT EXISTS summaries (
+    signature_id INTEGER PRIMARY KEY REFERENCES signatures(id),
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+
+def _fingerprint(*parts: str) -> str:
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()[:32]
+
+
+def entry_signature(entry: Union[Dict[str, str], str]) -> Tuple[str, str, str, str]:
+    """
+    Returns (signature fingerprint, template, level, source) of a normalized
+    entry. Entries with the same level, source and message template share a
+    signature and therefore one LLM summary.
+    """
+    template = extract_template(entry)
+    if isinstance(entry, dict):
+        level = str(entry.get("level") or entry.get("log_level") or "")
+        source = str(entry.get("source") or entry.get("module") or entry.get("service") or "")
+    else:
+        level = source = ""
+    return _fingerprint(level, source, template), template, level, source
+
+
+class IngestResult:
+    def __init__(self, file_id: int, already_ingested: bool, signatures: List[str], new_signatures: List[str]):
+        self.file_id = file_id
+        self.already_ingested = already_ingested
+        self.signatures = signatures          # per entry, in input order
+        self.new_signatures = new_signatures  # first seen in this file, in order of first appearance
+
+
+class AnalysisStore:
+    """
+    Persistent record of every analyzed file, its entries, their templates
+    and signatures, and one summary per signature.
+
+    It is what lets a new upload be compared with earlier ones: signatures
+    carry first/last-seen times and occurrence counts, and a signature that
+    already has a summary is never sent to the LLM again.
+    """
+
+    def __init__(self, db_path: str = STORE_PATH):
+        self.db_path = db_path
+        parent = os.path.dirname(db_path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        conn = self._connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def ingest(self, content_hash: str, file_name: str, log_type: Optional[str],
+               entries: List[Union[Dict[str, str], str]], timestamps: Optional[List[Optional[str]]] = None,
+               seen_at: Optional[float] = None) -> IngestResult:
+        """
+        Records one analyzed file.
+
+        Template and signature counters are upserted once per distinct value
+        (not per entry) and entries are inserted in batches. Ingesting content
+        that is already stored (a rerun, or the same file uploaded again) only
+        refreshes the file's `last_seen`, so occurrences are never counted twice.
+
+        Parameters:
+        - content_hash: Hash identifying the file content (e.g. the pipeline's read key).
+        - file_name: Name shown for the file.
+        - log_type: Detected log format.
+        - entries: Normalized entries.
+        - timestamps: Optional timestamp string per entry.
+        - seen_at: Epoch seconds to record; defaults to now.
+
+        Returns:
+        - IngestResult with each entry's signature and the signatures never seen before.
+        """
+        described = [entry_signature(entry) for entry in entries]
+        signatures = [d[0] for d in described]
+        ingest = self.begin_ingest(content_hash, file_name, log_type, seen_at)
+        if ingest.already_ingested:
+            return IngestResult(ingest.file_id, True, signatures, [])
+        try:
+            for start in range(0, len(entries), BATCH_SIZE):
+                ingest.add(entries[start:start + BATCH_SIZE], described[start:start + BATCH_SIZE],
+                           timestamps[start:start + BATCH_SIZE] if timestamps is not None else None)
+            result = ingest.finish()
+        except BaseException:
+            ingest.abort()
+            raise
+        result.signatures = signatures
+        return result
+
+    def begin_ingest(self, content_hash: str, file_name: str, log_type: Optional[str],
+                     seen_at: Optional[float] = None) -> "FileIngest":
+        """Starts recording a file whose entries arrive in batches (see FileIngest)."""
+        return FileIngest(self, content_hash, file_name, log_type, seen_at)
+
+    @staticmethod
+    def _ids(conn: sqlite3.Connection, table: str, fingerprints: List[str]) -> Dict[str, int]:
+        """Maps fingerprints to row ids, querying in chunks below SQLite's variable limit."""
+        ids: Dict[str, int] = {}
+        for start in range(0, len(fingerprints), 500):
+            chunk = fingerprints[start:start + 500]
+            placeholders = ",".join("?" * len(chunk))
+            for row in conn.execute(
+                f"SELECT fingerprint, id FROM {table} WHERE fingerprint IN ({placeholders})", chunk
+            ):
+                ids[row["fingerprint"]] = row["id"]
+        return ids
+
+    def summaries(self, signatures: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Stored summaries of the given signatures (missing ones are left out)."""
+        wanted = list(dict.fromkeys(signatures))
+        found: Dict[str, Dict[str, Any]] = {}
+        with self._connection() as conn:
+            for start in range(0, len(wanted), 500):
+                chunk = wanted[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for row in conn.execute(
+                    "SELECT s.fingerprint, m.payload FROM summaries m JOIN signatures s ON s.id = m.signature_id "
+                    f"WHERE s.fingerprint IN ({placeholders})", chunk
+                ):
+                    found[row["fingerprint"]] = json.loads(row["payload"])
+        return found
+
+    def save_summaries(self, summaries: Dict[str, Dict[str, Any]]) -> None:
+        """Stores summaries by signature fingerprint, in one transaction."""
+        if not summaries:
+            return
+        now = time.time()
+        with self._transaction() as conn:
+            ids = self._ids(conn, "signatures", list(summaries))
+            conn.executemany(
+                "INSERT OR REPLACE INTO summaries (signature_id, payload, created_at) VALUES (?, ?, ?)",
+                [(ids[fp], json.dumps(summary, ensure_ascii=False, default=str), now)
+                 for fp, summary in summaries.items() if fp in ids],
+            )
+
+    def summary_version(self) -> Tuple[int, float]:
+        """(number of summaries, time of the latest one): changes whenever a summary is stored."""
+        with self._connection() as conn:
+            row = conn.execute("SELECT COUNT(*), COALESCE(MAX(created_at), 0) FROM summaries").fetchone()
+        return row[0], row[1]
+
+    def summary_documents(self) -> Iterable[Tuple[str, str, str, str, Dict[str, Any]]]:
+        """(fingerprint, template, level, source, summary) of every stored summary."""
+        with self._connection() as conn:
+            for row in conn.execute(
+                "SELECT s.fingerprint, t.template, s.level, s.source, m.payload FROM summaries m "
+                "JOIN signatures s ON s.id = m.signature_id JOIN templates t ON t.id = s.template_id"
+            ):
+                yield row["fingerprint"], row["template"], row["level"] or "", row["source"] or "", \
+                    json.loads(row["payload"])
+
+    def new_since(self, since: float, limit: int = 1000) -> List[Dict[str, Any]]:
+        """Signatures first seen at or after `since` (e.g. the last deploy), newest first."""
+        with self._connection() as conn:
+            rows = conn.execute(
+                "SELECT s.fingerprint, t.template, s.level, s.source, s.occurrences, s.first_seen, "
+                "s.last_seen, f.file_name AS first_file FROM signatures s "
+                "JOIN templates t ON t.id = s.template_id LEFT JOIN files f ON f.id = s.first_file_id "
+                "WHERE s.first_seen >= ? AND s.occurrences > 0 ORDER BY s.first_seen DESC, s.occurrences DESC LIMIT ?",
+                (since, limit),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def signature_stats(self, signatures: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Occurrences and first/last-seen times of the given signatures."""
+        wanted = list(dict.fromkeys(signatures))
+        stats: Dict[str, Dict[str, Any]] = {}
+        with self._connection() as conn:
+            for start in range(0, len(wanted), 500):
+                chunk = wanted[start:start + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for row in conn.execute(
+                    "SELECT fingerprint, occurrences, first_seen, last_seen FROM signatures "
+                    f"WHERE fingerprint IN ({placeholders})", chunk
+                ):
+                    stats[row["fingerprint"]] = dict(row)
+        return stats
+
+
+# Marks the file row of an ingest that has not finished (or whose process died),
+# followed by the ingest's own id so concurrent ingests of one content never share a row
+_PARTIAL_SUFFIX = ":partial:"
+
+
+class FileIngest:
+    """
+    Records one file whose entries arrive in batches, e.g. from a streaming
+    pipeline, so they never have to be held in memory together.
+
+    Each `add` is its own short transaction, so other writers are not locked
+    out for the length of an upload. Until `finish`, the file row is marked
+    partial and new templates and signatures are stored with zero
+    occurrences; `finish` adds the counts and unmarks the file in one
+    transaction. Each ingest has its own partial row, so concurrent ingests
+    of the same content do not disturb each other: the first to finish
+    counts, the others drop their rows. A partial row whose ingest has not
+    added a batch for PARTIAL_LEASE_SECONDS (left behind by a crash) is
+    removed by the next ingest of the same content.
+    """
+
+    def __init__(self, store: AnalysisStore, content_hash: str, file_name: str, log_type: Optional[str],
+                 seen_at: Optional[float] = None):
+        self.store = store
+        self.content_hash = content_hash
+        self.now = seen_at if seen_at is not None else time.time()
+        self.entry_count = 0
+        self.new_signatures: List[str] = []
+        self._template_ids: Dict[str, int] = {}
+        self._signature_ids: Dict[str, int] = {}
+        self._template_counts: Counter = Counter()
+        self._signature_counts: Counter = Counter()
+
+        with store._transaction() as conn:
+            row = conn.execute("SELECT id FROM files WHERE content_hash = ?", (content_hash,)).fetchone()
+            self.already_ingested = row is not None
+            if self.already_ingested:
+                conn.execute("UPDATE files SET last_seen = ? WHERE id = ?", (self.now, row["id"]))
+                self.file_id = row["id"]
+                return
+            # The partial row's last_seen is its ingest's heartbeat (wall time, refreshed by `add`)
+            stale = conn.execute(
+                "SELECT id FROM files WHERE substr(content_hash, 1, ?) = ? AND last_seen < ?",
+                (len(content_hash) + len(_PARTIAL_SUFFIX), content_hash + _PARTIAL_SUFFIX,
+                 time.time() - PARTIAL_LEASE_SECONDS),
+            ).fetchall()
+            for row in stale:
+                self._delete_partial(conn, row["id"])
+            self.file_id = conn.execute(
+                "INSERT INTO files (content_hash, file_name, log_type, entry_count, first_seen, last_seen) "
+                "VALUES (?, ?, ?, 0, ?, ?)",
+                (content_hash + _PARTIAL_SUFFIX + uuid.uuid4().hex, file_name, log_type, self.now, time.time()),
+            ).lastrowid
+
+    @staticmethod
+    def _delete_partial(conn: sqlite3.Connection, file_id: int) -> None:
+        conn.execute("DELETE FROM entries WHERE file_id = ?", (file_id,))
+        conn.execute("UPDATE signatures SET first_file_id = NULL WHERE first_file_id = ?", (file_id,))
+        conn.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def add(self, entries: List[Union[Dict[str, str], str]],
+            described: Optional[List[Tuple[str, str, str, str]]] = None,
+            timestamps: Optional[List[Optional[str]]] = None) -> None:
+        """
+        Stores a batch of entries. `described` (their `entry_signature`s) is
+        computed here unless the caller already has it.
+        """
+        if self.already_ingested:
+            return
+        if described is None:
+            described = [entry_signature(entry) for entry in entries]
+        now = self.now
+
+        template_fps = [_fingerprint(d[1]) for d in described]
+
+        with self.store._transaction() as conn:
+            templates = {fp: d[1] for fp, d in zip(template_fps, described) if fp not in self._template_ids}
+            if templates:
+                conn.executemany(
+                    "INSERT INTO templates (fingerprint, template, occurrences, first_seen, last_seen) "
+                    "VALUES (?, ?, 0, ?, ?) ON CONFLICT(fingerprint) DO NOTHING",
+                    [(fp, template, now, now) for fp, template in templates.items()],
+                )
+                self._template_ids.update(AnalysisStore._ids(conn, "templates", list(templates)))
+
+            first_of: Dict[str, Tuple[str, str, str]] = {}
+            for template_fp, (fingerprint, _, level, source) in zip(template_fps, described):
+                if fingerprint not in self._signature_ids:
+                    first_of.setdefault(fingerprint, (template_fp, level, source))
+            if first_of:
+                # Signatures that exist with zero occurrences were only ever part of unfinished ingests
+                for start in range(0, len(first_of), 500):
+                    chunk = list(first_of)[start:start + 500]
+                    placeholders = ",".join("?" * len(chunk))
+                    counted = {row["fingerprint"] for row in conn.execute(
+                        f"SELECT fingerprint FROM signatures WHERE occurrences > 0 AND fingerprint IN ({placeholders})",
+                        chunk,
+                    )}
+                    self.new_signatures.extend(fp for fp in chunk if fp not in counted)
+                conn.executemany(
+                    "INSERT INTO signatures (fingerprint, template_id, level, source, occurrences, "
+                    "first_seen, last_seen, first_file_id) VALUES (?, ?, ?, ?, 0, ?, ?, ?) "
+                    "ON CONFLICT(fingerprint) DO NOTHING",
+                    [(fp, self._template_ids[template_fp], level, source, now, now, self.file_id)
+                     for fp, (template_fp, level, source) in first_of.items()],
+                )
+                self._signature_ids.update(AnalysisStore._ids(conn, "signatures", list(first_of)))
+
+            conn.execute("UPDATE files SET last_seen = ? WHERE id = ?", (time.time(), self.file_id))
+            conn.executemany(
+                "INSERT INTO entries VALUES (?, ?, ?, ?, ?)",
+                [(self.file_id, self.entry_count + offset, self._signature_ids[d[0]],
+                  timestamps[offset] if timestamps is not None else None,
+                  json.dumps(entry, ensure_ascii=False, default=str))
+                 for offset, (entry, d) in enumerate(zip(entries, described))],
+            )
+
+        self._template_counts.update(template_fps)
+        self._signature_counts.update(d[0] for d in described)
+        self.entry_count += len(entries)
+
+    def finish(self) -> IngestResult:
+        """Adds this file's occurrence counts and marks it complete; returns what was new."""
+        if self.already_ingested:
+            return IngestResult(self.file_id, True, [], [])
+        now = self.now
+        with self.store._transaction() as conn:
+            try:
+                completed = conn.execute(
+                    "UPDATE files SET content_hash = ?, entry_count = ?, last_seen = ? WHERE id = ?",
+                    (self.content_hash, self.entry_count, now, self.file_id)).rowcount
+            except sqlite3.IntegrityError:
+                completed = 0
+            if not completed:
+                # A concurrent ingest of the same content got there first; it did the counting
+                logger.warning(f"Ingest of {self.content_hash[:12]} was superseded; not counting it twice")
+                self._delete_partial(conn, self.file_id)
+                return IngestResult(self.file_id, True, [], [])
+            conn.executemany(
+                "UPDATE signatures SET first_seen = ?, first_file_id = ? WHERE id = ? AND occurrences = 0",
+                [(now, self.file_id, self._signature_ids[fp]) for fp in self.new_signatures],
+            )
+            conn.executemany(
+                "UPDATE templates SET occurrences = occurrences + ?, last_seen = ? WHERE id = ?",
+                [(count, now, self._template_ids[fp]) for fp, count in self._template_counts.items()],
+            )
+            conn.executemany(
+                "UPDATE signatures SET occurrences = occurrences + ?, last_seen = ? WHERE id = ?",
+                [(count, now, self._signature_ids[fp]) for fp, count in self._signature_counts.items()],
+            )
+
+        logger.info(f"Stored {self.content_hash[:12]}: {self.entry_count} entries, "
+                    f"{len(self._signature_counts)} signatures ({len(self.new_signatures)} new)")
+        # Per-entry signatures are not kept here; `AnalysisStore.ingest` fills them in
+        return IngestResult(self.file_id, False, [], self.new_signatures)
+
+    def abort(self) -> None:
+        """Drops what was stored so far (a later ingest of the same content would do it once the lease expires)."""
+        if self.already_ingested:
+            return
+        try:
+            with self.store._transaction() as conn:
+                self._delete_partial(conn, self.file_id)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not remove partial ingest of {self.content_hash[:12]}: {e}")
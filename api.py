@@ -0,0 +1,242 @@
+# ai_file_agent/api.py
+
+import asyncio
+import io
+import json
+import logging
+import os
+import tempfile
+import time
+from typing import IO, Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+
+from file_utils import (
+    STREAM_SAMPLE_BYTES,
+    LogEntryAssembler,
+    detect_stream_format,
+    extract_template,
+)
+from metrics import REGISTRY, record_wait, track
+from pipeline import STAGE_CACHE_DIR, LogPipeline, StageCache, is_failed_summary
+
+logger = logging.getLogger(__name__)
+
+# Analyses running at once in this process; extra requests get a 503 so the load balancer retries elsewhere
+MAX_CONCURRENT_REQUESTS = int(os.getenv("LOG_API_MAX_CONCURRENT_REQUESTS", "4"))
+# LLM calls in flight per request
+MAX_LLM_CALLS_PER_REQUEST = int(os.getenv("LOG_API_MAX_LLM_CALLS", "4"))
+MAX_UPLOAD_BYTES = int(os.getenv("LOG_API_MAX_UPLOAD_BYTES", str(1024 * 1024 * 1024)))
+# Distinct templates tracked per request; the rest are counted under OVERFLOW_TEMPLATE
+MAX_CLUSTERS = int(os.getenv("LOG_API_MAX_CLUSTERS", "5000"))
+OVERFLOW_TEMPLATE = "<other>"
+# Uploads up to this size are spooled in memory, larger ones to a temporary file
+SPOOL_MEMORY_BYTES = int(os.getenv("LOG_API_SPOOL_MEMORY_BYTES", str(8 * 1024 * 1024)))
+
+app = FastAPI(title="AI Log Analyzer API")
+
+_request_slots = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+_stage_cache = StageCache(disk_dir=STAGE_CACHE_DIR)
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class RequestSlot:
+    """
+    One acquired request slot and the spooled upload it holds. Released by
+    the response stream when it ends and again, as a safety net, by the
+    response background task; only the first release counts.
+    """
+
+    def __init__(self):
+        self._released = False
+        self.upload: Optional[IO[bytes]] = None
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            if self.upload is not None:
+                self.upload.close()
+            _request_slots.release()
+
+
+async def spool_request(request: Request) -> IO[bytes]:
+    """
+    Reads the whole request body (chunked uploads included) into a spooled
+    temporary file, rewound for reading.
+
+    The body has to be consumed before the StreamingResponse starts: the
+    response listens for the client disconnecting on the same `receive`
+    channel, and would swallow the body messages the upload still needs.
+
+    Raises:
+    - UploadTooLarge: If the body exceeds MAX_UPLOAD_BYTES.
+    """
+    upload = tempfile.SpooledTemporaryFile(max_size=SPOOL_MEMORY_BYTES)
+    received = 0
+    try:
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > MAX_UPLOAD_BYTES:
+                raise UploadTooLarge(f"Upload exceeds {MAX_UPLOAD_BYTES} bytes.")
+            upload.write(chunk)
+    except BaseException:
+        upload.close()
+        raise
+    upload.seek(0)
+    return upload
+
+
+def _read_head(lines: IO[str]) -> Tuple[List[str], str]:
+    """Reads just enough of the upload to pick the format: (head lines, head text)."""
+    head: List[str] = []
+    head_size = 0
+    for line in lines:
+        head.append(line)
+        head_size += len(line)
+        if head_size >= STREAM_SAMPLE_BYTES:
+            break
+    return head, "".join(head)
+
+
+def _format_event(event: str, data: Dict[str, Any], stream_format: str) -> str:
+    payload = json.dumps(data, ensure_ascii=False, default=str)
+    if stream_format == "sse":
+        return f"event: {event}\ndata: {payload}\n\n"
+    return json.dumps({"type": event, **data}, ensure_ascii=False, default=str) + "\n"
+
+
+async def analyze_stream(stream_format: str, summarize: bool, slot: RequestSlot) -> AsyncIterator[str]:
+    """
+    Normalizes the spooled upload in a worker thread, clusters entries by
+    template, then summarizes one example per cluster and streams each
+    cluster result as soon as its summary resolves.
+    """
+    try:
+        # Undecodable bytes are dropped, line endings kept for the assembler
+        lines = io.TextIOWrapper(slot.upload, encoding="utf-8", errors="ignore", newline="")
+        head, head_text = await run_in_threadpool(_read_head, lines)
+        log_type, pattern, structured = await run_in_threadpool(detect_stream_format, head_text)
+        yield _format_event("format", {"log_type": log_type, "pattern": pattern, "structured": structured},
+                            stream_format)
+
+        assembler = LogEntryAssembler(pattern, structured)
+        clusters: Dict[str, Dict[str, Any]] = {}
+        total = 0
+
+        def add(entries: List[Any]) -> None:
+            nonlocal total
+            for entry in entries:
+                total += 1
+                template = extract_template(entry)
+                if template not in clusters and len(clusters) >= MAX_CLUSTERS:
+                    template = OVERFLOW_TEMPLATE
+                cluster = clusters.get(template)
+                if cluster is None:
+                    clusters[template] = {"template": template, "count": 1, "first_seq": total, "example": entry}
+                else:
+                    cluster["count"] += 1
+
+        def normalize() -> int:
+            # Runs in a worker thread, so parsing a large upload never stalls the event loop
+            size = 0
+            for line in head:
+                size += len(line)
+                add(assembler.feed(line))
+            for line in lines:
+                size += len(line)
+                add(assembler.feed(line))
+            add(assembler.flush())
+            return size
+
+        with track("api.normalize") as measurement:
+            measurement.bytes = await run_in_threadpool(normalize)
+            measurement.entries = total
+
+        ordered = sorted(clusters.values(), key=lambda c: c["count"], reverse=True)
+        yield _format_event("normalized", {"entries": total, "clusters": len(ordered)}, stream_format)
+
+        if not summarize:
+            for idx, cluster in enumerate(ordered, start=1):
+                yield _format_event("cluster", {"rank": idx, **cluster}, stream_format)
+        else:
+            pipeline = LogPipeline(_stage_cache)
+            llm_slots = asyncio.Semaphore(MAX_LLM_CALLS_PER_REQUEST)
+
+            async def summarize_cluster(rank: int, cluster: Dict[str, Any]) -> Dict[str, Any]:
+                waiting_since = time.perf_counter()
+                async with llm_slots:
+                    record_wait("api_llm_slots", time.perf_counter() - waiting_since)
+                    summaries = await run_in_threadpool(pipeline.summarize, cluster["example"])
+                return {"rank": rank, **cluster, "summary": summaries[0],
+                        "failed": is_failed_summary(summaries[0])}
+
+            tasks = [asyncio.create_task(summarize_cluster(idx, cluster))
+                     for idx, cluster in enumerate(ordered, start=1)]
+            try:
+                for finished in asyncio.as_completed(tasks):
+                    yield _format_event("cluster", await finished, stream_format)
+            finally:
+                # Client went away: stop paying for summaries nobody will read
+                for task in tasks:
+                    task.cancel()
+
+        yield _format_event("done", {"entries": total, "clusters": len(ordered)}, stream_format)
+
+    except ValueError as e:
+        yield _format_event("error", {"error": str(e)}, stream_format)
+    finally:
+        slot.release()
+
+
+@app.post("/analyze")
+async def analyze(
+    request: Request,
+    stream_format: str = Query("ndjson", alias="format", pattern="^(ndjson|sse)$",
+                               description="Response framing."),
+    summarize: bool = Query(True, description="Summarize one example per cluster with the LLM."),
+):
+    """
+    Accepts a raw (optionally chunked) log upload as the request body and
+    streams per-cluster results back as NDJSON or server-sent events.
+    """
+    if _request_slots.locked():
+        raise HTTPException(status_code=503, detail="Analyzer is at capacity, retry later.",
+                            headers={"Retry-After": "5"})
+    await _request_slots.acquire()
+    slot = RequestSlot()
+    try:
+        slot.upload = await spool_request(request)
+    except UploadTooLarge as e:
+        slot.release()
+        raise HTTPException(status_code=413, detail=str(e))
+    except BaseException:
+        # ClientDisconnect included: nobody is left to answer
+        slot.release()
+        raise
+
+    media_type = "text/event-stream" if stream_format == "sse" else "application/x-ndjson"
+    return StreamingResponse(analyze_stream(stream_format, summarize, slot), media_type=media_type,
+                             background=BackgroundTask(slot.release))
+
+
+@app.get("/healthz")
+async def healthz() -> Dict[str, Any]:
+    return {"status": "ok", "max_concurrent_requests": MAX_CONCURRENT_REQUESTS, "busy": _request_slots.locked()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> str:
+    """Per-stage timings, sizes and queue waits in the Prometheus text format."""
+    return PlainTextResponse(REGISTRY.render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host=os.getenv("LOG_API_HOST", "0.0.0.0"), port=int(os.getenv("LOG_API_PORT", "8000")))
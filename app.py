@@ -7,10 +7,15 @@ from langchain.chat_models import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from fpdf import FPDF
 from io import BytesIO
-from diskcache import Cache
 
-# Setup persistent cache
-cache = Cache("./.cache")
+from pipeline import STAGE_CACHE_DIR, StageCache, content_hash
+
+
+# One cache per server process, shared on disk with the other processes; sessions asking for
+# the same summary at the same time wait for a single LLM call
+@st.cache_resource
+def get_summary_cache():
+    return StageCache(disk_dir=STAGE_CACHE_DIR)
 
 # Define regex patterns for different log types
 LOG_PATTERNS = {
@@ -55,22 +60,15 @@ def extract_unique_entries(content, log_type):
 async def summarize_logs(log_entries):
     llm = ChatOpenAI(model="gpt-4", temperature=0)
     prompt = ChatPromptTemplate.from_template("Summarize this log entry:\n{log}")
+    chain = prompt | llm
+    cache = get_summary_cache()
 
-    tasks = []
-    for entry in log_entries:
-        cached = cache.get(entry)
-        if cached:
-            tasks.append(asyncio.sleep(0, result=cached))  # simulate coroutine
-        else:
-            chain = prompt | llm
-            tasks.append(chain.ainvoke({"log": entry}))
-
-    results = await asyncio.gather(*tasks)
-
-    for i, entry in enumerate(log_entries):
-        cache[entry] = results[i].content if hasattr(results[i], "content") else results[i]
+    def summarize(entry):
+        key = content_hash("app.summary", entry)
+        _, summary = cache.get_or_compute(key, lambda: chain.invoke({"log": entry}).content, persist=True)
+        return summary
 
-    return [r.content if hasattr(r, "content") else r for r in results]
+    return await asyncio.gather(*(asyncio.to_thread(summarize, entry) for entry in log_entries))
 
 # Export to Excel
 def export_excel(df):
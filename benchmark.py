@@ -0,0 +1,370 @@
+# ai_file_agent/benchmark.py
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from log_generator import FORMATS, cached_log, parse_size
+
+logger = logging.getLogger(__name__)
+
+BASELINE_PATH = os.getenv("LOG_ANALYZER_BENCH_BASELINE", "benchmark_baseline.json")
+BENCH_DIR = os.getenv("LOG_ANALYZER_BENCH_DIR", "./.cache/bench")
+STAGES = ("read", "detect", "chunk", "normalize", "convert", "export")
+# convert_content_binary_json only understands Laravel logs (on other formats it backtracks for minutes)
+STAGE_FORMATS = {"convert": ("laravel",)}
+# A stage regresses when throughput drops, or peak memory grows, by more than this fraction
+DEFAULT_TOLERANCE = 0.2
+# `import main` may take this much longer than `import streamlit` alone
+STARTUP_BUDGET_SECONDS = float(os.getenv("LOG_ANALYZER_STARTUP_BUDGET", "0.5"))
+# Modules the app must not import before the user has uploaded something
+DEFERRED_MODULES = ("langchain", "langchain_core", "langchain_openai", "langsmith", "openai",
+                    "pandas", "numpy", "pyarrow", "openpyxl", "fpdf")
+
+
+def _rss_mb() -> float:
+    """Current resident set size in MB (Linux /proc; falls back to the peak elsewhere)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        return _peak_rss_mb()
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in KB on Linux
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+
+def _stage(stage: str, path: str) -> Tuple[Callable[[], int], Dict[str, Any]]:
+    """
+    Returns (work, context) for one stage. Setup (loading the input the stage
+    works on) happens here, outside the timed and memory-measured part.
+    `work()` returns the number of items it produced.
+    """
+    from file_utils import (
+        STREAM_SAMPLE_BYTES,
+        chunk_content_defined,
+        detect_log_format,
+        detect_log_type,
+        detect_stream_format,
+        iter_normalized_entries,
+        open_log_stream,
+        read_log_file,
+    )
+
+    if stage == "read":
+        return lambda: len(read_log_file(path)), {}
+
+    if stage == "detect":
+        def detect() -> int:
+            detect_log_type(path)
+            with open_log_stream(path) as stream:
+                detect_stream_format(stream.read(STREAM_SAMPLE_BYTES))
+            return 1
+        return detect, {}
+
+    if stage == "chunk":
+        content = read_log_file(path)
+        _, boundary = detect_log_format(content[:STREAM_SAMPLE_BYTES])
+        return lambda: len(chunk_content_defined(content, boundary_pattern=boundary)), {}
+
+    if stage == "normalize":
+        def normalize() -> int:
+            with open_log_stream(path) as stream:
+                _, pattern, structured = detect_stream_format(stream.read(STREAM_SAMPLE_BYTES))
+                stream.seek(0)
+                return sum(1 for _ in iter_normalized_entries(stream, pattern, structured))
+        return normalize, {}
+
+    if stage == "convert":
+        from upload_convert_file import convert_content_binary_json
+        content = read_log_file(path)
+        return lambda: len(convert_content_binary_json(content)), {"quiet": True}
+
+    if stage == "export":
+        from export_sinks import NDJSONSink
+        with open_log_stream(path) as stream:
+            _, pattern, structured = detect_stream_format(stream.read(STREAM_SAMPLE_BYTES))
+            stream.seek(0)
+            entries = [{"entry": entry} for entry in iter_normalized_entries(stream, pattern, structured)]
+        output = os.path.join(tempfile.mkdtemp(prefix="bench-"), "export.ndjson")
+
+        def export() -> int:
+            with NDJSONSink(output) as sink:
+                count = sink.write_many(entries)
+            os.remove(output)
+            return count
+        return export, {}
+
+    raise ValueError(f"Unknown stage: {stage}")
+
+
+def _measure(stage: str, path: str) -> Dict[str, Any]:
+    """Runs one stage in this (fresh) process and reports time and memory."""
+    import contextlib
+    import io
+
+    logging.disable(logging.WARNING)
+    work, context = _stage(stage, path)
+    before_mb = _rss_mb()
+    start = time.perf_counter()
+    # Some stages print per call; keep that out of the measurement and the output
+    with contextlib.redirect_stdout(io.StringIO()) if context.get("quiet") else contextlib.nullcontext():
+        items = work()
+    seconds = time.perf_counter() - start
+    return {"seconds": seconds, "items": items, "peak_mb": round(max(0.0, _peak_rss_mb() - before_mb), 1)}
+
+
+def run_stage(stage: str, path: str, repeat: int = 1) -> Dict[str, Any]:
+    """
+    Measures a stage in a fresh spawned process per repetition, so peak
+    memory is the stage's own. Keeps the fastest time and the highest peak.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    runs = []
+    for _ in range(repeat):
+        with ctx.Pool(1) as pool:
+            runs.append(pool.apply(_measure, (stage, path)))
+    size_mb = os.path.getsize(path) / 2 ** 20
+    best = min(run["seconds"] for run in runs)
+    return {
+        "seconds": round(best, 4),
+        "mb_per_s": round(size_mb / best, 2) if best else None,
+        "items": runs[0]["items"],
+        "peak_mb": max(run["peak_mb"] for run in runs),
+    }
+
+
+def run_benchmarks(formats: List[str], sizes: List[str], stages: List[str], seed: int = 0,
+                   repeat: int = 1) -> Dict[str, Dict[str, Any]]:
+    """Returns results keyed by ``format/size/stage``."""
+    results: Dict[str, Dict[str, Any]] = {}
+    for log_format in formats:
+        for size in sizes:
+            path = cached_log(log_format, parse_size(size), seed, BENCH_DIR)
+            for stage in stages:
+                if log_format not in STAGE_FORMATS.get(stage, FORMATS):
+                    continue
+                key = f"{log_format}/{size}/{stage}"
+                try:
+                    results[key] = run_stage(stage, path, repeat)
+                except Exception as e:
+                    logger.error(f"{key} failed: {e}")
+                    results[key] = {"error": str(e)}
+                print(f"{key:<32} {_describe(results[key])}", file=sys.stderr)
+    return results
+
+
+# Named-group patterns parsed line by line in the parser comparison: the registered MySQL layout,
+# and field-per-token layouts of the kind learned for the other formats
+PARSER_PATTERNS = {
+    "laravel": r"(?P<date>\S+) (?P<time>\S+) (?P<channel>\S+) (?P<message>.*)",
+    "apache": r"(?P<weekday>\S+) (?P<month>\S+) (?P<day>\S+) (?P<time>\S+) (?P<year>\S+) (?P<module>\S+) (?P<message>.*)",
+    "mysql": None,  # log_type.LOG_PATTERNS["Mysql"]
+    "asterisk": r"(?P<date>\S+) (?P<time>\S+) (?P<level>\S+) (?P<source>\S+) (?P<message>.*)",
+    "nginx": r"(?P<date>\S+) (?P<time>\S+) (?P<level>\S+) (?P<pid>\S+) (?P<message>.*)",
+    "syslog": r"(?P<month>\S+) (?P<day>\S+) (?P<time>\S+) (?P<host>\S+) (?P<process>\S+) (?P<message>.*)",
+}
+
+
+def compare_parsers(formats: List[str], size: str, seed: int = 0, repeat: int = 3) -> Dict[str, Dict[str, Any]]:
+    """
+    Times `match().groupdict()` per line against the parser `compile_layout`
+    builds for each format's PARSER_PATTERNS entry (as rows and as dicts),
+    after checking that both give the same entries. Fastest of `repeat` runs.
+    """
+    from layout_parser import compile_layout
+    from log_type import LOG_PATTERNS as REGISTERED_PATTERNS
+
+    def best(work: Callable[[], Any]) -> float:
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            work()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for log_format in formats:
+        pattern = PARSER_PATTERNS.get(log_format) or REGISTERED_PATTERNS["Mysql"]
+        path = cached_log(log_format, parse_size(size), seed, BENCH_DIR)
+        with open(path, encoding="utf-8", errors="ignore") as f:
+            lines = [line.rstrip("\r\n") for line in f]
+        regex = re.compile(pattern)
+        parser = compile_layout(pattern)
+
+        # Loop values are bound as defaults, so each callable times this format's parser and lines
+        def with_regex(regex=regex, lines=lines) -> List[Dict[str, Any]]:
+            return [match.groupdict() for match in map(regex.match, lines) if match]
+
+        def with_parser_rows(parser=parser, lines=lines) -> List[tuple]:
+            return parser.parse_lines(lines)
+
+        def with_parser_dicts(parser=parser, lines=lines) -> List[Dict[str, Any]]:
+            return parser.parse_dicts(lines)
+
+        expected = with_regex()
+        if with_parser_dicts() != expected:
+            raise AssertionError(f"{log_format}: the {parser.kind} parser disagrees with the regex")
+        regex_seconds = best(with_regex)
+        rows_seconds = best(with_parser_rows)
+        dicts_seconds = best(with_parser_dicts)
+        key = f"{log_format}/{size}/parse"
+        results[key] = {
+            "kind": parser.kind, "entries": len(expected),
+            "regex_seconds": round(regex_seconds, 4), "rows_seconds": round(rows_seconds, 4),
+            "dicts_seconds": round(dicts_seconds, 4),
+            "rows_speedup": round(regex_seconds / rows_seconds, 2) if rows_seconds else None,
+            "dicts_speedup": round(regex_seconds / dicts_seconds, 2) if dicts_seconds else None,
+        }
+        result = results[key]
+        print(f"{key:<24} {parser.kind:<6} {result['entries']:>9} entries  groupdict {regex_seconds:>7.3f}s  "
+              f"rows {rows_seconds:>7.3f}s (x{result['rows_speedup']})  "
+              f"dicts {dicts_seconds:>7.3f}s (x{result['dicts_speedup']})", file=sys.stderr)
+    return results
+
+
+def _describe(result: Dict[str, Any]) -> str:
+    if "error" in result:
+        return f"ERROR {result['error']}"
+    return (f"{result['seconds']:>9.3f}s {result['mb_per_s'] or 0:>9.2f} MB/s "
+            f"{result['items']:>10} items {result['peak_mb']:>9.1f} MB peak")
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+            tolerance: float = DEFAULT_TOLERANCE) -> List[str]:
+    """Returns a description of every stage slower or hungrier than the baseline by more than `tolerance`."""
+    regressions = []
+    for key, result in results.items():
+        previous = baseline.get(key)
+        if not previous or "error" in result or "error" in previous:
+            continue
+        if previous.get("mb_per_s") and result["mb_per_s"] < previous["mb_per_s"] * (1 - tolerance):
+            regressions.append(f"{key}: throughput {result['mb_per_s']} MB/s vs {previous['mb_per_s']} MB/s")
+        # Peaks of a few MB are noise
+        if previous.get("peak_mb", 0) >= 5 and result["peak_mb"] > previous["peak_mb"] * (1 + tolerance):
+            regressions.append(f"{key}: peak memory {result['peak_mb']} MB vs {previous['peak_mb']} MB")
+    return regressions
+
+
+_STARTUP_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import streamlit
+streamlit_seconds = time.perf_counter() - start
+start = time.perf_counter()
+import main
+main_seconds = time.perf_counter() - start
+print(json.dumps({"streamlit": streamlit_seconds, "main": main_seconds,
+                  "loaded": sorted({name.split(".")[0] for name in sys.modules})}))
+"""
+
+
+def check_startup(budget: float = STARTUP_BUDGET_SECONDS, repeat: int = 3) -> List[str]:
+    """
+    Imports the app in fresh interpreters and returns every startup problem:
+    `import main` (on top of streamlit) slower than `budget`, or a deferred
+    module loaded at import time. The fastest of `repeat` runs counts.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    runs = []
+    for _ in range(repeat):
+        probe = subprocess.run([sys.executable, "-c", _STARTUP_PROBE], cwd=here, capture_output=True,
+                               text=True, check=True)
+        runs.append(json.loads(probe.stdout.strip().splitlines()[-1]))
+    best = min(runs, key=lambda run: run["main"])
+    print(f"import streamlit {best['streamlit']:.3f}s, import main {best['main']:.3f}s "
+          f"(budget {budget:.3f}s)", file=sys.stderr)
+
+    problems = []
+    if best["main"] > budget:
+        problems.append(f"import main took {best['main']:.3f}s, over the {budget:.3f}s budget")
+    eager = sorted(set(DEFERRED_MODULES) & set(best["loaded"]))
+    if eager:
+        problems.append(f"imported at startup: {', '.join(eager)}")
+    return problems
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Benchmark reading, detection, chunking, normalization, conversion and export "
+                    "on generated logs, and compare with a stored baseline."
+    )
+    parser.add_argument("-f", "--formats", nargs="+", default=list(FORMATS), choices=FORMATS)
+    parser.add_argument("-s", "--sizes", nargs="+", default=["1MB", "10MB"], help="e.g. 1MB 100MB 10GB")
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=STAGES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per stage; the fastest counts.")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON to compare with.")
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed throughput drop / memory growth before a stage counts as a regression.")
+    parser.add_argument("-o", "--output", help="Also write the results as JSON here.")
+    parser.add_argument("--check-startup", action="store_true",
+                        help="Only check that the app imports within the startup budget, without heavy modules.")
+    parser.add_argument("--parsers", action="store_true",
+                        help="Only compare regex groupdict() parsing with the compiled layout parsers "
+                             "(at the first of --sizes).")
+    parser.add_argument("--startup-budget", type=float, default=STARTUP_BUDGET_SECONDS,
+                        help="Seconds `import main` may take on top of `import streamlit`.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(name)s:%(message)s", stream=sys.stderr)
+
+    if args.check_startup:
+        problems = check_startup(args.startup_budget, args.repeat)
+        for problem in problems:
+            print(f"REGRESSION {problem}", file=sys.stderr)
+        if not problems:
+            print("Startup is within budget.", file=sys.stderr)
+        return 1 if problems else 0
+
+    if args.parsers:
+        results = compare_parsers(args.formats, args.sizes[0], args.seed, args.repeat)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+        return 0
+
+    results = run_benchmarks(args.formats, args.sizes, args.stages, args.seed, args.repeat)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.baseline}", file=sys.stderr)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline to create one.", file=sys.stderr)
+        return 0
+
+    with open(args.baseline, encoding="utf-8") as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    if not regressions:
+        print("No regressions against the baseline.", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
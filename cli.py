@@ -0,0 +1,305 @@
+# ai_file_agent/cli.py
+
+import argparse
+import contextlib
+import glob
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple
+
+from export_sinks import get_sink
+from metrics import REGISTRY, record_wait
+from search_index import entry_matches, parse_query
+from file_utils import (
+    STREAM_SAMPLE_BYTES,
+    detect_log_type,
+    detect_stream_format,
+    extract_template,
+    iter_normalized_entries,
+    open_log_stream,
+)
+
+logger = logging.getLogger(__name__)
+
+# Records waiting for the stdout writer; bounds memory when workers outrun the output
+OUTPUT_QUEUE_SIZE = 1000
+# Templates counted per sketch update with --top
+TEMPLATE_BATCH = 1000
+_DONE = object()
+
+
+def expand_inputs(inputs: List[str]) -> List[str]:
+    """
+    Expands file paths and glob patterns (``**`` is recursive) into a sorted,
+    de-duplicated list of files.
+    """
+    files = set()
+    for item in inputs:
+        matches = glob.glob(item, recursive=True) if glob.has_magic(item) else [item]
+        if not matches:
+            logger.warning(f"No files match: {item}")
+        for path in matches:
+            if os.path.isfile(path):
+                files.add(os.path.abspath(path))
+    return sorted(files)
+
+
+def iter_file_records(file_path: str, summarize: bool = False, pipeline=None,
+                      query: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yields the JSONL records for one file: one ``entry`` record per
+    normalized entry, followed by its ``summary`` record when `summarize` is
+    set, and a closing ``file`` record with totals (or the error).
+
+    With `query` (search_index syntax, e.g. ``level:error MY-013360``) only
+    matching entries are emitted; ``seq`` keeps their position in the file.
+    """
+    name = os.path.basename(file_path)
+    terms = parse_query(query) if query else None
+    count = 0
+    matched = 0
+    try:
+        log_type = detect_log_type(file_path)
+        with open_log_stream(file_path) as stream:
+            sample = stream.read(STREAM_SAMPLE_BYTES)
+            stream.seek(0)
+            format_name, pattern, structured = detect_stream_format(sample)
+
+            for count, entry in enumerate(iter_normalized_entries(stream, pattern, structured), start=1):
+                if terms is not None and not entry_matches(entry, terms):
+                    continue
+                matched += 1
+                yield {"type": "entry", "file": name, "seq": count, "log_type": log_type,
+                       "format": format_name, "entry": entry}
+                if summarize:
+                    summaries = pipeline.summarize(entry)
+                    yield {"type": "summary", "file": name, "seq": count, "summary": summaries[0]}
+    except Exception as e:
+        logger.error(f"Failed to process {file_path}: {e}")
+        yield {"type": "file", "file": name, "path": file_path, "entries": count, "matched": matched,
+               "error": str(e)}
+        return
+
+    yield {"type": "file", "file": name, "path": file_path, "entries": count, "matched": matched, "error": None}
+
+
+def write_jsonl(records: Iterator[Dict[str, Any]], out: TextIO) -> int:
+    written = 0
+    for record in records:
+        out.write(json.dumps(record, ensure_ascii=False, default=str))
+        out.write("\n")
+        written += 1
+    return written
+
+
+def process_to_directory(file_path: str, output_dir: str, summarize: bool, pipeline,
+                         output_format: str = "jsonl", append: bool = False, query: Optional[str] = None) -> str:
+    output_path = os.path.join(output_dir, f"{os.path.basename(file_path)}.{output_format}")
+    with get_sink(output_path, append=append) as sink:
+        sink.write_many(iter_file_records(file_path, summarize, pipeline, query))
+    return output_path
+
+
+def run(files: List[str], out: TextIO, output_dir: Optional[str] = None,
+        workers: int = 4, summarize: bool = False, output_format: str = "jsonl",
+        append: bool = False, query: Optional[str] = None) -> None:
+    """
+    Processes `files` concurrently. With `output_dir`, each file streams to
+    its own ``<name>.<output_format>`` sink; otherwise all records are
+    interleaved on `out` as JSONL through a bounded queue.
+    """
+    pipeline = None
+    if summarize:
+        from pipeline import LogPipeline
+        pipeline = LogPipeline()
+
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(process_to_directory, f, output_dir, summarize, pipeline,
+                                       output_format, append, query) for f in files]
+            for future in futures:
+                logger.info(f"Wrote {future.result()}")
+        return
+
+    records: "queue.Queue[Any]" = queue.Queue(maxsize=OUTPUT_QUEUE_SIZE)
+
+    def produce(file_path: str) -> None:
+        for record in iter_file_records(file_path, summarize, pipeline, query):
+            try:
+                records.put_nowait(record)
+            except queue.Full:
+                # The writer is behind; record how long producers stall on it
+                start = time.perf_counter()
+                records.put(record)
+                record_wait("cli_output", time.perf_counter() - start)
+
+    def produce_all() -> None:
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(produce, files))
+        finally:
+            records.put(_DONE)
+
+    producer = threading.Thread(target=produce_all, daemon=True)
+    producer.start()
+    write_jsonl(iter(records.get, _DONE), out)
+    out.flush()
+    producer.join()
+
+
+def file_heavy_hitters(file_path: str, query: Optional[str] = None) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Counts the message templates of one file (of its entries matching
+    `query`) in a fixed-size HeavyHitters sketch. Runs in a worker process;
+    returns the sketch and the file's closing ``file`` record.
+    """
+    from sketches import HeavyHitters
+
+    hitters = HeavyHitters()
+    templates: List[str] = []
+    file_record: Dict[str, Any] = {}
+    for record in iter_file_records(file_path, query=query):
+        if record["type"] == "file":
+            file_record = record
+            continue
+        templates.append(extract_template(record["entry"]))
+        if len(templates) >= TEMPLATE_BATCH:
+            hitters.update(templates)
+            templates = []
+    hitters.update(templates)
+    return hitters, file_record
+
+
+def top_templates(files: List[str], n: int, workers: int = 4, query: Optional[str] = None,
+                  merge_paths: Optional[List[str]] = None, save_path: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yields the `n` most frequent templates across `files` with their error
+    bounds. Each file is sketched in its own worker process and the sketches
+    are merged, together with sketches saved by earlier runs (`merge_paths`);
+    `save_path` stores the merged sketch for a later merge.
+
+    Records: one ``file`` record per input, one ``template`` record per
+    heavy hitter (``count`` is an upper bound, ``min_count`` a guaranteed
+    lower bound; equal when exact), then a closing ``templates`` record.
+    """
+    from sketches import HeavyHitters
+
+    merged = HeavyHitters()
+    for path in merge_paths or []:
+        with open(path, encoding="utf-8") as f:
+            merged.merge(HeavyHitters.from_dict(json.load(f)))
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for hitters, file_record in executor.map(file_heavy_hitters, files, [query] * len(files)):
+            merged.merge(hitters)
+            yield file_record
+
+    if save_path:
+        with open(save_path, "w", encoding="utf-8") as f:
+            json.dump(merged.to_dict(), f)
+        logger.info(f"Saved the merged sketch to {save_path}")
+
+    for rank, hitter in enumerate(merged.top(n), start=1):
+        yield {"type": "template", "rank": rank, "template": hitter.item, "count": hitter.count,
+               "min_count": hitter.min_count}
+    yield {"type": "templates", "entries": merged.total, "tracked": len(merged.candidates.counts),
+           "exact": merged.exact, "sketch_error_bound": round(merged.error_bound(), 1),
+           "sketch_confidence": round(merged.sketch.confidence, 4)}
+
+
+def timeline_records(files: List[str], query: Optional[str] = None, events: bool = True,
+                     correlate: Optional[float] = None, correlations: int = 20,
+                     default_year: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yields the entries of all `files` as one timeline, in timestamp order
+    (each file normalized with its own format), then a ``file`` record per
+    input. With `correlate` (a window in seconds) it also counts which
+    warning/error templates of one file precede those of another and ends
+    with the `correlations` most frequent pairs as ``correlation`` records.
+    """
+    from timeline import CoOccurrence, TimelineSource, merge_timeline
+
+    sources = [TimelineSource(path, query=query, default_year=default_year) for path in files]
+    co_occurrence = CoOccurrence(correlate) if correlate else None
+    for event in merge_timeline(sources):
+        if co_occurrence is not None:
+            co_occurrence.add(event)
+        if events:
+            yield {"type": "entry", "file": event.source, "seq": event.seq, "time": event.time,
+                   "format": event.log_format, "entry": event.entry}
+
+    for source in sources:
+        yield {"type": "file", "file": source.name, "path": source.file_path, "entries": source.entries,
+               "matched": source.matched, "error": source.error}
+    if co_occurrence is not None:
+        for correlation in co_occurrence.top(correlations):
+            yield {"type": "correlation", **correlation._asdict(), "confidence": round(correlation.confidence, 4),
+                   "window_seconds": correlate}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description="Normalize (and optionally summarize) log files headlessly, streaming JSONL."
+    )
+    parser.add_argument("inputs", nargs="+", help="Log files or glob patterns, e.g. 'logs/**/*.log*'.")
+    parser.add_argument("-o", "--output-dir", help="Write one output per input here instead of stdout.")
+    parser.add_argument("-f", "--format", default="jsonl", choices=["jsonl", "jsonl.gz", "parquet"],
+                        help="Output format with --output-dir.")
+    parser.add_argument("--append", action="store_true", help="Append to existing outputs with --output-dir.")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="Files processed concurrently.")
+    parser.add_argument("-q", "--query", help="Only emit entries matching this search query, "
+                                              "e.g. 'level:error MY-013360 -deprecated'.")
+    parser.add_argument("--summarize", action="store_true", help="Send every entry to the LLM for a summary.")
+    parser.add_argument("--top", type=int, metavar="N",
+                        help="Instead of entries, emit the N most frequent message templates with error bounds, "
+                             "counted in fixed memory (combine with -q 'level:error' for the top error templates).")
+    parser.add_argument("--timeline", action="store_true",
+                        help="Emit the entries of all inputs merged in timestamp order instead of file by file.")
+    parser.add_argument("--correlate", type=float, metavar="SECONDS",
+                        help="Report which warning/error templates of one input precede those of another "
+                             "within this many seconds (add --timeline to also emit the entries).")
+    parser.add_argument("--correlations", type=int, default=20, metavar="N", help="Pairs reported by --correlate.")
+    parser.add_argument("--year", type=int, help="Year of syslog timestamps, which carry none "
+                                                 "(default: the year each file was last modified).")
+    parser.add_argument("--merge-sketch", nargs="+", default=[], metavar="PATH",
+                        help="With --top, also merge template sketches saved by earlier runs.")
+    parser.add_argument("--save-sketch", metavar="PATH", help="With --top, save the merged template sketch here.")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log progress to stderr.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(levelname)s:%(name)s:%(message)s", stream=sys.stderr, force=True)
+
+    files = expand_inputs(args.inputs)
+    if not files:
+        logger.error("No input files found.")
+        return 1
+
+    out = sys.stdout
+    if args.top:
+        write_jsonl(top_templates(files, args.top, args.workers, args.query, args.merge_sketch, args.save_sketch), out)
+        out.flush()
+        return 0
+    if args.timeline or args.correlate:
+        write_jsonl(timeline_records(files, args.query, args.timeline, args.correlate, args.correlations,
+                                     args.year), out)
+        out.flush()
+        return 0
+
+    # The summarizer prints its progress; keep stdout for JSONL only
+    with contextlib.redirect_stdout(sys.stderr):
+        run(files, out, output_dir=args.output_dir, workers=args.workers, summarize=args.summarize,
+            output_format=args.format, append=args.append, query=args.query)
+    REGISTRY.write_textfile()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,23 +1,190 @@
+import json
+import tempfile
+import textwrap
+import zlib
+from itertools import chain
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from openpyxl import Workbook
+
+# Exports stay in memory up to this size, then spill to a temporary file
+SPOOL_MAX_BYTES = 16 * 1024 * 1024
+# Longest text openpyxl accepts in a single cell
+EXCEL_MAX_CELL_CHARS = 32767
+
+
+def _iter_rows(data: Any, columns: Optional[List[str]] = None) -> Tuple[List[str], Iterator[Dict[str, Any]]]:
+    """
+    Returns (columns, row iterator) for a DataFrame or an iterable of dicts.
+
+    DataFrames are walked with itertuples, which avoids the per-row Series
+    that iterrows allocates. For plain iterables the columns come from the
+    first row unless given.
+    """
+    if hasattr(data, "itertuples"):
+        columns = columns or [str(c) for c in data.columns]
+        source = data[columns] if list(data.columns) != columns else data
+        return columns, (dict(zip(columns, values)) for values in source.itertuples(index=False, name=None))
+
+    rows = iter(data)
+    if columns is None:
+        first = next(rows, None)
+        if first is None:
+            return [], iter(())
+        columns = list(first.keys())
+        rows = chain([first], rows)
+    return columns, rows
+
+
+def _cell_text(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    return str(value)
+
 
-from fpdf import FPDF
-from io import BytesIO
 # Export to Excel
-def export_excel(df):
-    output = BytesIO()
-    df.to_excel(output, index=False)
-    return output.getvalue()
+def export_excel(data, columns: Optional[List[str]] = None) -> BinaryIO:
+    """
+    Writes rows to an .xlsx file with a write-only openpyxl workbook.
+
+    `data` may be a DataFrame or any iterable of dicts (e.g. a generator), so
+    rows are appended one at a time and never all held in memory. Returns a
+    spooled file positioned at the start, ready for `st.download_button`.
+    """
+    columns, rows = _iter_rows(data, columns)
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Logs")
+    sheet.append(columns)
+    for row in rows:
+        sheet.append([_cell_text(row.get(col))[:EXCEL_MAX_CELL_CHARS] for col in columns])
+
+    output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+
+class StreamingPDFWriter:
+    """
+    Minimal PDF writer that emits every page to the output as soon as it is
+    full, so memory use is bounded by one page whatever the row count.
+
+    Text is set in Courier (fixed width, so wrapping is exact) with the
+    WinAnsi encoding; characters outside latin-1 are replaced, as FPDF did.
+    """
+
+    PAGE_WIDTH = 595  # A4, in points
+    PAGE_HEIGHT = 842
+
+    def __init__(self, output: BinaryIO, font_size: float = 9, margin: float = 40):
+        self.output = output
+        self.font_size = font_size
+        self.margin = margin
+        self.leading = font_size * 1.25
+        self.chars_per_line = int((self.PAGE_WIDTH - 2 * margin) / (font_size * 0.6))
+        self.lines_per_page = int((self.PAGE_HEIGHT - 2 * margin) / self.leading)
+
+        self._offsets: Dict[int, int] = {}
+        self._page_ids: List[int] = []
+        self._lines: List[bytes] = []
+        self._position = 0
+        # 1: catalog, 2: page tree (written last, once all kids are known), 3: font
+        self._next_id = 4
+
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        self._write_object(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>")
+
+    def _write(self, data: bytes) -> None:
+        self.output.write(data)
+        self._position += len(data)
+
+    def _write_object(self, object_id: int, body: bytes) -> None:
+        self._offsets[object_id] = self._position
+        self._write(b"%d 0 obj\n" % object_id + body + b"\nendobj\n")
+
+    def _allocate(self) -> int:
+        object_id = self._next_id
+        self._next_id += 1
+        return object_id
+
+    @staticmethod
+    def _escape(text: str) -> bytes:
+        encoded = text.encode("latin-1", errors="replace")
+        return encoded.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+    def write_line(self, text: str = "") -> None:
+        if len(self._lines) >= self.lines_per_page:
+            self._flush_page()
+        self._lines.append(self._escape(text))
+
+    def write_paragraph(self, text: str) -> None:
+        for raw_line in text.splitlines() or [""]:
+            wrapped = textwrap.wrap(raw_line.expandtabs(4), self.chars_per_line,
+                                    replace_whitespace=False, drop_whitespace=True) or [""]
+            for line in wrapped:
+                self.write_line(line)
+
+    def _flush_page(self) -> None:
+        if not self._lines:
+            return
+        top = self.PAGE_HEIGHT - self.margin - self.font_size
+        parts = [b"BT /F1 %g Tf %g TL %g %g Td" % (self.font_size, self.leading, self.margin, top)]
+        for line in self._lines:
+            parts.append(b"(" + line + b") Tj T*")
+        parts.append(b"ET")
+        stream = zlib.compress(b"\n".join(parts))
+        self._lines = []
+
+        content_id = self._allocate()
+        page_id = self._allocate()
+        self._write_object(content_id, b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(stream)
+                           + stream + b"\nendstream")
+        self._write_object(page_id, b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+                           b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>"
+                           % (self.PAGE_WIDTH, self.PAGE_HEIGHT, content_id))
+        self._page_ids.append(page_id)
+
+    def close(self) -> None:
+        self._flush_page()
+        if not self._page_ids:
+            # A PDF needs at least one page
+            self._lines = [b""]
+            self._flush_page()
+
+        kids = b" ".join(b"%d 0 R" % page_id for page_id in self._page_ids)
+        self._write_object(2, b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % len(self._page_ids))
+
+        xref_position = self._position
+        self._write(b"xref\n0 %d\n0000000000 65535 f \n" % self._next_id)
+        for object_id in range(1, self._next_id):
+            self._write(b"%010d 00000 n \n" % self._offsets[object_id])
+        self._write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                    % (self._next_id, xref_position))
+
 
 # Export to PDF
-def export_pdf(df):
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=10)
-
-    for i, row in df.iterrows():
-        pdf.multi_cell(0, 10, f"{i+1}. {row['log']}\nSummary: {row['summary']}\nCategory: {row['category']}\n", border=1)
-    
-    pdf_output = BytesIO()
-    pdf_bytes = pdf.output(dest='S').encode('latin-1')  # Get PDF as bytes
-    pdf_output.write(pdf_bytes)
-    pdf_output.seek(0)
-    return pdf_output
+def export_pdf(data, columns: Optional[List[str]] = None) -> BinaryIO:
+    """
+    Writes one numbered block per row (``column: value`` lines) to a PDF.
+
+    Pages are written to a spooled file as they fill up, so peak memory does
+    not depend on the number of rows. Returns the file positioned at the start.
+    """
+    columns, rows = _iter_rows(data, columns)
+
+    output = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    writer = StreamingPDFWriter(output)
+    for i, row in enumerate(rows, start=1):
+        first, *rest = columns or ["log"]
+        writer.write_paragraph(f"{i}. {_cell_text(row.get(first))}")
+        for col in rest:
+            writer.write_paragraph(f"{col.replace('_', ' ').title()}: {_cell_text(row.get(col))}")
+        writer.write_line("-" * writer.chars_per_line)
+    writer.close()
+
+    output.seek(0)
+    return output
@@ -0,0 +1,256 @@
+# ai_file_agent/export_sinks.py
+
+import gzip
+import json
+import logging
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 10_000
+# Holds fields of later records that are missing from a Parquet file's schema
+EXTRA_COLUMN = "_extra"
+
+
+class ExportSink(ABC):
+    """
+    Incremental writer for normalized entries and summaries.
+
+    Records are written as they arrive, so exporting a generator never holds
+    more than one batch in memory. Use as a context manager, or call close()
+    (or abort() when the export failed).
+    """
+
+    def __init__(self, path: str, append: bool = False):
+        self.path = path
+        self.append = append
+        self.count = 0
+
+    @abstractmethod
+    def write(self, record: Dict[str, Any]) -> None:
+        """Writes one record."""
+
+    def write_many(self, records: Iterable[Dict[str, Any]]) -> int:
+        for record in records:
+            self.write(record)
+        return self.count
+
+    @abstractmethod
+    def close(self) -> None:
+        """Completes the export."""
+
+    @abstractmethod
+    def abort(self) -> None:
+        """Drops what this sink wrote, leaving any earlier export at `path` as it was."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+            return
+        try:
+            self.close()
+        except BaseException:
+            # Completing failed (e.g. the last batch would not serialize): leave nothing half-written
+            self.abort()
+            raise
+
+
+def _ensure_parent_dir(path: str) -> None:
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+
+
+class _FileSink(ExportSink):
+    """
+    A sink writing one text file. Unless appending, it writes to a temp file
+    next to `path` that replaces `path` on close, so a failed export never
+    leaves a half-written file behind.
+    """
+
+    def __init__(self, path: str, append: bool = False):
+        super().__init__(path, append)
+        _ensure_parent_dir(path)
+        self._temp_path = None if append else f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        self._file = self._open(self._temp_path or path, "a" if append else "w")
+        self._closed = False
+
+    def _open(self, path: str, mode: str):
+        return open(path, mode, encoding="utf-8")
+
+    def _finish(self) -> None:
+        """Writes whatever ends the file (before it is closed)."""
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        try:
+            self._finish()
+        finally:
+            self._file.close()
+        if self._temp_path is not None:
+            os.replace(self._temp_path, self.path)
+        self._closed = True
+
+    def abort(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self._file.close()
+        if self._temp_path is not None:
+            try:
+                os.remove(self._temp_path)
+            except OSError as e:
+                logger.warning(f"Could not remove {self._temp_path}: {e}")
+
+
+class NDJSONSink(_FileSink):
+    """One compact JSON object per line; `append` adds to an existing file."""
+
+    def write(self, record: Dict[str, Any]) -> None:
+        # Serialized first, so a record that cannot be leaves no partial line
+        line = json.dumps(record, ensure_ascii=False, default=str)
+        self._file.write(line)
+        self._file.write("\n")
+        self.count += 1
+
+
+class GzipNDJSONSink(NDJSONSink):
+    """
+    Gzip-compressed NDJSON. Appending adds a new gzip member, which gzip
+    readers (and `gzip.open`) read back as one continuous stream.
+    """
+
+    def _open(self, path: str, mode: str):
+        return gzip.open(path, mode + "t", encoding="utf-8", compresslevel=6)
+
+
+class JSONArraySink(_FileSink):
+    """
+    Compact JSON array, streamed element by element. Kept for consumers of
+    the former `structured_logs.json`; it cannot be appended to.
+    """
+
+    def __init__(self, path: str, append: bool = False):
+        if append:
+            raise ValueError("JSON array exports cannot be appended to; use .ndjson instead.")
+        super().__init__(path, append)
+        self._file.write("[")
+
+    def write(self, record: Dict[str, Any]) -> None:
+        element = json.dumps(record, ensure_ascii=False, default=str)
+        if self.count:
+            self._file.write(",\n")
+        self._file.write(element)
+        self.count += 1
+
+    def _finish(self) -> None:
+        self._file.write("]\n")
+
+
+class ParquetSink(ExportSink):
+    """
+    Parquet dataset written in row groups of `batch_size` records.
+
+    `path` is a dataset directory; every sink writes one new part file into
+    it, so appending never rewrites existing data and readers such as
+    `pyarrow.dataset` or pandas see all parts as one table. The schema comes
+    from the first batch: values are stored as strings (nested values as
+    JSON) and fields that show up later go to the `_extra` JSON column.
+    """
+
+    def __init__(self, path: str, append: bool = False, batch_size: int = DEFAULT_BATCH_SIZE):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise ImportError("Parquet export requires pyarrow: pip install pyarrow") from e
+
+        super().__init__(path, append)
+        self._pa = pa
+        self._pq = pq
+        self.batch_size = batch_size
+
+        if os.path.isdir(path) and os.listdir(path) and not append:
+            raise FileExistsError(f"Parquet dataset already exists: {path} (pass append=True to add to it)")
+        os.makedirs(path, exist_ok=True)
+        self.part_path = os.path.join(path, f"part-{int(time.time())}-{uuid.uuid4().hex[:8]}.parquet")
+
+        self._columns: Optional[List[str]] = None
+        self._batch: List[Dict[str, Any]] = []
+        self._writer = None
+
+    @staticmethod
+    def _as_text(value: Any) -> Optional[str]:
+        if value is None:
+            return None
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, ensure_ascii=False, default=str)
+        return str(value)
+
+    def write(self, record: Dict[str, Any]) -> None:
+        self._batch.append(record)
+        self.count += 1
+        if len(self._batch) >= self.batch_size:
+            self._flush()
+
+    def _flush(self) -> None:
+        if not self._batch:
+            return
+        pa = self._pa
+
+        if self._columns is None:
+            columns: List[str] = []
+            for record in self._batch:
+                columns.extend(k for k in record if k not in columns and k != EXTRA_COLUMN)
+            self._columns = columns
+            schema = pa.schema([(name, pa.string()) for name in columns + [EXTRA_COLUMN]])
+            self._writer = self._pq.ParquetWriter(self.part_path, schema, compression="zstd")
+
+        known = set(self._columns)
+        arrays = {name: [self._as_text(r.get(name)) for r in self._batch] for name in self._columns}
+        arrays[EXTRA_COLUMN] = [
+            self._as_text({k: v for k, v in r.items() if k not in known}) if not known.issuperset(r) else None
+            for r in self._batch
+        ]
+        self._writer.write_table(pa.table(arrays, schema=self._writer.schema))
+        self._batch = []
+
+    def close(self) -> None:
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+
+    def abort(self) -> None:
+        """Removes this sink's part file; the other parts of the dataset are left as they were."""
+        self._batch = []
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if os.path.exists(self.part_path):
+            os.remove(self.part_path)
+
+
+def get_sink(path: str, append: bool = False, **kwargs) -> ExportSink:
+    """
+    Picks a sink from the output path:
+    `.ndjson`/`.jsonl` -> NDJSON, with `.gz` -> gzip NDJSON,
+    `.parquet` -> Parquet dataset directory, `.json` -> JSON array.
+    """
+    lowered = path.lower()
+    if lowered.endswith((".ndjson.gz", ".jsonl.gz")):
+        return GzipNDJSONSink(path, append=append)
+    if lowered.endswith((".ndjson", ".jsonl")):
+        return NDJSONSink(path, append=append)
+    if lowered.endswith(".parquet"):
+        return ParquetSink(path, append=append, **kwargs)
+    if lowered.endswith(".json"):
+        return JSONArraySink(path, append=append)
+    raise ValueError(f"Unsupported export format: {path} (use .ndjson, .ndjson.gz, .parquet or .json)")
@@ -1,35 +1,48 @@
 # src/utils/file_utils.py
 
-import streamlit as st
 import os
 import sys
 import tempfile
 import chardet
 import math
+import random
+import zlib
+from itertools import chain
 
-from langchain.chat_models import ChatOpenAI
-from langchain.schema import HumanMessage
 import re
 import logging
-from typing import List, Dict, Tuple, Union
+from typing import List, Dict, Iterable, Iterator, Optional, Tuple, Union
 
+from layout_parser import compile_layout
+from metrics import timed
 
 
-logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.DEBUG, format="%(levelname)s:%(name)s:%(message)s")
 
-# Suppress watchdog debug logs by setting its level to WARNING or ERROR
-logging.getLogger("watchdog").setLevel(logging.WARNING)
-logging.getLogger("watchdog.observers.inotify_buffer").setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
 SUPPORTED_LOG_TYPES = ["apache", "nginx", "laravel", "php", "asterisk", "mysql"]
 
 # src/streamlit_app/app.py
 
 
 
-def launch_ui():
+def render_header() -> None:
+    """Sets up the page and renders its title."""
+    # Streamlit is only needed by the UI helpers; the parsing functions below
+    # are also used headless by cli.py and jobs.py
+    import streamlit as st
+
     st.set_page_config(page_title="AI Log Analyzer", layout="wide")
     st.title("🔍 AI-Powered Error Log Detector")
+
+
+def launch_ui():
+    """
+    Renders the upload widget and returns the path of the uploaded file.
+    Stops the script until a file is uploaded.
+    """
+    import streamlit as st
+
+    render_header()
     st.write("Upload a log file (e.g., Apache, NGINX, PHP, Laravel, Asterisk) to begin analysis.")
 
     uploaded_file = st.file_uploader("📁 Choose a log file", type=["log", "txt", "conf", "json", "out"])
@@ -48,6 +61,7 @@ def launch_ui():
     # Prevent the rest of the pipeline from running until a file is uploaded
     st.stop()
 
+@timed("detect_log_type", bytes_arg=None)
 def detect_log_type(file_path: str) -> str:
     """
     Detect log type based on file name heuristics and first few lines of content.
@@ -70,19 +84,29 @@ def detect_log_type(file_path: str) -> str:
     return "unknown"
 
 
+@timed("read_log_file", bytes_arg=None)
 def read_log_file(file_path: str) -> str:
     """
     Reads a log file with encoding detection.
     """
     with open(file_path, 'rb') as f:
         raw = f.read()
-        encoding = chardet.detect(raw)['encoding']
 
+    return decode_log_bytes(raw)
+
+
+@timed("decode_log_bytes")
+def decode_log_bytes(raw: bytes) -> str:
+    """
+    Decodes raw log bytes using the encoding detected by chardet.
+    """
+    encoding = chardet.detect(raw)['encoding']
     return raw.decode(encoding or 'utf-8', errors='ignore')
 
 
 
 
+@timed("chunk_large_file", count_result=True)
 def chunk_large_file(content: str, max_chunk_size: int = 5000) -> list[str]:
     """
     Splits the log content into manageable chunks.
@@ -121,6 +145,202 @@ def chunk_large_file(content: str, max_chunk_size: int = 5000) -> list[str]:
 
 
 
+@timed("chunk_content_defined", count_result=True)
+def chunk_content_defined(content: str, boundary_pattern: Optional[str] = None,
+                          avg_chunk_size: int = 4096, min_chunk_size: int = 1024,
+                          max_chunk_size: int = 5000) -> List[str]:
+    """
+    Splits log content into content-defined chunks aligned to entry boundaries.
+
+    Unlike `chunk_large_file`, whether a chunk ends after an entry depends only
+    on that entry's own bytes (its CRC32, weighted by its length so chunks
+    average `avg_chunk_size`), never on its offset in the file. An appended or
+    rotated log therefore reproduces yesterday's chunks exactly up to the
+    changed region, and per-chunk results can be reused.
+
+    Parameters:
+    - content (str): The entire log file content as a string.
+    - boundary_pattern (str): Regex that matches at the start of a new entry;
+      when None every line is an entry.
+    - avg_chunk_size / min_chunk_size / max_chunk_size (int): Target sizes in characters.
+      A single entry longer than `max_chunk_size` becomes a chunk of its own.
+
+    Returns:
+    - list[str]: Chunks whose concatenation is `content` (blank-only chunks dropped).
+
+    Raises:
+    - ValueError: If content is empty or not a string.
+    """
+    if not isinstance(content, str):
+        raise ValueError("Log content must be a string.")
+
+    if not content.strip():
+        raise ValueError("Log content is empty.")
+
+    return list(iter_content_defined_chunks(content.splitlines(keepends=True), boundary_pattern,
+                                            avg_chunk_size, min_chunk_size, max_chunk_size))
+
+
+def iter_content_defined_chunks(lines: Iterable[str], boundary_pattern: Optional[str] = None,
+                                avg_chunk_size: int = 4096, min_chunk_size: int = 1024,
+                                max_chunk_size: int = 5000) -> Iterator[str]:
+    """
+    Streaming form of `chunk_content_defined`: yields the same chunks from
+    any iterable of lines (e.g. an open file), holding one chunk at a time.
+    """
+    boundary = re.compile(boundary_pattern) if boundary_pattern else None
+    # An entry of length n ends a chunk with probability n / avg_chunk_size
+    threshold_per_char = (1 << 32) / avg_chunk_size
+
+    current: List[str] = []
+    current_size = 0
+    entry: List[str] = []
+
+    def close_entry() -> Iterator[str]:
+        nonlocal current_size
+        text = "".join(entry)
+        entry.clear()
+        if current_size and current_size + len(text) > max_chunk_size:
+            yield "".join(current)
+            current.clear()
+            current_size = 0
+        current.append(text)
+        current_size += len(text)
+        fingerprint = zlib.crc32(text.encode("utf-8", errors="surrogatepass"))
+        if current_size >= max_chunk_size or (
+                current_size >= min_chunk_size and fingerprint < len(text) * threshold_per_char):
+            yield "".join(current)
+            current.clear()
+            current_size = 0
+
+    for line in lines:
+        if entry and (boundary is None or boundary.match(line)):
+            yield from (chunk for chunk in close_entry() if chunk.strip())
+        entry.append(line)
+    if entry:
+        yield from (chunk for chunk in close_entry() if chunk.strip())
+    if current:
+        chunk = "".join(current)
+        if chunk.strip():
+            yield chunk
+
+
+# Pattern discovery input: about this many LLM tokens (~4 characters each) of sampled lines
+DISCOVERY_BUDGET_TOKENS = int(os.getenv("LOG_ANALYZER_DISCOVERY_BUDGET", "1500"))
+CHARS_PER_TOKEN = 4
+# Leading characters that define a line's shape (its layout: timestamp, level, source...)
+SHAPE_PREFIX = 40
+# Distinct shapes tracked; lines of any further shape share one overflow stratum
+MAX_SHAPES = 256
+# Lines kept per shape, and the longest line kept (longer ones are cut)
+LINES_PER_SHAPE = 8
+MAX_SAMPLE_LINE = 500
+
+_LETTER_RUNS = re.compile(r"[A-Za-z]+")
+_DIGIT_RUNS = re.compile(r"\d+")
+_OTHER_SHAPE = "\0other"
+
+
+def line_shape(line: str) -> str:
+    """Layout of a line's start: letter runs become a, digit runs 0, everything else stays."""
+    return _DIGIT_RUNS.sub("0", _LETTER_RUNS.sub("a", line[:SHAPE_PREFIX]))
+
+
+class LineSampler:
+    """
+    Samples the lines of a whole file in one pass, stratified by line shape,
+    for pattern discovery.
+
+    Every shape (banner, access line, stack frame, a format that starts
+    halfway through...) keeps its own uniform reservoir of LINES_PER_SHAPE
+    lines, so rare layouts are represented however many lines the common one
+    has. `sample` then spreads the budget across shapes, one line per shape
+    per round, most frequent shapes first. Memory is bounded by
+    MAX_SHAPES x LINES_PER_SHAPE lines. The random choices are seeded, so the
+    same file always gives the same sample (and the same discover cache key).
+    """
+
+    def __init__(self, per_shape: int = LINES_PER_SHAPE, max_shapes: int = MAX_SHAPES, seed: int = 0):
+        self.per_shape = per_shape
+        self.max_shapes = max_shapes
+        self.rng = random.Random(seed)
+        self.lines = 0
+        self.counts: Dict[str, int] = {}
+        # Per shape: (line number, line) pairs
+        self.reservoirs: Dict[str, List[Tuple[int, str]]] = {}
+        # Per full reservoir: [weight, count at which the next line replaces one] (Li's Algorithm L,
+        # which draws random numbers only on replacements instead of for every line)
+        self._next: Dict[str, List[float]] = {}
+
+    def _skip(self, state: List[float]) -> None:
+        state[0] *= math.exp(math.log(self.rng.random()) / self.per_shape)
+        state[1] += math.floor(math.log(self.rng.random()) / math.log(1 - state[0])) + 1
+
+    def add(self, line: str) -> None:
+        line = line.rstrip("\r\n")
+        if not line or line.isspace():
+            return
+        self.lines += 1
+        shape = line_shape(line)
+        if shape not in self.counts and len(self.counts) >= self.max_shapes:
+            shape = _OTHER_SHAPE
+        seen = self.counts.get(shape, 0) + 1
+        self.counts[shape] = seen
+        if seen <= self.per_shape:
+            self.reservoirs.setdefault(shape, []).append((self.lines, line[:MAX_SAMPLE_LINE]))
+            if seen == self.per_shape:
+                state = self._next[shape] = [1.0, seen]
+                self._skip(state)
+            return
+        state = self._next[shape]
+        if seen == state[1]:
+            self.reservoirs[shape][self.rng.randrange(self.per_shape)] = (self.lines, line[:MAX_SAMPLE_LINE])
+            self._skip(state)
+
+    def feed(self, lines: Iterable[str]) -> "LineSampler":
+        for line in lines:
+            self.add(line)
+        return self
+
+    def sample(self, budget_tokens: int = DISCOVERY_BUDGET_TOKENS) -> str:
+        """Sampled lines in file order, at most `budget_tokens` (estimated) long."""
+        budget = budget_tokens * CHARS_PER_TOKEN
+        shapes = sorted(self.reservoirs, key=lambda s: (-self.counts[s], s))
+        # Line order inside a reservoir is random after replacement; keep rounds deterministic and spread
+        pools = {shape: sorted(self.reservoirs[shape]) for shape in shapes}
+        picked: List[Tuple[int, str]] = []
+        used = 0
+        for round_ in range(self.per_shape):
+            added = False
+            for shape in shapes:
+                pool = pools[shape]
+                if round_ < len(pool) and used + len(pool[round_][1]) + 1 <= budget:
+                    picked.append(pool[round_])
+                    used += len(pool[round_][1]) + 1
+                    added = True
+            if not added:
+                break
+        return "\n".join(line for _, line in sorted(picked))
+
+
+@timed("sample_for_discovery", bytes_arg=None)
+def sample_for_discovery(lines: Iterable[str], budget_tokens: int = DISCOVERY_BUDGET_TOKENS) -> List[str]:
+    """
+    Input for `get_error_suggestions` in pattern discovery mode: one chunk of
+    lines sampled across all of `lines` (e.g. an open file) by LineSampler,
+    instead of only the first chunk of the file.
+
+    Returns:
+    - list[str]: The sample as a single chunk (one LLM call), or [] if there are no lines.
+    """
+    sampler = LineSampler().feed(lines)
+    sample = sampler.sample(budget_tokens)
+    logger.info(f"Sampled {sample.count(chr(10)) + 1 if sample else 0} of {sampler.lines} lines "
+                f"across {len(sampler.counts)} line shapes for pattern discovery")
+    return [sample] if sample else []
+
+
+@timed("get_error_suggestions", bytes_arg=None, count_result=True)
 def get_error_suggestions(chunks: List[str], mode: str = "pattern_discovery") -> List[str]:
     """
     You are an expert in log analysis and parsing.
@@ -162,6 +382,10 @@ def get_error_suggestions(chunks: List[str], mode: str = "pattern_discovery") ->
     if mode not in ["pattern_discovery", "error_suggestion"]:
         raise ValueError("Invalid mode. Use 'pattern_discovery' or 'error_suggestion'.")
 
+    # Imported here: langchain takes seconds to load and only this stage needs it
+    from langchain.chat_models import ChatOpenAI
+    from langchain.schema import HumanMessage
+
     try:
         llm = ChatOpenAI(temperature=0, model="gpt-4o-mini", max_tokens=3024)
         patterns = []
@@ -228,17 +452,10 @@ LOG_PATTERNS = {
 
 # Function to try extracting JSON from log using pattern
 def extract_json_logs(log_text: str, regex_pattern: str) -> List[Dict[str, str]]:
-    structured_logs = []
     try:
-        regex = re.compile(regex_pattern)
-        for line in log_text.splitlines():
-            if not line.strip():
-                continue
-            match = regex.match(line)
-            if match:
-                entry = match.groupdict()
-                if entry:
-                    structured_logs.append(entry)
+        parser = compile_layout(regex_pattern)
+        lines = [line for line in log_text.splitlines() if line.strip()]
+        structured_logs = [entry for entry in parser.parse_dicts(lines) if entry]
         return structured_logs
     except Exception as e:
         logger.warning(f"Regex compilation or matching failed: {e}")
@@ -281,56 +498,206 @@ def try_to_learn_log_pattern(log_text: str) -> Tuple[str, str]:
         if len(matches) >= 3:  # A decent confidence
             new_name = f"learned_{len(LOG_PATTERNS) + 1}"
             LOG_PATTERNS[new_name] = pattern
-            st.warning(f"🧠 Learned a new log pattern: {pattern} as {new_name}")
+            logger.warning(f"🧠 Learned a new log pattern: {pattern} as {new_name}")
             return new_name, pattern
 
         
 # Main normalization logic
-def normalize_log_file_content(log_text: str) -> List[Union[Dict[str, str], str]]:
+def normalize_log_text(log_text: str) -> Tuple[str, str, List[Union[Dict[str, str], str]]]:
+    """
+    Normalizes log text without touching the UI.
+
+    Returns:
+    - Tuple[str, str, list]: (log_type, pattern, entries). Entries are dicts when the
+      pattern has named groups, otherwise raw entry strings split on the pattern.
+
+    Raises:
+    - ValueError: If no known or learnable pattern matches the log text.
+    """
     log_type, pattern = detect_log_format(log_text)
-    print(f"Detected log type: {log_type}")
-    print(f"Pattern used for detection: {pattern}")
-    st.info(f"Detected log type: {log_type}")
-    st.info(f"Pattern used for detection: {pattern}")
 
     if not pattern or pattern is None:
-        st.warning("No known pattern matched. Attempting to learn...")
-        try:
-            log_type, pattern = try_to_learn_log_pattern(log_text)
-        except ValueError as e:
-            logger.error(f"Failed to learn log pattern: {e}")
-            st.error("Failed to learn log pattern. Please check the log format.")
-            st.error(str(e))
-            raise ValueError("Failed to learn log pattern. Please check the log format.")    
-        
+        logger.warning("No known pattern matched. Attempting to learn...")
+        learned = try_to_learn_log_pattern(log_text)
+        if not learned:
+            raise ValueError("Failed to learn log pattern. Please check the log format.")
+        log_type, pattern = learned
 
     logger.info(f"Detected log type: {log_type}")
     logger.info(f"Detected log type: {pattern}")
-   # sys.exit(0)
 
     # Try JSON conversion
     structured = extract_json_logs(log_text, pattern)
-    print(f"Structured logs after JSON extraction: {structured}")
-    st.info(f"Structured logs after JSON extraction: {structured}")
-    logger.info(f"Structured logs after JSON extraction: {structured}")
-    if structured and isinstance(structured, list) and all(isinstance(entry, dict) for entry in structured):
-        logger.info(f"Parsed {len(structured)} structured entries.")
-        st.info(f"Parsed {len(structured)} structured entries.")
-        print(f"Parsed {len(structured)} structured entries.")
-        # Display structured logs in Streamlit
-        st.subheader("📜 Normalized Log Entries")
-        st.json(structured[:5], expanded=False)
-        
     if structured:
         logger.info(f"Parsed {len(structured)} structured entries.")
-        return structured
+        return log_type, pattern, structured
 
     # Fallback: return split raw entries if JSON conversion fails
     _, entries = split_log_entries(log_text)
     logger.warning("Falling back to raw entry splitting (non-JSON).")
+    return log_type, pattern, entries
+
+
+@timed("normalize_log_file_content", count_result=True)
+def normalize_log_file_content(log_text: str) -> List[Union[Dict[str, str], str]]:
+    import streamlit as st
+
+    try:
+        log_type, pattern, entries = normalize_log_text(log_text)
+    except ValueError as e:
+        logger.error(f"Failed to learn log pattern: {e}")
+        st.error("Failed to learn log pattern. Please check the log format.")
+        st.error(str(e))
+        raise
+
+    print(f"Detected log type: {log_type}")
+    print(f"Pattern used for detection: {pattern}")
+    st.info(f"Detected log type: {log_type}")
+    st.info(f"Pattern used for detection: {pattern}")
+    if log_type and log_type.startswith("learned_"):
+        st.warning(f"🧠 Using learned log pattern: {pattern} as {log_type}")
+
+    if entries and all(isinstance(entry, dict) for entry in entries):
+        st.info(f"Parsed {len(entries)} structured entries.")
+        print(f"Parsed {len(entries)} structured entries.")
+        # Display structured logs in Streamlit, one page at a time
+        from result_views import ResultTable, render_paginated_table
+        render_paginated_table("📜 Normalized Log Entries", ResultTable(entries), key="structured_entries")
+
     return entries
 
 
+# Bytes sampled from the start of a file to pick its encoding and format when streaming
+STREAM_SAMPLE_BYTES = 64 * 1024
+
+
+def open_log_stream(file_path: str):
+    """
+    Opens a log file for line-by-line reading, with the encoding detected
+    by chardet on the first STREAM_SAMPLE_BYTES only.
+    """
+    with open(file_path, 'rb') as f:
+        encoding = chardet.detect(f.read(STREAM_SAMPLE_BYTES))['encoding']
+    return open(file_path, 'r', encoding=encoding or 'utf-8', errors='ignore')
+
+
+def detect_stream_format(sample_text: str) -> Tuple[str, str, bool]:
+    """
+    Picks the log format the same way `normalize_log_text` does, but from a
+    sample of the file only.
+
+    Returns:
+    - Tuple[str, str, bool]: (log_type, pattern, structured). `structured` is
+      True when the pattern yields named groups on the sample, i.e. entries
+      will be dicts rather than raw strings.
+
+    Raises:
+    - ValueError: If no known or learnable pattern matches the sample.
+    - regex_guard.UnsafePattern (a ValueError): If the pattern is refused by the regex guard.
+    """
+    from regex_guard import get_guard
+
+    log_type, pattern = detect_log_format(sample_text)
+    if not pattern:
+        learned = try_to_learn_log_pattern(sample_text)
+        if not learned:
+            raise ValueError("Failed to learn log pattern. Please check the log format.")
+        log_type, pattern = learned
+    # Every stream compiles the pattern picked here; refuse it before anything runs it over the file
+    get_guard().compile(pattern)
+    return log_type, pattern, bool(extract_json_logs(sample_text, pattern))
+
+
+class LogEntryAssembler:
+    """
+    Turns log lines into normalized entries incrementally, for callers that
+    receive lines piecemeal (file streams, HTTP uploads).
+
+    Structured mode emits the `groupdict()` of every matching line. Otherwise
+    lines are grouped into raw entries, a new entry starting at each line
+    that begins with the pattern (stack traces stay with their entry).
+
+    Raises:
+    - regex_guard.UnsafePattern (a ValueError): If the regex guard refuses the pattern.
+    """
+
+    def __init__(self, pattern: str, structured: bool):
+        from regex_guard import get_guard
+
+        # Checked (and cached) by the regex guard: the pattern may be a learned one
+        self.regex = get_guard().compile(pattern)
+        self.structured = structured
+        # Fixed layouts are cut on their delimiters instead of matched (see layout_parser)
+        self.parser = compile_layout(pattern) if structured else None
+        self._current: List[str] = []
+
+    def feed(self, line: str) -> List[Union[Dict[str, str], str]]:
+        if self.structured:
+            line = line.rstrip("\r\n")
+            if not line.strip():
+                return []
+            entry = self.parser.parse_dict(line)
+            return [entry] if entry else []
+
+        completed = []
+        if self.regex.match(line) and self._current:
+            completed = self.flush()
+        self._current.append(line)
+        return completed
+
+    def flush(self) -> List[Union[Dict[str, str], str]]:
+        entry = "".join(self._current).strip()
+        self._current = []
+        return [entry] if entry else []
+
+
+def iter_normalized_entries(lines: Iterable[str], pattern: str, structured: bool) -> Iterator[Union[Dict[str, str], str]]:
+    """
+    Streaming counterpart of `normalize_log_text`: yields entries one at a
+    time so memory stays constant regardless of file size.
+    """
+    assembler = LogEntryAssembler(pattern, structured)
+    for line in lines:
+        yield from assembler.feed(line)
+    yield from assembler.flush()
+
+
+# Masks the variable parts of a message so entries of the same kind share a template.
+# Error codes such as MY-013360 are kept since they identify the problem.
+_TEMPLATE_TOKENS = re.compile(
+    r"(?P<code>\b[A-Z][A-Z0-9]+-\d+\b)"
+    r"|(?P<str>\"[^\"\n]*\"|'[^'\n]*')"
+    r"|(?P<hex>\b0x[0-9a-fA-F]+\b)"
+    r"|(?P<num>\d+)"
+)
+TEMPLATE_MAX_CHARS = 300
+
+
+def _mask_template_token(match: re.Match) -> str:
+    if match.group("code"):
+        return match.group("code")
+    if match.group("str"):
+        return "<STR>"
+    if match.group("hex"):
+        return "<HEX>"
+    return "<NUM>"
+
+
+def extract_template(entry: Union[Dict[str, str], str]) -> str:
+    """
+    Returns the message template of a normalized entry: its message (or
+    first line for raw entries) with numbers, hex values and quoted strings
+    replaced by placeholders.
+    """
+    if isinstance(entry, dict):
+        text = entry.get("message") or " ".join(
+            str(v) for k, v in entry.items() if v and k not in ("timestamp", "thread_id")
+        )
+    else:
+        text = entry.split("\n", 1)[0]
+    return _TEMPLATE_TOKENS.sub(_mask_template_token, str(text).strip())[:TEMPLATE_MAX_CHARS]
+
+
 def normalize_logs(chunks: List[str], regex_patterns: List[str]) -> List[Dict[str, str]]:
     """
     Normalize log entries into structured JSON format using regex patterns.
@@ -370,6 +737,9 @@ def normalize_logs(chunks: List[str], regex_patterns: List[str]) -> List[Dict[st
         regex_patterns = convert_js_named_groups_to_python(regex_patterns)
     
     print(f"Converted regex patterns: {regex_patterns}")
+    from regex_guard import get_guard
+
+    guard = get_guard()
     structured_logs = []
 
     for idx, (chunk, pattern) in enumerate(zip(chunks, regex_patterns)):
@@ -379,19 +749,26 @@ def normalize_logs(chunks: List[str], regex_patterns: List[str]) -> List[Dict[st
 
         try:
             fixed_pattern = sanitize_and_validate_regex(pattern)
-            regex = re.compile(fixed_pattern)
-        except re.error as e:
-            logger.warning(f"Invalid regex at index {idx}: {e}")
+            # LLM-generated: refuse patterns that can backtrack catastrophically, and match in a
+            # worker process with a time budget (see regex_guard)
+            guard.check(fixed_pattern)
+        except (re.error, ValueError) as e:
+            logger.warning(f"Invalid or unsafe regex at index {idx}: {e}")
             continue  # Skip invalid regex
 
-        for line_no, line in enumerate(chunk.splitlines(), start=1):
-            if not line.strip():
-                logger.debug(f"Line {line_no}: Skipping empty line.")
-                continue
-
-            match = regex.match(line)
-            if match:
-                entry = match.groupdict()
+        lines = [(line_no, line) for line_no, line in enumerate(chunk.splitlines(), start=1) if line.strip()]
+        try:
+            matches = guard.match_lines(fixed_pattern, [line for _, line in lines])
+        except (re.error, ValueError) as e:
+            logger.warning(f"Regex at index {idx} was quarantined while matching: {e}")
+            continue
+        except (RuntimeError, OSError, EOFError) as e:
+            # No worker to run it in (it did not start, or died): an unguarded pattern is not run
+            logger.error(f"Regex at index {idx} skipped, the regex worker is unavailable: {e}")
+            continue
+
+        for (line_no, line), entry in zip(lines, matches, strict=True):
+            if entry is not None:
                 logger.debug(f"✅ Line {line_no}: Match found -> {entry}")
                 if entry:
                     structured_logs.append(entry)
@@ -433,42 +810,52 @@ def convert_js_named_groups_to_python(pattern: str) -> str:
 #logger = logging.getLogger(__name__)
 
 
-def export_suggestions(logs: List[Dict[str, str]], output_path: str) -> None:
+def export_suggestions(logs: Iterable[Dict[str, str]], output_path: str, append: bool = False) -> int:
     """
-    Export the normalized logs to a JSON file.
+    Export normalized logs (and/or their summaries) incrementally.
 
     Parameters:
-    - logs (List[Dict[str, str]]): List of structured log entries.
-    - output_path (str): File path where JSON should be saved.
+    - logs (Iterable[Dict[str, str]]): Structured log entries; may be a generator.
+    - output_path (str): Destination; the extension picks the sink
+      (.ndjson, .ndjson.gz, .parquet dataset directory, or .json array).
+    - append (bool): Add to an existing export instead of replacing it.
+
+    Returns:
+    - int: Number of entries written.
 
     Raises:
-    - ValueError: If logs are empty or improperly formatted.
+    - ValueError: If logs are empty or improperly formatted, or the format is unsupported.
     - OSError: If the output directory cannot be created.
     - IOError: If writing the file fails.
     """
+    from export_sinks import get_sink
 
-    # Validation
-    if not logs or not isinstance(logs, list) or not all(isinstance(entry, dict) for entry in logs):
-        raise ValueError("Logs must be a non-empty list of dictionaries.")
+    if not output_path or not isinstance(output_path, str):
+        raise ValueError("Output path must be a valid file path.")
 
-    if not output_path or not isinstance(output_path, str) or not output_path.endswith(".json"):
-        raise ValueError("Output path must be a valid JSON file path.")
+    entries = iter(logs)
+    first = next(entries, None)
+    if first is None:
+        raise ValueError("Logs must be a non-empty list of dictionaries.")
 
     try:
-        # Ensure the directory exists
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    except Exception as e:
-        raise OSError(f"Failed to create directory for output: {e}")
+        sink = get_sink(output_path, append=append)
+    except OSError as e:
+        raise OSError(f"Failed to open export destination: {e}")
 
     try:
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(logs, f, indent=4, ensure_ascii=False)
-        logger.info(f"Exported structured logs to: {output_path}")
+        with sink:
+            for entry in chain([first], entries):
+                if not isinstance(entry, dict):
+                    raise ValueError(f"Log entries must be dictionaries, got {type(entry).__name__}.")
+                sink.write(entry)
+    except ValueError:
+        raise
     except Exception as e:
-        raise IOError(f"Failed to write JSON file: {e}")
-
-
+        raise IOError(f"Failed to write export file: {e}")
 
+    logger.info(f"Exported {sink.count} structured logs to: {output_path}")
+    return sink.count
 
 
 def sanitize_and_validate_regex(raw_pattern: str) -> str:
@@ -0,0 +1,414 @@
+# ai_file_agent/jobs.py
+
+import argparse
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+JOBS_DIR = os.getenv("LOG_ANALYZER_JOBS_DIR", "./.jobs")
+# A running job whose worker has not sent a heartbeat for this long is handed to another worker
+STALE_AFTER_SECONDS = 120
+# How often a worker sends the heartbeat of the job it runs, whatever stage the job is in
+HEARTBEAT_SECONDS = STALE_AFTER_SECONDS / 4
+# Rows fetched per query when iterating over stored job results
+RESULT_PAGE_ROWS = 1000
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    file_hash TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    file_path TEXT NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    done_count INTEGER NOT NULL DEFAULT 0,
+    total_count INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    worker TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_file_hash ON jobs(file_hash);
+CREATE TABLE IF NOT EXISTS job_results (
+    job_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (job_id, kind, seq)
+);
+"""
+
+
+def _file_sha256(file_path: str) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class JobQueue:
+    """
+    Local, process-safe job queue persisted in SQLite.
+
+    The Streamlit app only submits jobs and polls them; worker processes
+    (see `run_workers`) claim queued jobs and persist progress and partial
+    results as they go, so a closed tab or a rerun loses nothing.
+    """
+
+    def __init__(self, jobs_dir: str = JOBS_DIR):
+        self.jobs_dir = jobs_dir
+        self.uploads_dir = os.path.join(jobs_dir, "uploads")
+        os.makedirs(self.uploads_dir, exist_ok=True)
+        self.db_path = os.path.join(jobs_dir, "jobs.db")
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        conn = self._connect()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def submit(self, file_path: str, file_name: Optional[str] = None) -> str:
+        """
+        Queues a file for analysis and returns its job id.
+
+        The file is copied into the jobs directory, since upload temp files do
+        not outlive the session. Submitting content that already has a queued,
+        running or finished job returns that job instead of a new one.
+        """
+        file_hash = _file_sha256(file_path)
+        file_name = file_name or os.path.basename(file_path)
+
+        with self._connection() as conn:
+            row = conn.execute(
+                "SELECT id FROM jobs WHERE file_hash = ? AND status != ? ORDER BY created_at DESC LIMIT 1",
+                (file_hash, JOB_FAILED),
+            ).fetchone()
+            if row:
+                logger.info(f"Reusing job {row['id']} for {file_name}")
+                return row["id"]
+
+            stored_path = os.path.join(self.uploads_dir, f"{file_hash}_{os.path.basename(file_name)}")
+            if not os.path.exists(stored_path):
+                shutil.copyfile(file_path, stored_path)
+
+            job_id = uuid.uuid4().hex
+            now = time.time()
+            conn.execute(
+                "INSERT INTO jobs (id, file_hash, file_name, file_path, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, file_hash, file_name, stored_path, JOB_QUEUED, now, now),
+            )
+        logger.info(f"Queued job {job_id} for {file_name}")
+        return job_id
+
+    def claim(self, worker_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Atomically takes the oldest queued job, or a running job whose worker
+        went silent, and marks it as running for `worker_id`.
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE status = ? OR (status = ? AND updated_at < ?) "
+                "ORDER BY created_at LIMIT 1",
+                (JOB_QUEUED, JOB_RUNNING, now - STALE_AFTER_SECONDS),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, worker = ?, updated_at = ? WHERE id = ?",
+                (JOB_RUNNING, worker_id, now, row["id"]),
+            )
+            conn.execute("COMMIT")
+            return dict(row)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def update_progress(self, job_id: str, stage: str, done_count: Optional[int] = None,
+                        total_count: Optional[int] = None) -> None:
+        """Records the current stage and counters; doubles as the worker heartbeat."""
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE jobs SET stage = ?, done_count = COALESCE(?, done_count), "
+                "total_count = COALESCE(?, total_count), updated_at = ? WHERE id = ?",
+                (stage, done_count, total_count, time.time(), job_id),
+            )
+
+    def touch(self, job_id: str) -> None:
+        with self._connection() as conn:
+            conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ? AND status = ?",
+                         (time.time(), job_id, JOB_RUNNING))
+
+    @contextmanager
+    def heartbeat(self, job_id: str) -> Iterator[None]:
+        """
+        Sends the job's heartbeat from a background thread while the block
+        runs, so a long stage (a slow LLM call) does not get the job handed
+        to another worker.
+        """
+        stop = threading.Event()
+
+        def beat() -> None:
+            while not stop.wait(HEARTBEAT_SECONDS):
+                try:
+                    self.touch(job_id)
+                except sqlite3.Error as e:
+                    logger.warning(f"Heartbeat of job {job_id} failed: {e}")
+
+        thread = threading.Thread(target=beat, name=f"job-heartbeat-{job_id[:8]}", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def add_results(self, job_id: str, kind: str, payloads: List[Any], start_seq: int = 0) -> None:
+        with self._connection() as conn:
+            conn.execute("BEGIN")
+            conn.executemany(
+                "INSERT OR REPLACE INTO job_results (job_id, kind, seq, payload) VALUES (?, ?, ?, ?)",
+                [(job_id, kind, start_seq + i, json.dumps(p, ensure_ascii=False, default=str))
+                 for i, p in enumerate(payloads)],
+            )
+            conn.execute("COMMIT")
+
+    def finish(self, job_id: str, status: str = JOB_DONE, error: Optional[str] = None) -> None:
+        with self._connection() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, error, time.time(), job_id),
+            )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connection() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def count_results(self, job_id: str, kind: str) -> int:
+        with self._connection() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM job_results WHERE job_id = ? AND kind = ?", (job_id, kind)
+            ).fetchone()[0]
+
+    def results(self, job_id: str, kind: str, offset: int = 0, limit: int = -1) -> List[Any]:
+        """Returns stored results of one kind in order; `limit`/`offset` page through them."""
+        with self._connection() as conn:
+            rows = conn.execute(
+                "SELECT payload FROM job_results WHERE job_id = ? AND kind = ? ORDER BY seq LIMIT ? OFFSET ?",
+                (job_id, kind, limit, offset),
+            ).fetchall()
+        return [json.loads(r["payload"]) for r in rows]
+
+    def result_rows(self, job_id: str, kind: str,
+                    convert: Optional[Callable[[Any], Any]] = None) -> "JobResultRows":
+        """A lazy, paged sequence over the stored results of one kind (see JobResultRows)."""
+        return JobResultRows(self, job_id, kind, convert)
+
+
+class JobResultRows(Sequence):
+    """
+    Read-only sequence over the results of one job, for result_views.ResultTable.
+
+    The length is counted once, when the sequence is created, so a job that
+    is still running shows the rows stored up to then. Slices are one
+    LIMIT/OFFSET query and iteration fetches RESULT_PAGE_ROWS rows at a time,
+    so a page of a large result never loads the others. `convert` is applied
+    to every row read.
+    """
+
+    def __init__(self, queue: JobQueue, job_id: str, kind: str, convert: Optional[Callable[[Any], Any]] = None):
+        self.queue = queue
+        self.job_id = job_id
+        self.kind = kind
+        self.convert = convert
+        self._len = queue.count_results(job_id, kind)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def _fetch(self, offset: int, limit: int) -> List[Any]:
+        rows = self.queue.results(self.job_id, self.kind, offset=offset, limit=limit)
+        return [self.convert(row) for row in rows] if self.convert is not None else rows
+
+    def __getitem__(self, index: Union[int, slice]) -> Any:
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._len)
+            rows = self._fetch(start, max(0, stop - start))
+            return rows[::step] if step != 1 else rows
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("job result index out of range")
+        return self._fetch(index, 1)[0]
+
+    def __iter__(self) -> Iterator[Any]:
+        for offset in range(0, self._len, RESULT_PAGE_ROWS):
+            yield from self._fetch(offset, min(RESULT_PAGE_ROWS, self._len - offset))
+
+
+def run_job(queue: JobQueue, job: Dict[str, Any], pipeline, store) -> None:
+    """
+    Runs the analysis of one job as a stream (see `stream_analysis`) and
+    persists what it produces.
+
+    The upload is never read into memory as a whole: entries and summaries
+    go through bounded batches into the job's snapshot, and every batch is
+    added to the job results as soon as it leaves the stream, so pollers see
+    partial results while the job runs. A job picked up again after a worker
+    died keeps the results already stored and only adds the rows after
+    them; only signatures without a summary in `store` (an AnalysisStore)
+    are sent to the LLM again.
+    """
+    from file_utils import (STREAM_SAMPLE_BYTES, detect_log_format, detect_stream_format, open_log_stream,
+                            sample_for_discovery)
+    from stream_pipeline import stream_analysis
+
+    job_id = job["id"]
+    file_path = job["file_path"]
+
+    with queue.heartbeat(job_id):
+        queue.update_progress(job_id, "read")
+        pipeline.read_key(file_path)
+
+        queue.update_progress(job_id, "detect")
+        pipeline.detect(file_path)
+        with open_log_stream(file_path) as stream:
+            sample = stream.read(STREAM_SAMPLE_BYTES)
+        if not sample.strip():
+            raise ValueError("No valid log chunks found. Please check the file content.")
+        _, boundary_pattern = detect_log_format(sample)
+
+        queue.update_progress(job_id, "discover")
+        with open_log_stream(file_path) as stream:
+            selected_chunks = sample_for_discovery(stream)
+        regex_patterns = pipeline.discover(selected_chunks, mode="pattern_discovery")
+        queue.add_results(job_id, "pattern", regex_patterns)
+
+        log_type, pattern, structured = detect_stream_format(sample)
+
+        # Rows a previous attempt already stored; the stream is deterministic, so they are the same rows
+        stored = {kind: queue.count_results(job_id, kind) for kind in ("entry", "summary")}
+        if stored["entry"]:
+            logger.info(f"Resuming job {job_id} after {stored['entry']} stored entries")
+
+        def store_batch(result) -> None:
+            start = result.entry_count - len(result.last_entries)
+            for kind, rows in (("entry", result.last_entries), ("summary", result.last_rows)):
+                skip = max(0, stored[kind] - start)
+                if skip < len(rows):
+                    queue.add_results(job_id, kind, rows[skip:], start_seq=start + skip)
+            queue.update_progress(job_id, "stream", done_count=result.chars_read, total_count=result.file_size)
+
+        stream_analysis(pipeline, store, file_path, job["file_name"], log_type, pattern, structured,
+                        boundary_pattern, progress=store_batch)
+
+    queue.finish(job_id, JOB_DONE)
+
+
+def worker_loop(jobs_dir: str = JOBS_DIR, poll_interval: float = 1.0, once: bool = False) -> None:
+    """Claims and runs jobs until interrupted (or until the queue is empty if `once`)."""
+    # Imported here so the Streamlit process can use JobQueue without loading the pipeline
+    from analysis_store import AnalysisStore
+    from metrics import REGISTRY, record_wait
+    from pipeline import STAGE_CACHE_DIR, LogPipeline, StageCache
+
+    queue = JobQueue(jobs_dir)
+    pipeline_cache = StageCache(disk_dir=STAGE_CACHE_DIR)
+    store = AnalysisStore()
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    logger.info(f"Worker {worker_id} started")
+
+    while True:
+        job = queue.claim(worker_id)
+        if job is None:
+            if once:
+                return
+            time.sleep(poll_interval)
+            continue
+
+        logger.info(f"Worker {worker_id} running job {job['id']} ({job['file_name']})")
+        if job["status"] == JOB_QUEUED:
+            record_wait("jobs", time.time() - job["created_at"])
+        try:
+            run_job(queue, job, LogPipeline(pipeline_cache), store)
+        except Exception as e:
+            logger.exception(f"Job {job['id']} failed")
+            queue.finish(job["id"], JOB_FAILED, error=str(e))
+        REGISTRY.write_textfile()
+
+
+def run_workers(num_workers: int, jobs_dir: str = JOBS_DIR) -> None:
+    processes: List[multiprocessing.Process] = []
+    for _ in range(num_workers):
+        process = multiprocessing.Process(target=worker_loop, args=(jobs_dir,), daemon=False)
+        process.start()
+        processes.append(process)
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+
+
+def job_progress(job: Dict[str, Any]) -> Tuple[float, str]:
+    """Returns (fraction done, human-readable status) for a job row."""
+    if job["status"] == JOB_DONE:
+        return 1.0, "Done"
+    if job["status"] == JOB_FAILED:
+        return 0.0, f"Failed: {job['error']}"
+    if job["status"] == JOB_QUEUED:
+        return 0.0, "Waiting for a worker..."
+    if job["stage"] == "stream" and job["total_count"]:
+        return min(1.0, job["done_count"] / job["total_count"]), \
+            f"Normalizing and summarizing: {job['done_count'] // 1024} of {job['total_count'] // 1024} KB read"
+    if job["total_count"]:
+        return job["done_count"] / job["total_count"], \
+            f"{job['stage']}: {job['done_count']}/{job['total_count']}"
+    return 0.0, f"{job['stage'] or 'starting'}..."
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:%(name)s:%(message)s")
+    parser = argparse.ArgumentParser(description="Run background log analysis workers.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of worker processes.")
+    parser.add_argument("--jobs-dir", default=JOBS_DIR, help="Directory holding the job database and uploads.")
+    args = parser.parse_args()
+    run_workers(args.workers, args.jobs_dir)
@@ -0,0 +1,269 @@
+# ai_file_agent/layout_parser.py
+
+import logging
+import re
+from functools import lru_cache
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_constants
+    import sre_parse
+
+logger = logging.getLogger(__name__)
+
+KIND_SPLIT = "split"
+KIND_REGEX = "regex"
+
+# Field shapes the split parser handles without looking at the characters of the field
+_DELIMITED = "delimited"      # [^D]+ / [^D]*: anything but the delimiter
+_NON_SPACE = "non_space"      # \S+ / \S*, with a space delimiter
+_REST = "rest"                # .+ / .*: the rest of the line (last field only)
+
+
+class _Field:
+    def __init__(self, name: Optional[str], shape: str, required: bool):
+        self.name = name          # None for an unnamed part that is checked but not returned
+        self.shape = shape
+        self.required = required  # + rather than *: the field may not be empty
+
+
+def _repeat_shape(node, delimiter: Optional[str]) -> Optional[Tuple[str, bool, bool]]:
+    """(shape, required, greedy) of a `x+` / `x*` node the split parser can take, else None."""
+    op, av = node
+    name = str(op)
+    if name not in ("MAX_REPEAT", "MIN_REPEAT"):
+        return None
+    low, high, body = av
+    if low not in (0, 1) or high != sre_constants.MAXREPEAT or len(body) != 1:
+        return None
+    (item_op, item_av), = body
+    item = str(item_op)
+    greedy = name == "MAX_REPEAT"
+    if item == "ANY":
+        return _REST, low == 1, greedy
+    if item == "NOT_LITERAL" and delimiter is not None and item_av == ord(delimiter):
+        return _DELIMITED, low == 1, greedy
+    if item == "IN":
+        members = [(str(o), a) for o, a in item_av]
+        if delimiter is not None and members == [("NEGATE", None), ("LITERAL", ord(delimiter))]:
+            return _DELIMITED, low == 1, greedy
+        if delimiter == " " and len(members) == 1 and members[0][0] == "CATEGORY" \
+                and str(members[0][1]).endswith("NOT_SPACE"):
+            return _NON_SPACE, low == 1, greedy
+    return None
+
+
+def _split_layout(pattern: str) -> Tuple[Optional[str], List[_Field], bool, str]:
+    """
+    Reads `pattern` as fields separated by one repeated single-character
+    delimiter. Returns (delimiter, fields, anchored_end, reason); `fields` is
+    empty and `reason` says why when the pattern is not such a layout.
+    """
+    parsed = sre_parse.parse(pattern)
+    if parsed.state.flags & ~(re.UNICODE | re.MULTILINE):
+        return None, [], False, "flags"
+    nodes = list(parsed)
+    if nodes and str(nodes[0][0]) == "AT" and str(nodes[0][1]) in ("AT_BEGINNING", "AT_BEGINNING_STRING"):
+        nodes = nodes[1:]
+    anchored_end = False
+    if nodes and str(nodes[-1][0]) == "AT" and str(nodes[-1][1]) == "AT_END":
+        nodes = nodes[:-1]
+        anchored_end = True
+    names = {index: name for name, index in parsed.state.groupdict.items()}
+
+    # The delimiter is the literal right after the first field
+    delimiter = None
+    for op, av in nodes:
+        if str(op) == "LITERAL":
+            delimiter = chr(av)
+            break
+
+    fields: List[_Field] = []
+    expect_field = True
+    for position, (op, av) in enumerate(nodes):
+        name = str(op)
+        if not expect_field:
+            if name != "LITERAL" or chr(av) != delimiter:
+                return None, [], False, "fields are not separated by a single repeated delimiter"
+            expect_field = True
+            continue
+        field_name = None
+        node = (op, av)
+        if name == "SUBPATTERN":
+            group, _, _, body = av
+            if group is None or group not in names or len(body) != 1:
+                return None, [], False, "unnamed or compound group"
+            field_name = names[group]
+            node = body[0]
+        shape = _repeat_shape(node, delimiter)
+        if shape is None:
+            return None, [], False, "a field needs its characters checked"
+        kind, required, greedy = shape
+        last = position == len(nodes) - 1
+        if kind == _REST and not last:
+            return None, [], False, "'.' field that is not the last one"
+        if last and not greedy and not anchored_end:
+            return None, [], False, "lazy last field"
+        fields.append(_Field(field_name, kind, required))
+        expect_field = False
+    if expect_field or len(fields) < 2 or not names:
+        return None, [], False, "no delimited named fields"
+    if len(names) != parsed.state.groups - 1 or sum(f.name is not None for f in fields) != len(names):
+        return None, [], False, "captures outside the fields"
+    return delimiter, fields, anchored_end, ""
+
+
+def _split_source(delimiter: str, layout: List[_Field], anchored_end: bool) -> str:
+    """
+    Source of parse / parse_dict / parse_lines / parse_dicts for a split
+    layout, with the delimiter, field positions and checks written in (one
+    `str.split` and a few truth tests per line, no per-field function calls).
+    `fallback` and `fallback_dict` (the regex) get the lines the split cannot
+    decide.
+    """
+    count = len(layout)
+    if layout[-1].shape == _REST:
+        maxsplit, size_check = count - 1, f"len(p) == {count}"
+    elif anchored_end:
+        maxsplit, size_check = -1, f"len(p) == {count}"
+    else:
+        # The last field stops at the next delimiter; whatever follows is not part of the match
+        maxsplit, size_check = count, f"len(p) >= {count}"
+    condition = " and ".join([size_check] + [f"p[{i}]" for i, field in enumerate(layout) if field.required])
+    # A line break ends '.' but not [^D]; \S fields also rely on ' ' being the line's only whitespace
+    if any(field.shape == _NON_SPACE for field in layout):
+        guard = "not line.isprintable()"
+    else:
+        guard = "'\\n' in line"
+    named = [(i, field.name) for i, field in enumerate(layout) if field.name is not None]
+    if len(named) == count and size_check.startswith("len(p) =="):
+        row = "tuple(p)"
+    else:
+        row = "(" + ", ".join(f"p[{i}]" for i, _ in named) + ("," if len(named) == 1 else "") + ")"
+    entry = "{" + ", ".join(f"{name!r}: p[{i}]" for i, name in named) + "}"
+    split = f"p = line.split({delimiter!r}, {maxsplit})"
+
+    def one(name: str, value: str, fallback: str) -> str:
+        return (f"def {name}(line):\n"
+                f"    {split}\n"
+                f"    if {condition}:\n"
+                f"        if {guard}:\n"
+                f"            return {fallback}(line)\n"
+                f"        return {value}\n"
+                f"    return None\n")
+
+    def many(name: str, value: str, fallback: str) -> str:
+        return (f"def {name}(lines):\n"
+                f"    out = []\n"
+                f"    append = out.append\n"
+                f"    for line in lines:\n"
+                f"        {split}\n"
+                f"        if {condition}:\n"
+                f"            if {guard}:\n"
+                f"                found = {fallback}(line)\n"
+                f"                if found is not None:\n"
+                f"                    append(found)\n"
+                f"            else:\n"
+                f"                append({value})\n"
+                f"    return out\n")
+
+    return "\n".join([one("parse", row, "fallback"), one("parse_dict", entry, "fallback_dict"),
+                      many("parse_lines", row, "fallback"), many("parse_dicts", entry, "fallback_dict")])
+
+
+class LayoutParser:
+    """
+    A line parser specialized for one pattern (see `compile_layout`).
+
+    `kind` is "split" when the pattern is a fixed layout of fields between a
+    repeated delimiter (`(?P<a>\\S+) (?P<b>[^ ]+) (?P<msg>.*)`): code is
+    generated for that layout (kept in `source`) that cuts lines with
+    `str.split` and only checks that required fields are not empty.
+    Otherwise it is "regex" (`reason` says why) and the compiled pattern
+    matches; rows then come from `groups()`, without a dict per line.
+
+    Either way the results are exactly those of
+    `re.match(pattern, line).groupdict()`, for lines without their line
+    break. Use the batch methods (`parse_lines`, `parse_dicts`, `columns`)
+    where possible: they avoid a Python call per line.
+    """
+
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        self.regex = re.compile(pattern)
+        self.fields: List[str] = list(self.regex.groupindex)
+        self.reason = ""
+        self.source: Optional[str] = None
+        try:
+            delimiter, layout, anchored_end, self.reason = _split_layout(pattern)
+        except (re.error, TypeError, ValueError, AttributeError) as e:
+            delimiter, layout, anchored_end, self.reason = None, [], False, f"unsupported pattern: {e}"
+        self._build_regex()
+        if layout:
+            self.kind = KIND_SPLIT
+            self.source = _split_source(delimiter, layout, anchored_end)
+            namespace = {"fallback": self.parse, "fallback_dict": self.parse_dict}
+            exec(compile(self.source, f"<layout {pattern!r}>", "exec"), namespace)
+            self.parse = namespace["parse"]
+            self.parse_dict = namespace["parse_dict"]
+            self.parse_lines = namespace["parse_lines"]
+            self.parse_dicts = namespace["parse_dicts"]
+        else:
+            self.kind = KIND_REGEX
+
+    def _build_regex(self) -> None:
+        """The regex versions of the parse methods (set on the instance, like the generated ones)."""
+        match = self.regex.match
+        indexes = [self.regex.groupindex[name] for name in self.fields]
+        if indexes == list(range(1, self.regex.groups + 1)):
+            def row(found: re.Match) -> Tuple[Optional[str], ...]:
+                return found.groups()
+        elif len(indexes) == 1:
+            def row(found: re.Match) -> Tuple[Optional[str], ...]:
+                return (found.group(indexes[0]),)
+        else:
+            def row(found: re.Match) -> Tuple[Optional[str], ...]:
+                return found.group(*indexes)
+
+        def parse(line: str) -> Optional[Tuple[Optional[str], ...]]:
+            found = match(line)
+            return row(found) if found else None
+
+        def parse_dict(line: str) -> Optional[Dict[str, Optional[str]]]:
+            found = match(line)
+            return found.groupdict() if found else None
+
+        def parse_lines(lines: Iterable[str]) -> List[Tuple[Optional[str], ...]]:
+            return [row(found) for found in map(match, lines) if found]
+
+        def parse_dicts(lines: Iterable[str]) -> List[Dict[str, Optional[str]]]:
+            return [found.groupdict() for found in map(match, lines) if found]
+
+        self.parse: Callable[[str], Optional[Tuple[Optional[str], ...]]] = parse
+        self.parse_dict: Callable[[str], Optional[Dict[str, Optional[str]]]] = parse_dict
+        self.parse_lines: Callable[[Iterable[str]], List[Tuple[Optional[str], ...]]] = parse_lines
+        self.parse_dicts: Callable[[Iterable[str]], List[Dict[str, Optional[str]]]] = parse_dicts
+
+    def columns(self, lines: Iterable[str]) -> Dict[str, List[Optional[str]]]:
+        """The matching lines as one list per named group (non-matching lines are dropped)."""
+        rows = self.parse_lines(lines)
+        if not rows:
+            return {name: [] for name in self.fields}
+        return {name: list(column) for name, column in zip(self.fields, zip(*rows, strict=True), strict=True)}
+
+
+@lru_cache(maxsize=256)
+def compile_layout(pattern: str) -> LayoutParser:
+    """
+    Compiles `pattern` into a LayoutParser, the split parser when its layout
+    allows and the regex otherwise. Cached per pattern.
+
+    Raises:
+    - re.error: If the pattern does not compile.
+    """
+    parser = LayoutParser(pattern)
+    logger.debug(f"Layout parser for {pattern!r}: {parser.kind}"
+                 + (f" ({parser.reason})" if parser.reason else ""))
+    return parser
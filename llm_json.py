@@ -0,0 +1,260 @@
+# ai_file_agent/llm_json.py
+
+import json
+import logging
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_FIELDS = ["message", "summary", "fix_suggestion", "code_fix", "code_location", "resources"]
+# Fields a summary is useless without; the others may be null (or an empty list)
+REQUIRED_TEXT_FIELDS = ("message", "summary", "fix_suggestion")
+
+_FIELD_SCHEMAS = {
+    "message": {"type": "string", "description": "Brief, human-readable summary of the log error"},
+    "summary": {"type": "string", "description": "Concise root cause explanation"},
+    "fix_suggestion": {"type": "string", "description": "Clear, actionable advice for resolving the issue"},
+    "code_fix": {"type": ["string", "null"],
+                 "description": "Example code/config adjustment with reasoning, if applicable"},
+    "code_location": {"type": ["string", "null"],
+                      "description": "Where to apply or investigate the fix in the code/configuration"},
+    "resources": {"type": "array", "items": {"type": "string"},
+                  "description": "URLs or titles of reliable, system-specific resources"},
+}
+
+
+def summary_schema(fields: Iterable[str] = SUMMARY_FIELDS) -> Dict[str, Any]:
+    """JSON schema of a summary with the given fields, all required (strict structured-output mode)."""
+    fields = list(fields)
+    return {
+        "type": "object",
+        "properties": {field: _FIELD_SCHEMAS[field] for field in fields},
+        "required": fields,
+        "additionalProperties": False,
+    }
+
+
+SUMMARY_SCHEMA = summary_schema()
+
+
+def _skip_space(text: str, i: int) -> int:
+    while i < len(text) and text[i] in " \t\r\n":
+        i += 1
+    return i
+
+
+_ESCAPES = {'"': '"', "'": "'", "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+_BARE_KEY = re.compile(r"[A-Za-z_][\w -]*?(?=\s*:)")
+# An unquoted scalar runs to the next delimiter
+_BARE_VALUE = re.compile(r"[^,}\]\n]*")
+_LITERALS = {"true": True, "false": False, "null": None, "True": True, "False": False, "None": None}
+# Runs of string characters that need no attention, per quote character
+_STRING_RUNS = {'"': re.compile(r'[^"\\]+'), "'": re.compile(r"[^'\\]+")}
+
+
+def _string(text: str, i: int, quote: str) -> Tuple[str, int, bool]:
+    """A string starting after its opening quote: (value, end, complete). Raw line breaks are kept."""
+    chars = []
+    runs = _STRING_RUNS[quote]
+    while i < len(text):
+        run = runs.match(text, i)
+        if run:
+            chars.append(run.group(0))
+            i = run.end()
+            continue
+        c = text[i]
+        if c == quote:
+            return "".join(chars), i + 1, True
+        # A backslash
+        if i + 1 >= len(text):
+            break
+        escaped = text[i + 1]
+        if escaped == "u":
+            digits = text[i + 2:i + 6]
+            if len(digits) < 4:
+                break
+            try:
+                chars.append(chr(int(digits, 16)))
+            except ValueError:
+                chars.append(digits)
+            i += 6
+            continue
+        chars.append(_ESCAPES.get(escaped, escaped))
+        i += 2
+    return "".join(chars), len(text), False
+
+
+def _value(text: str, i: int) -> Tuple[Any, int, bool]:
+    """Any JSON value (or a Python-style literal or bare word) at `i`: (value, end, complete)."""
+    i = _skip_space(text, i)
+    if i >= len(text):
+        return None, i, False
+    c = text[i]
+    if c == "{":
+        return _container(text, i + 1, "}")
+    if c == "[":
+        return _container(text, i + 1, "]")
+    if c in "\"'":
+        return _string(text, i + 1, c)
+    end = _BARE_VALUE.match(text, i).end()
+    token = text[i:end].strip()
+    # A bare token that reaches the end of the text may be cut off ("tru", "12")
+    complete = end < len(text)
+    if token in _LITERALS:
+        return _LITERALS[token], end, complete
+    try:
+        return json.loads(token), end, complete
+    except ValueError:
+        return token, end, complete
+
+
+def _key(text: str, i: int) -> Tuple[Optional[str], int, bool]:
+    """An object key, quoted or bare, and the ':' after it."""
+    if text[i] in "\"'":
+        key, i, complete = _string(text, i + 1, text[i])
+        if not complete:
+            return None, i, False
+    else:
+        match = _BARE_KEY.match(text, i)
+        if not match:
+            # Not a key: skip the character (stray text between members)
+            return None, i + 1, True
+        key, i = match.group(0).strip(), match.end()
+    i = _skip_space(text, i)
+    if i < len(text) and text[i] == ":":
+        i += 1
+    return key, i, i < len(text)
+
+
+def _member(text: str, i: int) -> Tuple[Optional[str], Any, int, bool]:
+    """One `key: value` member of an object: (key, value, end, complete)."""
+    key, i, complete = _key(text, i)
+    if key is None or not complete:
+        return key, None, i, complete
+    value, i, complete = _value(text, i)
+    return key, value, i, complete
+
+
+def _container(text: str, i: int, closer: str) -> Tuple[Any, int, bool]:
+    """The members of an object or the items of an array, up to `closer` or the end of the text."""
+    result: Any = {} if closer == "}" else []
+    while True:
+        i = _skip_space(text, i)
+        if i >= len(text):
+            return result, i, False
+        c = text[i]
+        if c == closer:
+            return result, i + 1, True
+        if c == ",":
+            i += 1
+            continue
+        if closer == "}":
+            key, value, i, complete = _member(text, i)
+            if key is not None and (complete or value is not None):
+                result[key] = value
+        else:
+            value, i, complete = _value(text, i)
+            if complete or value not in (None, ""):
+                result.append(value)
+        if not complete:
+            return result, i, False
+
+
+class TolerantJSONParser:
+    """
+    Reads the JSON object of an LLM reply, or whatever part of it arrived
+    when the reply stopped.
+
+    Text before the object (prose, a Markdown fence) is skipped, and what
+    LLMs commonly get wrong is repaired: single quotes, bare keys, Python
+    literals (True/None), trailing or missing commas, raw line breaks inside
+    strings, and missing closing brackets. `feed` only collects chunks; the
+    reply is parsed once, in one pass, by `result()`.
+    """
+
+    def __init__(self):
+        self._chunks: List[str] = []
+        self._result: Optional[Tuple[Dict[str, Any], List[str]]] = None
+
+    def feed(self, chunk: str) -> "TolerantJSONParser":
+        self._chunks.append(chunk)
+        self._result = None
+        return self
+
+    def result(self) -> Tuple[Dict[str, Any], List[str]]:
+        """(members read, keys whose value was cut off)."""
+        if self._result is None:
+            self._result = self._parse("".join(self._chunks))
+        return self._result
+
+    @staticmethod
+    def _parse(text: str) -> Tuple[Dict[str, Any], List[str]]:
+        members: Dict[str, Any] = {}
+        start = text.find("{")
+        if start < 0:
+            return members, []
+        i = start + 1
+        while True:
+            i = _skip_space(text, i)
+            if i >= len(text) or text[i] == "}":
+                return members, []
+            if text[i] == ",":
+                i += 1
+                continue
+            key, value, i, complete = _member(text, i)
+            if key is not None and (complete or value is not None):
+                members[key] = value
+            if not complete:
+                return members, [key] if key is not None else []
+
+
+def _field_name(key: str) -> str:
+    """'Fix Suggestion', 'fix-suggestion' and 'fixSuggestion' all name fix_suggestion."""
+    key = re.sub(r"(?<=[a-z])(?=[A-Z])", "_", key.strip())
+    return re.sub(r"[\s-]+", "_", key).lower()
+
+
+def _as_text(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return str(value).strip()
+
+
+def normalize_summary(raw: Dict[str, Any], truncated: Iterable[str] = (),
+                      fields: Iterable[str] = SUMMARY_FIELDS) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Coerces a parsed reply into the summary schema: known fields only, text
+    fields as strings, `resources` as a list of strings.
+
+    Returns:
+    - Tuple[dict, list]: (summary, missing). `missing` names the fields that
+      are absent, empty where required, or were cut off; the summary keeps
+      whatever partial value they had.
+    """
+    values = {_field_name(key): value for key, value in raw.items()}
+    cut = {_field_name(key) for key in truncated}
+    summary: Dict[str, Any] = {}
+    missing: List[str] = []
+    for field in fields:
+        present = field in values
+        value = values.get(field)
+        if field == "resources":
+            if isinstance(value, str):
+                value = [line.strip(" -*\t") for line in value.splitlines()]
+            elif not isinstance(value, list):
+                value = [] if value is None else [value]
+            summary[field] = [_as_text(item) for item in value if _as_text(item)]
+        else:
+            summary[field] = _as_text(value) or None
+        if not present or field in cut or (field in REQUIRED_TEXT_FIELDS and not summary[field]):
+            missing.append(field)
+    return summary, missing
+
+
+def parse_summary(text: str, fields: Iterable[str] = SUMMARY_FIELDS) -> Tuple[Dict[str, Any], List[str]]:
+    """Tolerantly parses an LLM reply into (summary, missing fields); see `normalize_summary`."""
+    raw, truncated = TolerantJSONParser().feed(text).result()
+    return normalize_summary(raw, truncated, fields)
@@ -0,0 +1,211 @@
+# ai_file_agent/log_generator.py
+
+import argparse
+import logging
+import os
+import random
+import re
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("laravel", "apache", "mysql", "asterisk", "nginx", "syslog")
+# Every generated log starts here, so the same seed always yields the same bytes
+START_TIME = datetime(2024, 3, 17, 14, 0, 0, tzinfo=timezone.utc)
+
+_SIZE_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([kmgt]?i?b?)?\s*$", re.IGNORECASE)
+_SIZE_UNITS = {"": 1, "b": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3, "t": 1024 ** 4}
+
+_PATHS = ["/var/www/html/app/Http/Controllers/OrderController.php", "/var/www/html/app/Services/Billing.php",
+          "/var/www/html/vendor/laravel/framework/src/Illuminate/Database/Connection.php",
+          "/var/www/html/vendor/symfony/console/Input/ArgvInput.php"]
+_EXCEPTIONS = ["Illuminate\\Database\\QueryException", "Symfony\\Component\\Console\\Exception\\RuntimeException",
+               "ErrorException", "Illuminate\\Auth\\AuthenticationException"]
+_LARAVEL_MESSAGES = ['SQLSTATE[HY000] [2002] Connection refused (SQL: select * from `orders` where `id` = {n})',
+                     'The "--{word}" option does not exist.', "Undefined index: {word}",
+                     "Unauthenticated.", "Call to a member function {word}() on null"]
+_APACHE_MESSAGES = [("mpm_prefork:notice", "AH00163: Apache/2.4.52 (Ubuntu) configured -- resuming normal operations"),
+                    ("core:notice", "AH00094: Command line: '/usr/sbin/apache2'"),
+                    ("php:error", "[client 10.0.{a}.{b}:{port}] PHP Fatal error:  Uncaught Error: Call to undefined "
+                                  "function {word}() in {path}:{n}"),
+                    ("ssl:warn", "AH01909: www.example.com:443:0 server certificate does NOT include an ID "
+                                 "which matches the server name")]
+_MYSQL_MESSAGES = [("Warning", "MY-013360", "Server", "Plugin mysql_native_password reported: ''mysql_native_password' "
+                                                    "is deprecated and will be removed in a future release.'"),
+                   ("ERROR", "MY-010584", "Repl", "Replica SQL for channel '': Error 'Duplicate entry '{n}' for key "
+                                                  "'PRIMARY'' on query. Default database: 'shop'."),
+                   ("System", "MY-010931", "Server", "/usr/sbin/mysqld: ready for connections. Version: '8.0.36'"),
+                   ("Note", "MY-010914", "Server", "Aborted connection {n} to db: 'shop' user: 'app' host: "
+                                                   "'10.0.{a}.{b}' (Got timeout reading communication packets).")]
+_ASTERISK_MESSAGES = [("WARNING", "chan_sip.c", "Retransmission timeout reached on transmission {hex}@10.0.{a}.{b} "
+                                                "for seqno {n} (Critical Request)"),
+                      ("NOTICE", "chan_sip.c", "Registration from '<sip:{n}@10.0.{a}.{b}>' failed for "
+                                               "'10.0.{a}.{b}:{port}' - Wrong password"),
+                      ("ERROR", "res_rtp_asterisk.c", "RTP Read error on port {port}: Connection refused"),
+                      ("VERBOSE", "pbx.c", "Executing [{n}@from-internal:1] Dial(\"SIP/{n}\", \"SIP/trunk/{n},60\")")]
+_NGINX_MESSAGES = [("error", 'connect() failed (111: Connection refused) while connecting to upstream, client: '
+                             '10.0.{a}.{b}, server: example.com, request: "GET /api/orders/{n} HTTP/1.1", '
+                             'upstream: "http://127.0.0.1:9000/api/orders/{n}"'),
+                   ("warn", 'an upstream response is buffered to a temporary file /var/cache/nginx/{n} while '
+                            'reading upstream, client: 10.0.{a}.{b}'),
+                   ("crit", 'SSL_do_handshake() failed (SSL: error:{hex}) while SSL handshaking, client: 10.0.{a}.{b}'),
+                   ("error", 'open() "/var/www/html/{word}.php" failed (2: No such file or directory), client: '
+                             '10.0.{a}.{b}, request: "GET /{word}.php HTTP/1.1"')]
+_SYSLOG_MESSAGES = [("sshd", "Failed password for invalid user {word} from 10.0.{a}.{b} port {port} ssh2"),
+                    ("CRON", "({word}) CMD (/usr/local/bin/backup.sh --target /srv/{word})"),
+                    ("kernel", "[{n}.{port}] Out of memory: Killed process {n} ({word}) total-vm:{n}kB"),
+                    ("systemd", "Started Session {n} of user {word}.")]
+_CLASSES = [name.rsplit("\\", 1)[-1] for name in _EXCEPTIONS]
+_WORDS = ["source", "billing", "invoice", "customer", "token", "queue", "report", "export", "admin", "sync"]
+
+
+def parse_size(text: str) -> int:
+    """Parses sizes such as ``1MB``, ``512k`` or ``10GB`` (binary multiples) into bytes."""
+    match = _SIZE_RE.match(text)
+    if not match:
+        raise ValueError(f"Invalid size: {text}")
+    number, unit = match.groups()
+    return int(float(number) * _SIZE_UNITS[(unit or "").lower()[:1]])
+
+
+class _Fields:
+    """Deterministic random values shared by all formats."""
+
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+
+    def fill(self, template: str) -> str:
+        rng = self.rng
+        return template.format(
+            n=rng.randint(1, 99999), a=rng.randint(0, 255), b=rng.randint(1, 254),
+            port=rng.randint(1024, 65535), hex=f"{rng.getrandbits(48):012x}",
+            word=rng.choice(_WORDS), path=rng.choice(_PATHS),
+        )
+
+
+def _laravel(rng: random.Random, fields: _Fields, when: datetime) -> str:
+    stamp = when.strftime("[%Y-%m-%d %H:%M:%S]")
+    if rng.random() < 0.6:
+        return f"{stamp} local.INFO: {fields.fill('Order {n} processed for {word}')}\n"
+    message = fields.fill(rng.choice(_LARAVEL_MESSAGES))
+    path = rng.choice(_PATHS)
+    frames = "".join(
+        f"#{i} {rng.choice(_PATHS)}({rng.randint(10, 900)}): {rng.choice(_CLASSES)}->{rng.choice(_WORDS)}()\n"
+        for i in range(rng.randint(5, 20))
+    )
+    exception = rng.choice(_EXCEPTIONS).replace("\\", "\\\\")
+    return (f'{stamp} local.ERROR: {message} {{"exception":"[object] ({exception}(code: 0): {message} '
+            f'at {path}:{rng.randint(10, 900)})\n[stacktrace]\n{frames}#{len(frames.splitlines())} {{main}}\n"}}\n')
+
+
+def _apache(rng: random.Random, fields: _Fields, when: datetime) -> str:
+    module, message = rng.choice(_APACHE_MESSAGES)
+    stamp = when.strftime("%a %b %d %H:%M:%S") + f".{when.microsecond:06d} {when.year}"
+    return f"[{stamp}] [{module}] [pid {rng.randint(100, 9999)}] {fields.fill(message)}\n"
+
+
+def _mysql(rng: random.Random, fields: _Fields, when: datetime) -> str:
+    level, code, subsystem, message = rng.choice(_MYSQL_MESSAGES)
+    stamp = when.strftime("%Y-%m-%dT%H:%M:%S") + f".{when.microsecond:06d}Z"
+    return f"{stamp} {rng.randint(0, 999)} [{level}] [{code}] [{subsystem}] {fields.fill(message)}\n"
+
+
+def _asterisk(rng: random.Random, fields: _Fields, when: datetime) -> str:
+    level, source, message = rng.choice(_ASTERISK_MESSAGES)
+    return f"{when.strftime('[%Y-%m-%d %H:%M:%S]')} {level}[{rng.randint(1000, 9999)}] {source}: {fields.fill(message)}\n"
+
+
+def _nginx(rng: random.Random, fields: _Fields, when: datetime) -> str:
+    level, message = rng.choice(_NGINX_MESSAGES)
+    pid = rng.randint(100, 9999)
+    return f"{when.strftime('%Y/%m/%d %H:%M:%S')} [{level}] {pid}#{pid}: *{rng.randint(1, 99999)} {fields.fill(message)}\n"
+
+
+def _syslog(rng: random.Random, fields: _Fields, when: datetime) -> str:
+    process, message = rng.choice(_SYSLOG_MESSAGES)
+    stamp = f"{when.strftime('%b')} {when.day:2d} {when.strftime('%H:%M:%S')}"
+    return f"{stamp} web-{rng.randint(1, 4)} {process}[{rng.randint(100, 99999)}]: {fields.fill(message)}\n"
+
+
+_WRITERS: Dict[str, Callable[[random.Random, _Fields, datetime], str]] = {
+    "laravel": _laravel, "apache": _apache, "mysql": _mysql,
+    "asterisk": _asterisk, "nginx": _nginx, "syslog": _syslog,
+}
+
+
+def generate_entries(log_format: str, seed: int = 0) -> Iterator[str]:
+    """
+    Endless, deterministic stream of log entries (each ending in a newline;
+    Laravel errors span several lines with a stack trace). Timestamps start
+    at START_TIME and move forward by random sub-second steps.
+    """
+    if log_format not in _WRITERS:
+        raise ValueError(f"Unknown log format: {log_format} (choose from {', '.join(FORMATS)})")
+    rng = random.Random(f"{log_format}:{seed}")
+    fields = _Fields(rng)
+    write = _WRITERS[log_format]
+    when = START_TIME
+    while True:
+        when += timedelta(microseconds=rng.randint(1, 900_000))
+        yield write(rng, fields, when)
+
+
+def write_log(path: str, log_format: str, size: int, seed: int = 0) -> int:
+    """
+    Writes whole entries until the file reaches at least `size` bytes and
+    returns the number of bytes written. Output is streamed in ~1 MB blocks,
+    so 10 GB files need no more memory than 1 MB ones.
+    """
+    parent = os.path.dirname(path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    written = 0
+    block = []
+    block_size = 0
+    with open(path, "wb") as f:
+        for entry in generate_entries(log_format, seed):
+            data = entry.encode("utf-8")
+            block.append(data)
+            block_size += len(data)
+            if block_size >= 1 << 20 or written + block_size >= size:
+                f.write(b"".join(block))
+                written += block_size
+                block = []
+                block_size = 0
+                if written >= size:
+                    break
+    return written
+
+
+def cached_log(log_format: str, size: int, seed: int = 0, directory: str = "./.cache/bench") -> str:
+    """Path of a generated log, generating it only if it does not exist yet."""
+    path = os.path.join(directory, f"{log_format}-{size}-{seed}.log")
+    if not os.path.exists(path):
+        started = time.perf_counter()
+        tmp_path = f"{path}.tmp"
+        write_log(tmp_path, log_format, size, seed)
+        os.replace(tmp_path, path)
+        logger.info(f"Generated {path} in {time.perf_counter() - started:.1f}s")
+    return path
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description="Generate deterministic synthetic logs for benchmarking.")
+    parser.add_argument("format", choices=FORMATS)
+    parser.add_argument("size", help="Target size, e.g. 1MB, 250MB, 10GB.")
+    parser.add_argument("-o", "--output", help="Output file (default: <format>-<size>.log).")
+    parser.add_argument("--seed", type=int, default=0, help="Same seed, same bytes.")
+    args = parser.parse_args(argv)
+
+    size = parse_size(args.size)
+    output = args.output or f"{args.format}-{args.size}.log"
+    written = write_log(output, args.format, size, args.seed)
+    print(f"Wrote {written} bytes to {output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
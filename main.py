@@ -1,78 +1,286 @@
 import streamlit as st
-import pandas as pd
+import logging
 import os
-import sys
+import time
+from typing import Any, Dict
 from dotenv import load_dotenv
-from langchain.callbacks.tracers import LangChainTracer
-from langsmith import Client
-from langchain.callbacks.manager import CallbackManager
-from langchain.globals import set_llm_cache
-from langchain.cache import InMemoryCache
-from summarizer import summarize_logs,summarize_log_entries  # Import the summarization function
-from upload_convert_file import load_file, convert_content_binary_json
-from export_log import export_pdf, export_excel
-from log_type import detect_log_type,extract_unique_entries,categorize_error
-from log_format_detector import analyze_log_format
-from file_utils import detect_log_type, read_log_file,launch_ui,chunk_large_file,get_error_suggestions,normalize_logs,export_suggestions,normalize_log_file_content
+# Only light modules are imported here; langchain, the OpenAI SDK, pandas, numpy, pyarrow
+# and the export libraries load on first use so the upload widget shows up right away
+# (`python benchmark.py --check-startup` guards this).
+from file_utils import (STREAM_SAMPLE_BYTES, detect_log_format, detect_stream_format, launch_ui,
+                        open_log_stream, render_header, sample_for_discovery)
+from pipeline import STAGE_CACHE_DIR, LogPipeline, StageCache
+from snapshot_cache import load_snapshot
+from stream_pipeline import stream_analysis
+from search_index import SearchIndex
+from result_views import ResultTable, render_paginated_table
+from analysis_store import AnalysisStore
+from profiling import PROFILING_ENABLED, StageProfiler
+from metrics import REGISTRY, capture_timings, summarize_timings
+from jobs import JobQueue, JOB_QUEUED, JOB_RUNNING, job_progress
 
 
 # Load environment variables from .env file
 
 load_dotenv()
 
-set_llm_cache(InMemoryCache())
-# initialize the tracer
-if os.getenv("LANGCHAIN_TRACING_V2","false").lower() == "true":
-    tracer = LangChainTracer()
-    # Create a callback manager with the tracer
-    callback_manager = CallbackManager([tracer])
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "DEBUG").upper(), format="%(levelname)s:%(name)s:%(message)s")
+# Suppress watchdog debug logs by setting its level to WARNING or ERROR
+logging.getLogger("watchdog").setLevel(logging.WARNING)
+logging.getLogger("watchdog.observers.inotify_buffer").setLevel(logging.WARNING)
+logger = logging.getLogger(__name__)
 
 
+@st.cache_resource
+def configure_langchain() -> None:
+    """LangChain LLM cache and tracing, set up once, right before the first LLM stage needs them."""
+    from langchain.cache import InMemoryCache
+    from langchain.globals import set_llm_cache
+
+    set_llm_cache(InMemoryCache())
+    # Tracing needs no setup here: with LANGCHAIN_TRACING_V2=true LangChain attaches its
+    # LangSmith tracer to every run on its own.
+
+
+@st.cache_resource
+def get_stage_cache() -> StageCache:
+    """
+    Process-wide stage cache, so reruns and widget interactions reuse
+    everything whose input did not change instead of starting over.
+    """
+    return StageCache(disk_dir=STAGE_CACHE_DIR)
+
+
+@st.cache_resource
+def get_analysis_store() -> AnalysisStore:
+    return AnalysisStore()
+
+
+# Hand the analysis to the workers in jobs.py instead of running it in the script thread
+BACKGROUND_JOBS = os.getenv("LOG_ANALYZER_BACKGROUND", "false").lower() == "true"
+
+
+@st.cache_resource
+def get_job_queue() -> JobQueue:
+    return JobQueue()
+
+
+def _joined_resources(row: Dict[str, Any]) -> Dict[str, Any]:
+    # Jobs stored before results came from the snapshot kept resources as a list
+    if isinstance(row.get("resources"), list):
+        row["resources"] = ", ".join(row["resources"])
+    return row
+
+
+def run_as_background_job():
+    """
+    Submits the upload to the job queue and polls it.
+
+    The job id is kept in the URL, so reloading the page (or opening it in
+    another tab) reattaches to the running job instead of starting over.
+    """
+    queue = get_job_queue()
+    job_id = st.query_params.get("job")
+
+    if job_id:
+        # Polling reruns: the upload was submitted once already
+        render_header()
+        if st.button("📁 Analyze another file"):
+            del st.query_params["job"]
+            st.rerun()
+    else:
+        file_path = launch_ui()
+        job_id = queue.submit(file_path)
+        st.query_params["job"] = job_id
+
+    job = queue.get(job_id)
+    if job is None:
+        st.error(f"Unknown job: {job_id}")
+        del st.query_params["job"]
+        st.stop()
+
+    st.subheader(f"⚙️ Analysis job for {job['file_name']}")
+    fraction, status = job_progress(job)
+    st.progress(fraction, text=status)
+    running = job["status"] in (JOB_QUEUED, JOB_RUNNING)
+
+    regex_patterns = queue.results(job_id, "pattern")
+    if regex_patterns:
+        st.subheader("🔍 Discovered Regex Patterns")
+        st.json(regex_patterns, expanded=False)
+
+    # Rows are read page by page from the queue; only the visible page is loaded.
+    # Filters need a scan of a column, so they wait until the job (and its row count) is final.
+    normalized_logs = queue.result_rows(job_id, "entry")
+    if normalized_logs:
+        render_paginated_table("📜 Normalized Log Entries",
+                               ResultTable(normalized_logs, cache_id=f"job:{job_id}:entries"),
+                               key="normalized", filter_columns=[] if running else None)
+
+    summary_rows = queue.result_rows(job_id, "summary", convert=_joined_resources)
+    if summary_rows:
+        render_paginated_table("🧠 Log Summaries", ResultTable(summary_rows, cache_id=f"job:{job_id}:summaries"),
+                               key="summaries", page_size=20, filter_columns=[])
+
+    if running:
+        time.sleep(2)
+        st.rerun()
+
+
+def render_summary_downloads(summary_rows):
+    from export_log import export_excel, export_pdf
+
+    col1, col2 = st.columns(2)
+    with col1:
+        with export_excel(summary_rows) as excel:
+            st.download_button("📥 Download Excel", excel.read(), file_name="log_summary.xlsx")
+    with col2:
+        with export_pdf(summary_rows) as pdf:
+            st.download_button("📥 Download PDF", pdf.read(), file_name="log_summary.pdf")
+
+
+@st.cache_resource(max_entries=8)
+def get_snapshot_index(snapshot_key: str, _snapshot) -> SearchIndex:
+    return SearchIndex().add_all(_snapshot.entries)
+
+
+def render_snapshot(snapshot):
+    """Shows a previously saved analysis of the same file content."""
+    meta = snapshot.meta
+    st.success(f"⚡ This file was already analyzed (pipeline v{meta.get('pipeline_version')}); "
+               f"loaded {meta['entries']} entries and {meta['summaries']} summaries from the snapshot.")
+    st.info(f"Detected log type: {meta.get('log_type')}")
+    st.info(f"Pattern used for detection: {meta.get('pattern')}")
+    render_results(snapshot)
+
+
+def render_results(snapshot):
+    """Templates, entries, error rate and summaries of an analysis, all read from its snapshot."""
+    snapshot_key = snapshot.meta["key"]
+    render_paginated_table("🧩 Message Templates", ResultTable(snapshot.clusters, cache_id=f"{snapshot_key}:clusters"),
+                           key="clusters", page_size=20, filter_columns=[])
+    if len(snapshot.entries):
+        render_paginated_table("📜 Normalized Log Entries",
+                               ResultTable(snapshot.entries, index=get_snapshot_index(snapshot_key, snapshot),
+                                           cache_id=f"{snapshot_key}:entries"),
+                               key="normalized")
+    else:
+        st.error("No normalized log entries found. Please check the regex patterns or log content.")
+    if snapshot.error_rate is not None:
+        render_error_rate(snapshot.error_rate, snapshot.meta.get("errors", 0))
+    render_paginated_table("🧠 Log Summaries", ResultTable(snapshot.summaries, cache_id=f"{snapshot_key}:summaries"),
+                           key="summaries", page_size=20, filter_columns=[])
+    if len(snapshot.summaries):
+        render_summary_downloads(snapshot.summaries)
+
+
+def render_error_rate(cells, errors, top=8):
+    """Errors per minute/hour/day for the most frequent error templates, from per-minute counts."""
+    import pandas as pd
+    from timestamps import BUCKET_SECONDS, ErrorRate
+
+    st.subheader("📈 Error Rate")
+    bucket = st.selectbox("Bucket", list(BUCKET_SECONDS), index=1, key="error_rate_bucket")
+
+    hist = ErrorRate.from_rows(cells, errors).histogram(bucket)
+    if not len(hist.counts):
+        st.info("No timestamped error entries to chart.")
+        return
+
+    frame = pd.DataFrame({
+        "time": pd.to_datetime(hist.bucket_starts, unit="s"),
+        "template": hist.templates[hist.template_ids],
+        "count": hist.counts,
+    })
+    top_templates = frame.groupby("template")["count"].sum().nlargest(top).index
+    chart = (frame[frame["template"].isin(top_templates)]
+             .pivot_table(index="time", columns="template", values="count", aggfunc="sum", fill_value=0))
+    st.bar_chart(chart)
+    st.caption(f"{errors} error entries, {len(set(hist.template_ids.tolist()))} error templates; "
+               f"top {len(top_templates)} shown per {bucket}.")
+
+
+def render_timing_panel(timings, total_seconds):
+    """Where the time of this run went, stage by stage."""
+    import pandas as pd
+
+    rows = summarize_timings(timings)
+    if not rows:
+        return
+    with st.expander(f"⏱️ Stage timings (run took {total_seconds:.2f}s)"):
+        st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+        st.caption("Stages nest (`pipeline.*` rows include the functions they call), so times do not add up; "
+                   "stages served from cache do not appear.")
+
 
 # main function to run the Streamlit app
 def main():
-    
-       st.cache_data.clear()
-       st.cache_resource.clear()
+       if BACKGROUND_JOBS:
+           run_as_background_job()
+           return
+
+       profiler = StageProfiler() if PROFILING_ENABLED else None
+       started = time.perf_counter()
+       try:
+           with capture_timings() as timings:
+               analyze_upload(profiler)
+           render_timing_panel(timings, time.perf_counter() - started)
+           REGISTRY.write_textfile()
+           if profiler is not None:
+               render_profile_report(profiler)
+       finally:
+           if profiler is not None:
+               profiler.close()
+
+
+def render_profile_report(profiler):
+    """Offers the profile of this run for download (it is also saved under PROFILE_DIR)."""
+    if not profiler.calls:
+        st.caption("🔬 Profiling is on, but every stage came from the cache; nothing was profiled.")
+        return
+    report = profiler.report()
+    profiler.save(report)
+    st.download_button("🔬 Download Profile Report", report, file_name="pipeline_profile.txt",
+                       mime="text/plain")
+
+
+def analyze_upload(profiler=None):
+       pipeline = LogPipeline(get_stage_cache(), profiler=profiler)
+
        # Step 1: Launch Streamlit UI to upload a log file
        file_path = launch_ui()
+       file_name = os.path.basename(file_path)
 
-       # Step 2: Detect log type and read content
-       log_type = detect_log_type(file_path)
-       content = read_log_file(file_path)
+       # Step 2: Detect log type. The upload is keyed (and later processed) as a stream;
+       # it is never read into memory as a whole.
+       pipeline.read_key(file_path)
+       log_type = pipeline.detect(file_path)
 
-       print(f"Detected log type: {log_type}")
+       logger.debug(f"Detected log type: {log_type}")
 
-       # Step 3: Chunk large file if needed
-       chunks = chunk_large_file(content)
-       #print(f"Number of chunks created: {len(chunks)}")
-       #print(f"First chunk content: {chunks[0][:100]}...")  # Display first 100 characters of the first chunk
-       # Display chunks in Streamlit DataFrame
+       # Same content analyzed before by this pipeline version: reuse it instead of calling the LLM again
+       snapshot = load_snapshot(pipeline.keys["read"])
+       if snapshot is not None:
+           render_snapshot(snapshot)
+           return
 
-       if chunks:
-           df_chunks = pd.DataFrame({'Chunk Number': range(1, len(chunks)+1), 'Content': chunks})
-           st.subheader("🔍 Log Chunks Preview")
-           st.dataframe(df_chunks, use_container_width=True)
-       else:
+       # Step 3: Detect entry boundaries from the head; the file is chunked as it streams through in step 5
+       with open_log_stream(file_path) as stream:
+           sample = stream.read(STREAM_SAMPLE_BYTES)
+       if not sample.strip():
            st.error("No valid log chunks found. Please check the file content.")
-           
-
-
-       # Step 4: Send chunks to LLM for log analysis and pattern discovery
-       if not chunks:
            raise ValueError("No valid log chunks found. Please check the file content.")
-       
-       if len(chunks) <= 5:
-           selected_chunks = chunks
-           #print(f"Using all {len(chunks)} chunks for analysis.")
-       else:
-           selected_chunks = [chunks[0]]
-       #print(f"Selected {len(selected_chunks)} chunks for analysis.")
-       #print("Type of selected_chunks:", type(selected_chunks))
-       #print("Sample content:", selected_chunks[:1])
-       regex_patterns = get_error_suggestions(selected_chunks, mode="pattern_discovery")
+       _, boundary_pattern = detect_log_format(sample)
+       # Filled in once the whole file has been chunked
+       chunk_preview = st.container()
+
+       # Step 4: Send lines sampled across the whole file, every line shape included, for pattern discovery
+       with open_log_stream(file_path) as stream:
+           selected_chunks = sample_for_discovery(stream)
+       configure_langchain()
+       regex_patterns = pipeline.discover(selected_chunks, mode="pattern_discovery")
 
-       print(f"Discovered regex patterns: {regex_patterns}")
+       logger.debug(f"Discovered regex patterns: {regex_patterns}")
          # Display regex patterns in Streamlit
        st.subheader("🔍 Discovered Regex Patterns")
 
@@ -80,66 +288,72 @@ def main():
            st.json(regex_patterns, expanded=False)
        else:
            st.error("No regex patterns were discovered. Please check the log content or try a different file.")
-       
 
-       # Step 5: Normalize binary or plain logs to JSON using discovered patterns
-       #normalized_logs = normalize_logs(content, regex_patterns)
-       normalized_logs = normalize_log_file_content(content)
 
-       print(f"Number of normalized log entries: {len(normalized_logs)}")
-       # Display normalized logs in Streamlit
-       st.subheader("📜 Normalized Log Entries")
+       # Step 5: Normalize, record and summarize the file as one stream of bounded batches
+       try:
+           normalized_log_type, pattern, structured = detect_stream_format(sample)
+       except ValueError as e:
+           st.error("Failed to learn log pattern. Please check the log format.")
+           st.error(str(e))
+           raise
+       st.info(f"Detected log type: {normalized_log_type}")
+       st.info(f"Pattern used for detection: {pattern}")
+
+       progress = st.progress(0.0, text="Normalizing and summarizing...")
 
+       def show_progress(result):
+           progress.progress(result.fraction_read,
+                             text=f"{result.entry_count} entries processed, "
+                                  f"{result.llm_calls} signatures sent to the LLM")
 
-       if normalized_logs:
-          st.json(normalized_logs[:5], expanded=False)
+       os.makedirs("data/cleaned", exist_ok=True)
+       result = stream_analysis(pipeline, get_analysis_store(), file_path, file_name, normalized_log_type,
+                                pattern, structured, boundary_pattern, progress=show_progress,
+                                export_path="data/cleaned/structured_logs.ndjson")
+       progress.empty()
+       logger.debug(f"Number of normalized log entries: {result.entry_count}")
+
+       with chunk_preview:
+           chunk_rows = [{"Chunk Number": idx, "Content": chunk}
+                         for idx, chunk in enumerate(result.preview_chunks, start=1)]
+           render_paginated_table("🔍 Log Chunks Preview", ResultTable(chunk_rows), key="chunks",
+                                  page_size=10, filter_columns=[])
+           if result.chunk_count > len(chunk_rows):
+               st.caption(f"Showing the first {len(chunk_rows)} of {result.chunk_count} chunks.")
+
+       # Step 6: What this upload added to the analysis history
+       if result.new_signatures:
+           st.info(f"🆕 {len(result.new_signatures)} error signatures seen for the first time.")
+       elif not result.already_ingested:
+           st.info("No new error signatures; every entry matches one seen in an earlier upload.")
+
+       st.success("✅ Summary complete!")
+       render_results(result.snapshot)
+
+       if pipeline.recomputed:
+           st.caption(f"♻️ Recomputed stages: {', '.join(pipeline.recomputed)}")
        else:
-          st.error("No normalized log entries found. Please check the regex patterns or log content.")
-       
-
-       for idx, error_entry in enumerate(normalized_logs, start=1):
-           print(f"Processing error #{idx}: {error_entry}")
-           # Display error entry in Streamlit
-           #st.subheader("🔍 Error Entry")
-           # Display the error entry 
-           #st.info(f"Error Entry: {error_entry}")
-              # Send to LLM for summarization
-           summaries = summarize_log_entries(error_entry) 
-           print(f"Summaries: {summaries}")
-          
-           df = pd.DataFrame({
-                            "log": error_entry,
-                            "Message": summaries[0]["message"],
-                            "summary": summaries[0]["summary"],
-                            "fix_suggestion": summaries[0]["fix_suggestion"],
-                            "code_fix": summaries[0]["code_fix"],
-                            "code_location": summaries[0]["code_location"],
-                            "resources":list(summaries[0]["resources"])# [", ".join(summaries[0]["resources"])]
-                        })
-           st.success("✅ Summary complete!")
-           st.dataframe(df) 
-          
-       sys.exit(0)
-            #send_to_llm(error_entry)
-           
-
-       # Step 6: Export the structured logs
-       export_suggestions(normalized_logs, output_path="data/cleaned/structured_logs.json")
+           st.caption("♻️ All stages reused from cache.")
+       if pipeline.coalesced:
+           stats = pipeline.cache.stats()
+           st.caption(f"🤝 Waited for results another session was already computing: {', '.join(pipeline.coalesced)} "
+                      f"({stats['coalesced'] + stats['coalesced_shared']} waits, "
+                      f"{stats['computed']} computations since the server started).")
+
+       if not result.exported:
+           return
 
        # Step 7: Display summary in Streamlit
        st.subheader("✅ Log Summary")
-       st.success(f"{len(normalized_logs)} structured log entries have been generated.")
-
-        # Optional: Show first few entries
-       st.json(normalized_logs[:5], expanded=False)
+       st.success(f"{result.entry_count} structured log entries have been generated.")
 
        # Optional: Offer download
-       with open("data/cleaned/structured_logs.json", "rb") as f:
-        st.download_button("📥 Download Structured Logs", f, file_name="structured_logs.json", mime="application/json")
+       with open("data/cleaned/structured_logs.ndjson", "rb") as f:
+        st.download_button("📥 Download Structured Logs", f, file_name="structured_logs.ndjson", mime="application/x-ndjson")
+
 
 
-            
-            
 
 # call the main function to run the app
 # 
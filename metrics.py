@@ -0,0 +1,236 @@
+# ai_file_agent/metrics.py
+
+import contextvars
+import functools
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# When set, `write_textfile()` targets this path (for node_exporter's textfile collector)
+METRICS_TEXTFILE = os.getenv("LOG_ANALYZER_METRICS_TEXTFILE")
+
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_HELP = {
+    "log_analyzer_stage_seconds": ("histogram", "Wall time spent in a stage."),
+    "log_analyzer_stage_input_bytes_total": ("counter", "Input size handled by a stage (characters for text)."),
+    "log_analyzer_stage_entries_total": ("counter", "Items (entries, chunks, summaries) produced by a stage."),
+    "log_analyzer_stage_errors_total": ("counter", "Stage calls that raised."),
+    "log_analyzer_queue_wait_seconds": ("histogram", "Time spent waiting on a queue or concurrency slot."),
+    "log_analyzer_pipeline_cache_hits_total": ("counter", "Pipeline stages served from the stage cache."),
+    "log_analyzer_pipeline_coalesced_total": ("counter", "Pipeline stages that waited for the same computation in flight."),
+    "log_analyzer_summary_retrieval_total": ("counter", "Summaries by use of past diagnoses: reused, related or none."),
+    "log_analyzer_regex_batch_seconds": ("histogram", "Time to match a batch of lines against a discovered pattern."),
+    "log_analyzer_regex_timeouts_total": ("counter", "Batches that overran a discovered pattern's time budget."),
+    "log_analyzer_llm_replies_total": ("counter", "LLM replies by parse outcome: valid, repaired, partial or malformed."),
+    "log_analyzer_llm_reasks_total": ("counter", "Follow-up LLM requests for summary fields a reply left out."),
+}
+
+
+class _Histogram:
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+
+class MetricsRegistry:
+    """
+    Process-wide counters and histograms, rendered in the Prometheus text
+    exposition format. Thread-safe; stdlib only.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], _Histogram] = {}
+
+    @staticmethod
+    def _labels(labels: Dict[str, str]) -> Labels:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        key = (name, self._labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets: Tuple[float, ...] = DURATION_BUCKETS, **labels: str) -> None:
+        key = (name, self._labels(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(buckets)
+            histogram.observe(value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def render_prometheus(self) -> str:
+        def fmt_labels(labels: Labels, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+            pairs = labels + extra
+            if not pairs:
+                return ""
+            escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                       for k, v in pairs)
+            return "{" + ",".join(escaped) + "}"
+
+        with self._lock:
+            names = sorted({name for name, _ in self._counters} | {name for name, _ in self._histograms})
+            lines: List[str] = []
+            for name in names:
+                kind, help_text = _HELP.get(name, ("untyped", name))
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for (metric, labels), value in sorted(self._counters.items()):
+                    if metric == name:
+                        lines.append(f"{name}{fmt_labels(labels)} {value:g}")
+                for (metric, labels), histogram in sorted(self._histograms.items(), key=lambda item: item[0]):
+                    if metric != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{fmt_labels(labels, (('le', f'{bound:g}'),))} {cumulative}")
+                    lines.append(f"{name}_bucket{fmt_labels(labels, (('le', '+Inf'),))} {histogram.count}")
+                    lines.append(f"{name}_sum{fmt_labels(labels)} {histogram.sum:.6f}")
+                    lines.append(f"{name}_count{fmt_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path: Optional[str] = None) -> Optional[str]:
+        """
+        Atomically writes the metrics to `path` (default LOG_ANALYZER_METRICS_TEXTFILE),
+        e.g. for node_exporter's textfile collector. Does nothing when no path is set.
+        """
+        path = path or METRICS_TEXTFILE
+        if not path:
+            return None
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(prefix=".metrics-", dir=directory)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(self.render_prometheus())
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write metrics to {path}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return None
+        return path
+
+
+REGISTRY = MetricsRegistry()
+
+# Timings of the current run (e.g. one Streamlit script run), when someone is capturing them
+_run_timings: contextvars.ContextVar[Optional[List[Dict[str, Any]]]] = contextvars.ContextVar(
+    "run_timings", default=None
+)
+
+
+class Measurement:
+    """Handle yielded by `track`; set `bytes`/`entries` once they are known."""
+
+    def __init__(self, stage: str, bytes: int = 0, entries: int = 0):
+        self.stage = stage
+        self.bytes = bytes
+        self.entries = entries
+        self.seconds = 0.0
+
+
+@contextmanager
+def track(stage: str, bytes: int = 0, entries: int = 0) -> Iterator[Measurement]:
+    """Times a block as `stage` and records its size counters, also on error."""
+    measurement = Measurement(stage, bytes, entries)
+    start = time.perf_counter()
+    try:
+        yield measurement
+    except BaseException:
+        REGISTRY.inc("log_analyzer_stage_errors_total", stage=stage)
+        raise
+    finally:
+        measurement.seconds = time.perf_counter() - start
+        REGISTRY.observe("log_analyzer_stage_seconds", measurement.seconds, stage=stage)
+        if measurement.bytes:
+            REGISTRY.inc("log_analyzer_stage_input_bytes_total", measurement.bytes, stage=stage)
+        if measurement.entries:
+            REGISTRY.inc("log_analyzer_stage_entries_total", measurement.entries, stage=stage)
+        timings = _run_timings.get()
+        if timings is not None:
+            timings.append({"stage": stage, "seconds": measurement.seconds,
+                            "bytes": measurement.bytes, "entries": measurement.entries})
+
+
+def _size(value: Any) -> int:
+    return len(value) if isinstance(value, (str, bytes, bytearray)) else 0
+
+
+def timed(stage: str, bytes_arg: Optional[int] = 0, count_result: bool = False) -> Callable:
+    """
+    Decorator form of `track`. The size of positional argument `bytes_arg`
+    (if it is text or bytes) is recorded as input bytes, and with
+    `count_result` the length of the returned sequence as entries.
+    """
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            size = _size(args[bytes_arg]) if bytes_arg is not None and len(args) > bytes_arg else 0
+            with track(stage, bytes=size) as measurement:
+                result = fn(*args, **kwargs)
+                if count_result and hasattr(result, "__len__"):
+                    measurement.entries = len(result)
+                return result
+        return wrapper
+    return decorator
+
+
+def record_wait(queue: str, seconds: float) -> None:
+    """Records time spent blocked on a queue or waiting for a concurrency slot."""
+    REGISTRY.observe("log_analyzer_queue_wait_seconds", seconds, queue=queue)
+
+
+@contextmanager
+def capture_timings() -> Iterator[List[Dict[str, Any]]]:
+    """Collects every `track` in this context (thread) into a list, for an in-app timing panel."""
+    timings: List[Dict[str, Any]] = []
+    token = _run_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _run_timings.reset(token)
+
+
+def summarize_timings(timings: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Groups captured timings by stage: calls, total seconds, bytes, entries and throughput."""
+    rows: Dict[str, Dict[str, Any]] = {}
+    for timing in timings:
+        row = rows.setdefault(timing["stage"], {"stage": timing["stage"], "calls": 0, "seconds": 0.0,
+                                                "bytes": 0, "entries": 0})
+        row["calls"] += 1
+        row["seconds"] += timing["seconds"]
+        row["bytes"] += timing["bytes"]
+        row["entries"] += timing["entries"]
+    for row in rows.values():
+        seconds = row["seconds"] or 1e-9
+        row["MB/s"] = round(row["bytes"] / seconds / 1e6, 2) if row["bytes"] else None
+        row["entries/s"] = round(row["entries"] / seconds, 1) if row["entries"] else None
+        row["seconds"] = round(row["seconds"], 4)
+    return sorted(rows.values(), key=lambda row: -row["seconds"])
@@ -0,0 +1,536 @@
+# ai_file_agent/pipeline.py
+
+import hashlib
+import json
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+from itertools import islice
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+from file_utils import (
+    STREAM_SAMPLE_BYTES,
+    decode_log_bytes,
+    detect_log_type,
+    detect_log_format,
+    detect_stream_format,
+    chunk_content_defined,
+    get_error_suggestions,
+    iter_normalized_entries,
+)
+from metrics import REGISTRY, track
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever a stage changes its output format so memoized results are not reused
+PIPELINE_VERSION = "2"
+
+STAGES = ["read", "detect", "chunk", "discover", "normalize", "normalize_chunk", "summarize"]
+
+# Shared on disk by every process (Streamlit sessions, API, job workers) so they reuse each other's results
+STAGE_CACHE_DIR = os.getenv("LOG_ANALYZER_STAGE_CACHE_DIR", "./.cache/stages")
+# Approximate size of the values the in-memory tier may hold; larger values go to the disk tier only
+STAGE_CACHE_MEMORY_BYTES = int(float(os.getenv("LOG_ANALYZER_STAGE_CACHE_MEMORY_MB", "256")) * 1024 ** 2)
+# How long a lease on a shared key lasts without being renewed; holders renew it every third of that
+# while they compute, so it only runs out when the holder is gone (or hung)
+INFLIGHT_LEASE_SECONDS = float(os.getenv("LOG_ANALYZER_INFLIGHT_LEASE", "30"))
+# How often a process waiting on another process's computation looks for its result
+INFLIGHT_POLL_SECONDS = 0.2
+
+# Where get_or_compute found its value
+CACHE_HIT = "hit"
+COMPUTED = "computed"
+COALESCED = "coalesced"            # waited on the same computation in this process
+COALESCED_SHARED = "coalesced_shared"  # waited on the same computation in another process
+
+
+def content_hash(*parts: Any) -> str:
+    """
+    Build a stable SHA-256 key from the given parts.
+
+    Bytes and strings are hashed as-is, anything else is hashed through its
+    JSON representation. Each part is length-prefixed so ("ab", "c") and
+    ("a", "bc") never collide.
+    """
+    digest = hashlib.sha256()
+    _hash_parts(digest, parts)
+    return digest.hexdigest()
+
+
+def _hash_parts(digest, parts) -> None:
+    for part in parts:
+        if isinstance(part, bytes):
+            data = part
+        elif isinstance(part, str):
+            data = part.encode("utf-8", errors="surrogatepass")
+        else:
+            data = json.dumps(part, sort_keys=True, default=str).encode("utf-8")
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+
+
+def file_content_hash(file_path: str, *parts: Any) -> str:
+    """
+    `content_hash(*parts, <file bytes>)` computed by streaming the file in
+    1 MB blocks, so a large upload is never held in memory just to key it.
+    """
+    digest = hashlib.sha256()
+    _hash_parts(digest, parts)
+    digest.update(os.path.getsize(file_path).to_bytes(8, "big"))
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+_MISSING = object()
+# Items of a container measured to estimate its size
+_SIZE_SAMPLE = 32
+
+
+def approx_size(value: Any, depth: int = 0) -> int:
+    """
+    Rough size in bytes of a stage result: exact for strings and bytes, and
+    extrapolated from a sample of the items for lists, tuples, sets and
+    dicts (entry lists can hold millions of rows; walking them all would cost
+    more than the cache saves).
+    """
+    size = sys.getsizeof(value)
+    if depth >= 3 or isinstance(value, (str, bytes, bytearray)):
+        return size
+    if isinstance(value, dict):
+        items = list(islice(value.items(), _SIZE_SAMPLE))
+        sampled = sum(approx_size(k, depth + 1) + approx_size(v, depth + 1) for k, v in items)
+    elif isinstance(value, (list, tuple)):
+        step = max(1, len(value) // _SIZE_SAMPLE)
+        items = value[::step][:_SIZE_SAMPLE]
+        sampled = sum(approx_size(item, depth + 1) for item in items)
+    elif isinstance(value, (set, frozenset)):
+        items = list(islice(value, _SIZE_SAMPLE))
+        sampled = sum(approx_size(item, depth + 1) for item in items)
+    else:
+        return size
+    return size + (sampled * len(value) // len(items) if items else 0)
+
+
+def _read(path: str) -> str:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+
+def _pid_namespace() -> str:
+    """
+    Identifies the set of processes whose pids this process can check: the
+    kernel (boot id) and the pid namespace. Containers sharing a cache
+    directory (see compose.yaml) each have their own pid namespace.
+    """
+    try:
+        namespace = os.readlink("/proc/self/ns/pid")
+    except OSError:
+        namespace = socket.gethostname()
+    return f"{_read('/proc/sys/kernel/random/boot_id')}/{namespace}"
+
+
+def _process_started(pid: int) -> str:
+    """When `pid` started, in clock ticks since boot ("" if unknown); tells a recycled pid apart."""
+    stat = _read(f"/proc/{pid}/stat")
+    # Field 22, counted after the command name, which is in parentheses and may contain spaces
+    fields = stat.rpartition(")")[2].split()
+    return fields[19] if len(fields) > 19 else ""
+
+
+_NAMESPACE = _pid_namespace()
+
+
+def _process_alive(pid: int, started: str = "") -> bool:
+    """Whether `pid` is a running process of this pid namespace, and the one that started at `started`."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return not started or _process_started(pid) in ("", started)
+
+
+class StageCache:
+    """
+    Thread-safe LRU store of stage outputs keyed by content hash.
+
+    The in-memory tier is bounded by the approximate size of its values
+    (`max_bytes`, see `approx_size`) as well as by their number. With a
+    disk tier, a value larger than a quarter of `max_bytes` (a whole file's
+    content or entry list) is only kept on disk.
+
+    One instance is meant to live for the whole server process (see
+    `st.cache_resource` in main.py) so results survive Streamlit reruns.
+    With `disk_dir`, persisted stages are also kept in a diskcache
+    directory, so chunk-level results are reused across restarts, across
+    successive versions of a rotated or appended log, and across processes.
+
+    `get_or_compute` is single-flight: while a key is being computed, other
+    callers asking for it wait for that computation instead of starting
+    their own. Within the process they share its result (or exception);
+    for persisted stages, processes sharing `disk_dir` (on this host or in
+    other containers) coordinate through a lease on the key, renewed while
+    its holder computes, and wait for the result to land on disk.
+    """
+
+    def __init__(self, max_entries: int = 2048, disk_dir: Union[str, None] = None,
+                 disk_size_limit: int = 2 * 1024 ** 3, max_bytes: int = STAGE_CACHE_MEMORY_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.memory_bytes = 0
+        self._items: "OrderedDict[str, Any]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.computed = 0
+        self.coalesced = 0
+        self.coalesced_shared = 0
+        self.wait_seconds = 0.0
+        self._disk = None
+        if disk_dir:
+            try:
+                from diskcache import Cache
+                self._disk = Cache(disk_dir, size_limit=disk_size_limit)
+            except ImportError:
+                logger.warning("diskcache is not installed; stage results are kept in memory only.")
+
+    def lookup(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return True, self._items[key]
+
+        if self._disk is not None:
+            value = self._disk.get(key, default=_MISSING)
+            if value is not _MISSING:
+                self._put_memory(key, value)
+                with self._lock:
+                    self.hits += 1
+                return True, value
+
+        with self._lock:
+            self.misses += 1
+        return False, None
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any], persist: bool = False,
+                       cacheable: Callable[[Any], bool] = lambda value: True) -> Tuple[str, Any]:
+        """
+        Returns (source, value): the cached value, or the result of the
+        computation of `key` already in flight, or `compute()`'s, which is
+        stored if `cacheable(value)`. `source` is CACHE_HIT, COALESCED,
+        COALESCED_SHARED or COMPUTED.
+
+        Raises:
+        - Whatever `compute` raised, in its caller and in the callers that
+          were waiting on it.
+        """
+        hit, value = self.lookup(key)
+        if hit:
+            return CACHE_HIT, value
+
+        with self._lock:
+            # The computation may have finished between the lookup and here
+            if key in self._items:
+                self._items.move_to_end(key)
+                return CACHE_HIT, self._items[key]
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            started = time.perf_counter()
+            try:
+                return COALESCED, future.result()
+            finally:
+                with self._lock:
+                    self.wait_seconds += time.perf_counter() - started
+
+        try:
+            if persist and self._disk is not None:
+                source, value = self._compute_shared(key, compute, cacheable)
+            else:
+                source, value = COMPUTED, self._compute(key, compute, persist, cacheable)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(value)
+            return source, value
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def _compute(self, key: str, compute: Callable[[], Any], persist: bool,
+                 cacheable: Callable[[Any], bool]) -> Any:
+        value = compute()
+        with self._lock:
+            self.computed += 1
+        if cacheable(value):
+            self.put(key, value, persist=persist)
+        return value
+
+    def _compute_shared(self, key: str, compute: Callable[[], Any],
+                        cacheable: Callable[[Any], bool]) -> Tuple[str, Any]:
+        """
+        Computes `key` under a lease other processes respect, or waits for
+        the process holding the lease to store the result. If that process
+        releases the lease without a result (it failed, or the result was not
+        cacheable), dies, or stops renewing the lease, the next waiter takes
+        over.
+        """
+        lease = f"inflight:{key}"
+        started = time.perf_counter()
+        while True:
+            holder = {"namespace": _NAMESPACE, "pid": os.getpid(),
+                      "started": _process_started(os.getpid()), "token": uuid.uuid4().hex}
+            # diskcache's add is atomic across processes: exactly one of them gets the lease
+            if self._disk.add(lease, holder, expire=INFLIGHT_LEASE_SECONDS):
+                stop = threading.Event()
+                heartbeat = threading.Thread(target=self._renew_lease, args=(lease, holder, stop),
+                                             name="stage-lease-heartbeat", daemon=True)
+                heartbeat.start()
+                try:
+                    return COMPUTED, self._compute(key, compute, True, cacheable)
+                finally:
+                    stop.set()
+                    heartbeat.join()
+                    with self._disk.transact():
+                        if self._disk.get(lease) == holder:
+                            self._disk.delete(lease)
+
+            with self._lock:
+                self.coalesced_shared += 1
+            while lease in self._disk:
+                time.sleep(INFLIGHT_POLL_SECONDS)
+                self._release_if_dead(lease)
+                value = self._disk.get(key, default=_MISSING)
+                if value is not _MISSING:
+                    self._put_memory(key, value)
+                    with self._lock:
+                        self.wait_seconds += time.perf_counter() - started
+                    return COALESCED_SHARED, value
+            value = self._disk.get(key, default=_MISSING)
+            if value is not _MISSING:
+                self._put_memory(key, value)
+                with self._lock:
+                    self.wait_seconds += time.perf_counter() - started
+                return COALESCED_SHARED, value
+            logger.info(f"In-flight computation of {key[:12]} ended without a result; computing it here")
+
+    def _renew_lease(self, lease: str, holder: Dict[str, Any], stop: threading.Event) -> None:
+        """Keeps `lease` from expiring while its holder computes (runs in a heartbeat thread)."""
+        while not stop.wait(INFLIGHT_LEASE_SECONDS / 3):
+            try:
+                with self._disk.transact():
+                    if self._disk.get(lease) != holder:
+                        return
+                    self._disk.touch(lease, expire=INFLIGHT_LEASE_SECONDS)
+            except Exception as e:
+                logger.warning(f"Could not renew the lease on a shared stage: {e}")
+
+    def _release_if_dead(self, lease: str) -> None:
+        """
+        Drops a lease whose holder died (so no result is coming) instead of
+        waiting for it to expire. Only holders in this pid namespace can be
+        checked; the others lose their lease when they stop renewing it.
+        """
+        holder = self._disk.get(lease)
+        if not isinstance(holder, dict) or holder.get("namespace") != _NAMESPACE \
+                or _process_alive(holder["pid"], holder.get("started", "")):
+            return
+        with self._disk.transact():
+            if self._disk.get(lease) == holder:
+                self._disk.delete(lease)
+                logger.warning(f"Process {holder['pid']} died while computing a shared stage; taking over")
+
+    def _put_memory(self, key: str, value: Any, size: Union[int, None] = None) -> bool:
+        """Keeps `value` in memory unless it is too large; returns whether it was kept."""
+        if size is None:
+            size = approx_size(value)
+        if size > self.max_bytes // 4:
+            return False
+        with self._lock:
+            self.memory_bytes += size - self._sizes.get(key, 0)
+            self._items[key] = value
+            self._sizes[key] = size
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries or self.memory_bytes > self.max_bytes:
+                evicted, _ = self._items.popitem(last=False)
+                self.memory_bytes -= self._sizes.pop(evicted)
+        return True
+
+    def put(self, key: str, value: Any, persist: bool = False) -> None:
+        kept = self._put_memory(key, value)
+        if self._disk is not None and (persist or not kept):
+            self._disk.set(key, value)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._sizes.clear()
+            self.memory_bytes = 0
+        if self._disk is not None:
+            self._disk.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit, miss and coalescing counts since the cache was created."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "computed": self.computed,
+                    "coalesced": self.coalesced, "coalesced_shared": self.coalesced_shared,
+                    "in_flight": len(self._inflight), "wait_seconds": round(self.wait_seconds, 3),
+                    "memory_entries": len(self._items), "memory_bytes": self.memory_bytes}
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class LogPipeline:
+    """
+    Runs the analysis stages (read -> detect -> chunk -> discover -> normalize -> summarize).
+
+    Every stage key is derived from the key of the stage that feeds it, so
+    large intermediate outputs are never re-hashed and a changed upload only
+    invalidates the stages downstream of it.
+
+    `profiler` (a profiling.StageProfiler) is only passed in profiling mode;
+    without one, stages run unwrapped.
+    """
+
+    def __init__(self, cache: Union[StageCache, None] = None, profiler=None):
+        self.cache = cache if cache is not None else StageCache()
+        self.profiler = profiler
+        self.keys: Dict[str, str] = {}
+        self.recomputed: List[str] = []
+        # Stages whose result came from a computation another session or process already had in flight
+        self.coalesced: List[str] = []
+
+    def _run(self, stage: str, key: str, fn: Callable, *args,
+             cacheable: Callable[[Any], bool] = lambda value: True, persist: bool = False, **kwargs) -> Any:
+        def compute() -> Any:
+            logger.info(f"Running stage '{stage}' ({key[:12]})")
+            with track(f"pipeline.{stage}") as measurement:
+                if self.profiler is None:
+                    value = fn(*args, **kwargs)
+                else:
+                    with self.profiler.stage(stage):
+                        value = fn(*args, **kwargs)
+                if isinstance(value, list):
+                    measurement.entries = len(value)
+            return value
+
+        source, value = self.cache.get_or_compute(key, compute, persist=persist, cacheable=cacheable)
+        if source == CACHE_HIT:
+            logger.debug(f"Stage '{stage}' reused cached output ({key[:12]})")
+            REGISTRY.inc("log_analyzer_pipeline_cache_hits_total", stage=stage)
+        elif source in (COALESCED, COALESCED_SHARED):
+            logger.info(f"Stage '{stage}' waited for the same computation already in flight ({key[:12]})")
+            REGISTRY.inc("log_analyzer_pipeline_coalesced_total", stage=stage,
+                         scope="process" if source == COALESCED else "shared")
+            if stage not in self.coalesced:
+                self.coalesced.append(stage)
+        elif stage not in self.recomputed:
+            self.recomputed.append(stage)
+        return value
+
+    def read(self, raw: bytes) -> str:
+        key = content_hash("read", PIPELINE_VERSION, raw)
+        self.keys["read"] = key
+        return self._run("read", key, decode_log_bytes, raw)
+
+    def read_key(self, file_path: str) -> str:
+        """
+        Sets the read-stage key from the file on disk without reading it into
+        memory; for callers that stream the file instead of calling `read`.
+        """
+        self.keys["read"] = file_content_hash(file_path, "read", PIPELINE_VERSION)
+        return self.keys["read"]
+
+    def detect(self, file_path: str) -> str:
+        key = content_hash("detect", PIPELINE_VERSION, os.path.basename(file_path), self.keys["read"])
+        self.keys["detect"] = key
+        return self._run("detect", key, detect_log_type, file_path)
+
+    def chunk(self, content: str, max_chunk_size: int = 5000) -> List[str]:
+        """
+        Content-defined chunks aligned to entry boundaries, so the chunks of
+        an appended log match those of its previous version.
+        """
+        key = content_hash("chunk", PIPELINE_VERSION, self.keys["read"], max_chunk_size)
+        self.keys["chunk"] = key
+        return self._run("chunk", key, self._chunk, content, max_chunk_size)
+
+    @staticmethod
+    def _chunk(content: str, max_chunk_size: int) -> List[str]:
+        _, boundary_pattern = detect_log_format(content[:STREAM_SAMPLE_BYTES])
+        return chunk_content_defined(content, boundary_pattern, max_chunk_size=max_chunk_size)
+
+    def discover(self, selected_chunks: List[str], mode: str = "pattern_discovery") -> List[str]:
+        key = content_hash("discover", PIPELINE_VERSION, mode, *selected_chunks)
+        self.keys["discover"] = key
+        return self._run("discover", key, get_error_suggestions, selected_chunks, mode=mode, persist=True)
+
+    def normalize(self, content: str) -> Tuple[str, str, List[Union[Dict[str, str], str]]]:
+        """
+        Normalizes chunk by chunk. Each chunk's entries are cached (and
+        persisted) under the chunk's own hash, so only new or changed regions
+        of a re-uploaded log are parsed again.
+        """
+        key = content_hash("normalize", PIPELINE_VERSION, self.keys["read"])
+        self.keys["normalize"] = key
+        return self._run("normalize", key, self._normalize_by_chunk, content)
+
+    def _normalize_by_chunk(self, content: str) -> Tuple[str, str, List[Union[Dict[str, str], str]]]:
+        log_type, pattern, structured = detect_stream_format(content[:STREAM_SAMPLE_BYTES])
+
+        entries: List[Union[Dict[str, str], str]] = []
+        for chunk in self.chunk(content):
+            entries.extend(self.normalize_chunk(chunk, pattern, structured))
+        return log_type, pattern, entries
+
+    def normalize_chunk(self, chunk: str, pattern: str, structured: bool) -> List[Union[Dict[str, str], str]]:
+        """Entries of one entry-aligned chunk, cached (and persisted) under the chunk's own hash."""
+        chunk_key = content_hash("normalize_chunk", PIPELINE_VERSION, pattern, structured, chunk)
+        return self._run(
+            "normalize_chunk", chunk_key,
+            lambda text: list(iter_normalized_entries(text.splitlines(keepends=True), pattern, structured)),
+            chunk, persist=True,
+        )
+
+    def summarize(self, entry: Union[str, dict]) -> List[dict]:
+        """
+        Summaries are memoized per entry, so a new upload that shares entries
+        with an earlier one only pays the LLM for the entries it adds.
+        """
+        # Imported on first use; the OpenAI SDK is slow to import
+        from summarizer import summarize_log_entries
+
+        key = content_hash("summarize", PIPELINE_VERSION, entry)
+        self.keys["summarize"] = key
+        return self._run("summarize", key, summarize_log_entries, entry, persist=True,
+                         cacheable=lambda summaries: not any(is_failed_summary(s) for s in summaries))
+
+
+def is_failed_summary(summary: dict) -> bool:
+    """
+    `summarize_log_entries` reports LLM failures as a placeholder entry; those
+    must not be memoized or the error would be replayed on every rerun.
+    """
+    return summary.get("fix_suggestion") is None and str(summary.get("message", "")).startswith("Failed to analyze")
@@ -0,0 +1,170 @@
+# ai_file_agent/profiling.py
+
+import cProfile
+import io
+import logging
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Off by default; nothing in this module runs (or is started) unless this is set
+PROFILING_ENABLED = os.getenv("LOG_ANALYZER_PROFILE", "false").lower() == "true"
+PROFILE_DIR = os.getenv("LOG_ANALYZER_PROFILE_DIR", "./.cache/profiles")
+# Functions and allocation sites listed per stage in the report
+PROFILE_TOP = int(os.getenv("LOG_ANALYZER_PROFILE_TOP", "25"))
+
+_IGNORED_FRAMES = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+# tracemalloc is process-wide: it is started for the first profiler and stopped after the last one
+_tracing_lock = threading.Lock()
+_tracing_users = 0
+_started_tracing = False
+# Profiled runs take turns, so one run's reset_peak() never resets the peak another run is measuring
+_run_lock = threading.Lock()
+
+
+def _start_tracing() -> None:
+    global _tracing_users, _started_tracing
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracing = True
+        _tracing_users += 1
+
+
+def _stop_tracing() -> None:
+    global _tracing_users, _started_tracing
+    with _tracing_lock:
+        _tracing_users -= 1
+        # Tracing someone else started (e.g. PYTHONTRACEMALLOC) is left running
+        if _tracing_users == 0 and _started_tracing:
+            tracemalloc.stop()
+            _started_tracing = False
+
+
+class StageProfiler:
+    """
+    CPU profile and allocation trace per pipeline stage, for one run.
+
+    Each stage gets its own cProfile profile, enabled only while the stage
+    runs; a nested stage pauses its parent, so every profile holds the
+    stage's own work. Peak traced memory is kept per stage, and the first
+    call of each stage is also diffed with tracemalloc snapshots to find the
+    lines that allocated the most. Create one per run and `close()` it.
+
+    tracemalloc is shared by the whole process, so profiled runs take
+    turns: the first stage of a run waits for the previous profiled run to
+    close. Work outside profiling (other sessions, API requests) is not
+    serialized, and its allocations count towards the peaks.
+    """
+
+    def __init__(self, top: int = PROFILE_TOP):
+        self.top = top
+        self.profiles: Dict[str, cProfile.Profile] = {}
+        self.calls: Dict[str, int] = {}
+        self.seconds: Dict[str, float] = {}
+        self.peaks: Dict[str, int] = {}
+        self.allocation_sites: Dict[str, List[str]] = {}
+        # Per active stage: [name, highest absolute traced memory seen while nested stages ran]
+        self._stack: List[list] = []
+        self._running = False
+        self._closed = False
+        _start_tracing()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        if not self._running:
+            # Taken on the first stage rather than up front: a page load that never runs a stage does not wait
+            _run_lock.acquire()
+            self._running = True
+        if self._stack:
+            outer = self._stack[-1]
+            self.profiles[outer[0]].disable()
+            outer[1] = max(outer[1], tracemalloc.get_traced_memory()[1])
+
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        before = tracemalloc.take_snapshot() if name not in self.allocation_sites else None
+        profile = self.profiles.setdefault(name, cProfile.Profile())
+        frame = [name, 0]
+        self._stack.append(frame)
+        start = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            self._stack.pop()
+            self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - start
+            self.calls[name] = self.calls.get(name, 0) + 1
+            absolute_peak = max(frame[1], tracemalloc.get_traced_memory()[1])
+            self.peaks[name] = max(self.peaks.get(name, 0), absolute_peak - baseline)
+            if before is not None:
+                self.allocation_sites[name] = self._top_allocations(before)
+
+            if self._stack:
+                outer = self._stack[-1]
+                outer[1] = max(outer[1], absolute_peak)
+                self.profiles[outer[0]].enable()
+
+    def _top_allocations(self, before: tracemalloc.Snapshot) -> List[str]:
+        after = tracemalloc.take_snapshot().filter_traces(_IGNORED_FRAMES)
+        differences = after.compare_to(before.filter_traces(_IGNORED_FRAMES), "lineno")
+        return [str(stat) for stat in differences[:self.top] if stat.size_diff > 0]
+
+    def report(self) -> str:
+        """Plain-text report: stage totals, then each stage's CPU hotspots and allocation sites."""
+        out = io.StringIO()
+        out.write(f"Pipeline profile ({time.strftime('%Y-%m-%d %H:%M:%S')})\n")
+        out.write("Stages served from the stage cache did not run and are not listed. Wall time, peak\n"
+                  "memory and allocations include nested stages; CPU hotspots do not. Peak memory is\n"
+                  "process-wide: it also counts what other sessions allocated while the stage ran.\n\n")
+        out.write(f"{'stage':<24}{'calls':>8}{'seconds':>12}{'peak MiB':>12}\n")
+        stages = sorted(self.seconds, key=self.seconds.get, reverse=True)
+        for name in stages:
+            out.write(f"{name:<24}{self.calls[name]:>8}{self.seconds[name]:>12.3f}"
+                      f"{self.peaks.get(name, 0) / 2 ** 20:>12.2f}\n")
+
+        for name in stages:
+            out.write(f"\n{'=' * 78}\n{name}: CPU hotspots (by cumulative time)\n{'=' * 78}\n")
+            stats = pstats.Stats(self.profiles[name], stream=out)
+            stats.strip_dirs().sort_stats(pstats.SortKey.CUMULATIVE).print_stats(self.top)
+            out.write(f"{name}: largest allocations during its first call\n")
+            for site in self.allocation_sites.get(name) or ["(none)"]:
+                out.write(f"  {site}\n")
+        return out.getvalue()
+
+    def save(self, report: Optional[str] = None, label: str = "run", directory: str = PROFILE_DIR) -> Optional[str]:
+        """Writes the report (built now unless given) to `directory` so it can be collected from a production host."""
+        try:
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(directory, f"profile-{time.strftime('%Y%m%d-%H%M%S')}-{label}.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(report if report is not None else self.report())
+        except OSError as e:
+            logger.warning(f"Could not save profile report: {e}")
+            return None
+        logger.info(f"Saved profile report to {path}")
+        return path
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        for profile in self.profiles.values():
+            profile.disable()
+        _stop_tracing()
+        if self._running:
+            self._running = False
+            _run_lock.release()
@@ -0,0 +1,477 @@
+# ai_file_agent/regex_guard.py
+
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
+import threading
+import time
+from typing import Dict, FrozenSet, List, Optional, Sequence
+
+from metrics import REGISTRY
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_constants
+    import sre_parse
+
+logger = logging.getLogger(__name__)
+
+# Lines sent to the matching worker at a time
+REGEX_BATCH_LINES = int(os.getenv("LOG_ANALYZER_REGEX_BATCH", "1000"))
+# Average matching time a pattern may spend per line (a batch gets lines x this, at least REGEX_MIN_TIMEOUT)
+REGEX_BUDGET_MS = float(os.getenv("LOG_ANALYZER_REGEX_BUDGET_MS", "2"))
+REGEX_MIN_TIMEOUT = float(os.getenv("LOG_ANALYZER_REGEX_MIN_TIMEOUT", "1.0"))
+# A demoted pattern only sees this much of each line: long lines are what blow up backtracking
+DEMOTED_MAX_LINE = 2000
+# Patterns that blew their budget even when demoted; remembered across runs
+QUARANTINE_PATH = os.getenv("LOG_ANALYZER_REGEX_QUARANTINE", "./.cache/regex_quarantine.json")
+# A bounded outer repeat with fewer iterations than this cannot backtrack catastrophically
+_UNBOUNDED = 16
+
+STATUS_OK = "ok"
+STATUS_DEMOTED = "demoted"
+STATUS_QUARANTINED = "quarantined"
+
+
+class UnsafePattern(ValueError):
+    """The pattern is refused: statically risky, or quarantined after blowing its time budget."""
+
+
+# Characters used to decide whether two character sets overlap: ASCII plus a few non-ASCII letters and spaces
+_PROBES = [chr(c) for c in range(128)] + [" ", "é", "中", " "]
+_ALL = frozenset(range(len(_PROBES)))
+_CATEGORIES = {
+    "CATEGORY_DIGIT": r"\d", "CATEGORY_NOT_DIGIT": r"\D",
+    "CATEGORY_SPACE": r"\s", "CATEGORY_NOT_SPACE": r"\S",
+    "CATEGORY_WORD": r"\w", "CATEGORY_NOT_WORD": r"\W",
+    "CATEGORY_LINEBREAK": r"\n", "CATEGORY_NOT_LINEBREAK": r"[^\n]",
+}
+
+
+def _probe_set(regex: str) -> FrozenSet[int]:
+    compiled = re.compile(regex)
+    return frozenset(i for i, ch in enumerate(_PROBES) if compiled.fullmatch(ch))
+
+
+_CATEGORY_SETS = {name: _probe_set(regex) for name, regex in _CATEGORIES.items()}
+_NOT_NEWLINE = _probe_set(r"[^\n]")
+
+
+def _in_set(items) -> FrozenSet[int]:
+    chars = set()
+    negate = False
+    for op, av in items:
+        name = str(op)
+        if name == "NEGATE":
+            negate = True
+        elif name == "LITERAL":
+            chars |= {i for i, ch in enumerate(_PROBES) if ord(ch) == av}
+        elif name == "RANGE":
+            chars |= {i for i, ch in enumerate(_PROBES) if av[0] <= ord(ch) <= av[1]}
+        elif name == "CATEGORY":
+            chars |= _CATEGORY_SETS.get(str(av).replace("_UNI_", "_").replace("_LOC_", "_"), _ALL)
+        else:
+            chars |= _ALL
+    return _ALL - chars if negate else frozenset(chars)
+
+
+def _char_set(op, av) -> Optional[FrozenSet[int]]:
+    """Characters a single-character node matches (None if the node is not one)."""
+    name = str(op)
+    if name == "LITERAL":
+        return frozenset(i for i, ch in enumerate(_PROBES) if ord(ch) == av)
+    if name == "NOT_LITERAL":
+        return frozenset(i for i, ch in enumerate(_PROBES) if ord(ch) != av)
+    if name == "ANY":
+        return _NOT_NEWLINE
+    if name == "IN":
+        return _in_set(av)
+    return None
+
+
+def _is_repeat(name: str) -> bool:
+    return name in ("MAX_REPEAT", "MIN_REPEAT")
+
+
+def _first(nodes) -> FrozenSet[int]:
+    """Characters a sequence of nodes can start with."""
+    chars = frozenset()
+    for op, av in nodes:
+        node_chars, nullable = _first_node(op, av)
+        chars |= node_chars
+        if not nullable:
+            break
+    return chars
+
+
+def _first_node(op, av):
+    """(characters the node can start with, whether it can match the empty string)."""
+    name = str(op)
+    single = _char_set(op, av)
+    if single is not None:
+        return single, False
+    if _is_repeat(name) or name == "POSSESSIVE_REPEAT":
+        low, _, body = av
+        return _first(body), low == 0 or _nullable(body)
+    if name == "SUBPATTERN":
+        return _first(av[-1]), _nullable(av[-1])
+    if name == "ATOMIC_GROUP":
+        return _first(av), _nullable(av)
+    if name == "BRANCH":
+        alternatives = av[1]
+        return (frozenset().union(*(_first(alt) for alt in alternatives)),
+                any(_nullable(alt) for alt in alternatives))
+    if name == "GROUPREF_EXISTS":
+        _, yes, no = av
+        branches = [yes] + ([no] if no else [])
+        return frozenset().union(*(_first(b) for b in branches)), not no or any(_nullable(b) for b in branches)
+    if name in ("GROUPREF", "GROUPREF_IGNORE"):
+        return _ALL, True
+    # AT (anchors), ASSERT, ASSERT_NOT and the like consume nothing
+    return frozenset(), True
+
+
+def _nullable(nodes) -> bool:
+    return all(_first_node(op, av)[1] for op, av in nodes)
+
+
+def _ambiguous_repeats(nodes, follow: FrozenSet[int]) -> bool:
+    """
+    True if a backtracking repeat in `nodes` can match characters that may
+    also come right after it (`follow` is what may come after `nodes`), i.e.
+    if input can be split between the repeat and its successor in more than
+    one way. Under an outer unbounded repeat this is exponential.
+    """
+    nodes = list(nodes)
+    for i in range(len(nodes) - 1, -1, -1):
+        op, av = nodes[i]
+        name = str(op)
+        rest = nodes[i + 1:]
+        after = _first(rest) | (follow if _nullable(rest) else frozenset())
+        if _is_repeat(name):
+            _, high, body = av
+            if high > 1 and _first(body) & after:
+                return True
+            if _ambiguous_repeats(body, _first(body) | after if high > 1 else after):
+                return True
+        elif name == "SUBPATTERN":
+            if _ambiguous_repeats(av[-1], after):
+                return True
+        elif name == "BRANCH":
+            if any(_ambiguous_repeats(alt, after) for alt in av[1]):
+                return True
+        # Atomic groups and possessive repeats never give characters back, so they are not followed into
+    return False
+
+
+def _walk(nodes, risks: List[str]) -> None:
+    for op, av in nodes:
+        name = str(op)
+        if name in ("GROUPREF", "GROUPREF_IGNORE"):
+            risks.append("backreference")
+        if _is_repeat(name):
+            _, high, body = av
+            if high == sre_constants.MAXREPEAT or high >= _UNBOUNDED:
+                if _ambiguous_repeats(body, _first(body)):
+                    risks.append("nested quantifier: an inner repeat can take over input of what follows it")
+                for inner_op, inner_av in body:
+                    _check_alternation(inner_op, inner_av, risks)
+            _walk(body, risks)
+        elif name == "SUBPATTERN":
+            _walk(av[-1], risks)
+        elif name == "ATOMIC_GROUP":
+            _walk(av, risks)
+        elif name == "POSSESSIVE_REPEAT":
+            _walk(av[2], risks)
+        elif name == "BRANCH":
+            for alt in av[1]:
+                _walk(alt, risks)
+        elif name in ("ASSERT", "ASSERT_NOT"):
+            _walk(av[1], risks)
+        elif name == "GROUPREF_EXISTS":
+            _walk(av[1], risks)
+            if av[2]:
+                _walk(av[2], risks)
+
+
+def _check_alternation(op, av, risks: List[str]) -> None:
+    """Alternatives under an unbounded repeat must not be able to match the same input."""
+    name = str(op)
+    if name == "SUBPATTERN":
+        for inner_op, inner_av in av[-1]:
+            _check_alternation(inner_op, inner_av, risks)
+    elif name == "BRANCH":
+        alternatives = av[1]
+        firsts = [_first(alt) for alt in alternatives]
+        overlapping = any(firsts[i] & firsts[j] for i in range(len(firsts)) for j in range(i + 1, len(firsts)))
+        if overlapping or any(_nullable(alt) for alt in alternatives):
+            risks.append("ambiguous alternation under a quantifier")
+
+
+def pattern_risks(pattern: str) -> List[str]:
+    """
+    Constructs in `pattern` that can make backtracking take exponential time:
+    nested quantifiers whose inner repeat can consume what follows it
+    (``(a+)+``, ``(\\w+\\s?)*``, ``(.*,)*``), alternations under a
+    quantifier whose branches can match the same text (``(\\d+|\\w+)*``), and
+    backreferences. Polynomial cases (several ``.*`` in a row) are left to
+    the time budget.
+
+    Raises:
+    - re.error: If the pattern does not compile.
+    """
+    risks: List[str] = []
+    _walk(sre_parse.parse(pattern), risks)
+    return sorted(set(risks))
+
+
+def _pattern_id(pattern: str) -> str:
+    return hashlib.sha1(pattern.encode("utf-8", errors="surrogatepass")).hexdigest()[:12]
+
+
+def _match_worker(conn) -> None:
+    """Runs in the worker process: matches batches of lines, returning each match's groupdict (or None)."""
+    compiled: Dict[str, "re.Pattern"] = {}
+    conn.send("ready")
+    while True:
+        request = conn.recv()
+        if request is None:
+            return
+        pattern, lines = request
+        try:
+            regex = compiled.get(pattern)
+            if regex is None:
+                regex = compiled[pattern] = re.compile(pattern)
+            results = []
+            for line in lines:
+                match = regex.match(line)
+                results.append(match.groupdict() if match else None)
+            conn.send(("ok", results))
+        except Exception as e:
+            conn.send(("error", str(e)))
+
+
+class PatternStats:
+    """Matching statistics of one pattern in this process."""
+
+    def __init__(self, pattern: str):
+        self.pattern = pattern
+        self.pattern_id = _pattern_id(pattern)
+        self.status = STATUS_OK
+        self.lines = 0
+        self.batches = 0
+        self.seconds = 0.0
+        self.slowest_batch_seconds = 0.0
+        self.timeouts = 0
+
+    @property
+    def microseconds_per_line(self) -> float:
+        return self.seconds / self.lines * 1e6 if self.lines else 0.0
+
+    def as_row(self) -> Dict[str, object]:
+        return {"pattern_id": self.pattern_id, "status": self.status, "lines": self.lines,
+                "us_per_line": round(self.microseconds_per_line, 2),
+                "slowest_batch_s": round(self.slowest_batch_seconds, 4), "timeouts": self.timeouts,
+                "pattern": self.pattern}
+
+
+class RegexGuard:
+    """
+    Runs untrusted (LLM-generated) patterns without risking a pinned CPU.
+
+    `check` refuses statically risky and quarantined patterns. `match_lines`
+    matches in a separate worker process, a batch at a time, with a time
+    budget per batch; a worker that overruns it is killed. The first overrun
+    demotes the pattern (lines are cut to DEMOTED_MAX_LINE characters and
+    the batch is retried); an overrun while demoted quarantines it, in this
+    process and in QUARANTINE_PATH for later runs. Thread-safe; one worker
+    is shared by all patterns.
+    """
+
+    def __init__(self, quarantine_path: Optional[str] = QUARANTINE_PATH, budget_ms: float = REGEX_BUDGET_MS,
+                 batch_lines: int = REGEX_BATCH_LINES):
+        self.quarantine_path = quarantine_path
+        self.budget_ms = budget_ms
+        self.batch_lines = batch_lines
+        self.stats: Dict[str, PatternStats] = {}
+        self.quarantine: Dict[str, str] = self._load_quarantine()
+        self._lock = threading.Lock()
+        self._process = None
+        self._conn = None
+        # Patterns that passed `check`, compiled for in-process matching
+        self._compiled: Dict[str, "re.Pattern"] = {}
+
+    def _load_quarantine(self) -> Dict[str, str]:
+        if not self.quarantine_path or not os.path.exists(self.quarantine_path):
+            return {}
+        try:
+            with open(self.quarantine_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read the regex quarantine list: {e}")
+            return {}
+
+    def _save_quarantine(self) -> None:
+        if not self.quarantine_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.quarantine_path)), exist_ok=True)
+            tmp_path = f"{self.quarantine_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.quarantine, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.quarantine_path)
+        except OSError as e:
+            logger.warning(f"Could not save the regex quarantine list: {e}")
+
+    def _stats(self, pattern: str) -> PatternStats:
+        stats = self.stats.get(pattern)
+        if stats is None:
+            stats = self.stats[pattern] = PatternStats(pattern)
+            if pattern in self.quarantine:
+                stats.status = STATUS_QUARANTINED
+        return stats
+
+    def check(self, pattern: str) -> None:
+        """
+        Raises:
+        - UnsafePattern: If the pattern is quarantined or statically risky.
+        - re.error: If it does not compile.
+        """
+        if pattern in self.quarantine:
+            raise UnsafePattern(f"Pattern is quarantined: {self.quarantine[pattern]}")
+        risks = pattern_risks(pattern)
+        if risks:
+            raise UnsafePattern(f"Pattern risks catastrophic backtracking: {'; '.join(risks)}")
+
+    def compile(self, pattern: str) -> "re.Pattern":
+        """
+        Compiles a pattern for matching in this process, once it passed
+        `check`. Only the static checks apply: in-process matches have no
+        time budget, so patterns an LLM wrote go through `match_lines`.
+
+        Raises:
+        - UnsafePattern: If the pattern is quarantined or statically risky.
+        - re.error: If it does not compile.
+        """
+        if pattern in self.quarantine:
+            raise UnsafePattern(f"Pattern is quarantined: {self.quarantine[pattern]}")
+        compiled = self._compiled.get(pattern)
+        if compiled is None:
+            self.check(pattern)
+            compiled = self._compiled[pattern] = re.compile(pattern)
+        return compiled
+
+    def _ensure_worker(self) -> None:
+        if self._process is not None and self._process.is_alive():
+            return
+        # Spawned rather than forked: the app runs threads, and the child only needs this module
+        ctx = multiprocessing.get_context("spawn")
+        self._conn, child_conn = ctx.Pipe()
+        self._process = ctx.Process(target=_match_worker, args=(child_conn,), daemon=True,
+                                    name="regex-guard")
+        self._process.start()
+        child_conn.close()
+        try:
+            ready = self._conn.poll(30) and self._conn.recv() == "ready"
+        except EOFError:
+            ready = False
+        if not ready:
+            self._kill_worker()
+            raise RuntimeError("The regex worker process did not start.")
+
+    def _kill_worker(self) -> None:
+        if self._process is not None:
+            self._process.kill()
+            self._process.join()
+        if self._conn is not None:
+            self._conn.close()
+        self._process = None
+        self._conn = None
+
+    def _run_batch(self, pattern: str, lines: List[str], timeout: float) -> Optional[List[Optional[Dict[str, str]]]]:
+        """The batch's results, or None if it overran `timeout` (the worker is then killed)."""
+        self._ensure_worker()
+        self._conn.send((pattern, lines))
+        if not self._conn.poll(timeout):
+            self._kill_worker()
+            return None
+        status, payload = self._conn.recv()
+        if status == "error":
+            raise re.error(payload)
+        return payload
+
+    def match_lines(self, pattern: str, lines: Sequence[str]) -> List[Optional[Dict[str, str]]]:
+        """
+        `groupdict()` of every line's match (None where it does not match).
+
+        Raises:
+        - UnsafePattern: If the pattern is (or, during this call, gets) quarantined.
+        """
+        self.check(pattern)
+        stats = self._stats(pattern)
+        results: List[Optional[Dict[str, str]]] = []
+        with self._lock:
+            for start in range(0, len(lines), self.batch_lines):
+                batch = list(lines[start:start + self.batch_lines])
+                while True:
+                    if stats.status == STATUS_DEMOTED:
+                        batch = [line[:DEMOTED_MAX_LINE] for line in batch]
+                    timeout = max(REGEX_MIN_TIMEOUT, len(batch) * self.budget_ms / 1000)
+                    began = time.perf_counter()
+                    batch_results = self._run_batch(pattern, batch, timeout)
+                    elapsed = time.perf_counter() - began
+                    if batch_results is not None:
+                        break
+                    self._overrun(stats, timeout)
+                stats.lines += len(batch)
+                stats.batches += 1
+                stats.seconds += elapsed
+                stats.slowest_batch_seconds = max(stats.slowest_batch_seconds, elapsed)
+                REGISTRY.observe("log_analyzer_regex_batch_seconds", elapsed, pattern=stats.pattern_id)
+                results.extend(batch_results)
+        return results
+
+    def _overrun(self, stats: PatternStats, timeout: float) -> None:
+        stats.timeouts += 1
+        REGISTRY.inc("log_analyzer_regex_timeouts_total", pattern=stats.pattern_id)
+        if stats.status == STATUS_OK:
+            stats.status = STATUS_DEMOTED
+            logger.warning(f"Pattern {stats.pattern_id} overran its {timeout:.2f}s budget; demoted to "
+                           f"lines of at most {DEMOTED_MAX_LINE} characters")
+            return
+        stats.status = STATUS_QUARANTINED
+        self.quarantine[stats.pattern] = f"overran its {timeout:.2f}s budget {stats.timeouts} times"
+        self._save_quarantine()
+        logger.error(f"Pattern {stats.pattern_id} quarantined after {stats.timeouts} budget overruns")
+        raise UnsafePattern(f"Pattern quarantined: {self.quarantine[stats.pattern]}")
+
+    def report(self) -> List[Dict[str, object]]:
+        """One row per pattern seen in this process, slowest per line first."""
+        return [s.as_row() for s in sorted(self.stats.values(), key=lambda s: -s.microseconds_per_line)]
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._conn.send(None)
+                except OSError:
+                    pass
+            self._kill_worker()
+
+
+_guard: Optional[RegexGuard] = None
+_guard_lock = threading.Lock()
+
+
+def get_guard() -> RegexGuard:
+    """The process-wide guard (one worker process, shared quarantine and statistics)."""
+    global _guard
+    if _guard is None:
+        with _guard_lock:
+            if _guard is None:
+                _guard = RegexGuard()
+    return _guard
@@ -0,0 +1,219 @@
+# ai_file_agent/result_views.py
+
+import json
+import logging
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import streamlit as st
+
+from metrics import timed
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 50
+# Columns with at most this many distinct values get a filter widget
+MAX_FILTER_VALUES = 25
+# Long cells are cut before they are sent to the browser
+MAX_CELL_CHARS = 2000
+# Rows fetched per slice while searching or filtering (one Arrow batch for snapshot rows)
+MATCH_BATCH_ROWS = 4096
+
+
+class ResultTable:
+    """
+    Server-side view over a list of result rows.
+
+    Search and filters are applied here, on the Python side, and only the
+    requested page is materialized. Without a search or filter nothing is
+    scanned: the page is a slice of the rows. The indices matching the last
+    (search, filters) pair are kept, so paging through the same query does
+    not re-scan the rows; with a `cache_id` (stable across Streamlit reruns,
+    e.g. the snapshot key) they are kept in the session state, so later
+    reruns do not re-scan them either.
+    """
+
+    def __init__(self, rows: Sequence[Union[Dict[str, Any], str]], columns: Optional[List[str]] = None,
+                 index=None, cache_id: Optional[str] = None):
+        self.rows = rows
+        # Optional search_index.SearchIndex over `rows`; when set, the search box is an index query
+        self.index = index
+        self.cache_id = cache_id
+        self.columns = columns or self._infer_columns(rows)
+        self._last_query: Optional[Tuple[str, Tuple]] = None
+        self._last_matches: Sequence[int] = []
+
+    @staticmethod
+    def _infer_columns(rows: Sequence[Union[Dict[str, Any], str]]) -> List[str]:
+        columns: List[str] = []
+        for row in islice(rows, 200):
+            if isinstance(row, dict):
+                for name in row:
+                    if name not in columns:
+                        columns.append(name)
+        return columns or ["entry"]
+
+    def _row_dict(self, row: Union[Dict[str, Any], str]) -> Dict[str, Any]:
+        if isinstance(row, dict):
+            return row
+        return {"entry": row}
+
+    @staticmethod
+    def _cell_text(value: Any) -> str:
+        if value is None:
+            return ""
+        if isinstance(value, (dict, list)):
+            return json.dumps(value, ensure_ascii=False, default=str)
+        return str(value)
+
+    def distinct_values(self, column: str, limit: int = MAX_FILTER_VALUES) -> Optional[List[str]]:
+        """
+        Returns the sorted distinct values of a column, or None when there are
+        more than `limit` of them (free-text columns are not worth a filter).
+        Kept in the session state when the table has a `cache_id`.
+        """
+        session_key = f"_result_table_values:{self.cache_id}:{column}:{limit}" if self.cache_id else None
+        if session_key is not None:
+            cached = st.session_state.get(session_key)
+            if cached is not None and cached[0] == len(self.rows):
+                return cached[1]
+        values = set()
+        distinct: Optional[List[str]] = None
+        for row in self.rows:
+            values.add(self._cell_text(self._row_dict(row).get(column)))
+            if len(values) > limit:
+                break
+        else:
+            distinct = sorted(values)
+        if session_key is not None:
+            st.session_state[session_key] = (len(self.rows), distinct)
+        return distinct
+
+    def _keep(self, row: Union[Dict[str, Any], str], needle: str, active_filters: Dict[str, set]) -> bool:
+        row = self._row_dict(row)
+        if any(self._cell_text(row.get(col)) not in allowed for col, allowed in active_filters.items()):
+            return False
+        return not needle or any(needle in self._cell_text(row.get(col)).lower() for col in self.columns)
+
+    def _matches(self, search: str, filters: Dict[str, List[str]]) -> Sequence[int]:
+        query_key = (search, tuple(sorted((k, tuple(v)) for k, v in filters.items() if v)))
+        if query_key == self._last_query:
+            return self._last_matches
+
+        needle = search.lower().strip()
+        active_filters = {k: set(v) for k, v in filters.items() if v}
+        if not needle and not active_filters:
+            # Nothing to match: every row, without touching any of them
+            return range(len(self.rows))
+
+        session_key = f"_result_table_matches:{self.cache_id}" if self.cache_id else None
+        if session_key is not None:
+            cached = st.session_state.get(session_key)
+            if cached is not None and cached[0] == (len(self.rows), query_key):
+                self._last_query, self._last_matches = query_key, cached[1]
+                return cached[1]
+
+        matches: List[int] = []
+        if needle and self.index is not None:
+            for idx in self.index.search(search):
+                if not active_filters or self._keep(self.rows[idx], "", active_filters):
+                    matches.append(idx)
+        else:
+            # Sliced rather than indexed row by row: one batch conversion per slice of snapshot rows
+            for start in range(0, len(self.rows), MATCH_BATCH_ROWS):
+                for offset, row in enumerate(self.rows[start:start + MATCH_BATCH_ROWS]):
+                    if self._keep(row, needle, active_filters):
+                        matches.append(start + offset)
+
+        self._last_query = query_key
+        self._last_matches = matches
+        if session_key is not None:
+            # Only the last query per table, so the session holds one match list per table at most
+            st.session_state[session_key] = ((len(self.rows), query_key), matches)
+        return matches
+
+    def query(self, search: str = "", filters: Optional[Dict[str, List[str]]] = None,
+              page: int = 1, page_size: int = DEFAULT_PAGE_SIZE) -> Tuple[List[Dict[str, str]], int]:
+        """
+        Returns the rows of one page plus the total number of matching rows.
+
+        Parameters:
+        - search (str): Case-insensitive substring matched against every column.
+        - filters (dict): Column -> allowed values (exact match).
+        - page (int): 1-based page number; clamped to the last page.
+        - page_size (int): Number of rows per page.
+        """
+        if page_size <= 0:
+            raise ValueError("Page size must be positive.")
+
+        matches = self._matches(search or "", filters or {})
+        total = len(matches)
+        last_page = max(1, -(-total // page_size))
+        page = min(max(1, page), last_page)
+        start = (page - 1) * page_size
+
+        selected = matches[start:start + page_size]
+        if isinstance(selected, range):
+            rows = self.rows[selected.start:selected.stop]
+        else:
+            rows = [self.rows[idx] for idx in selected]
+        page_rows = []
+        for row in rows:
+            row = self._row_dict(row)
+            page_rows.append({
+                col: self._cell_text(row.get(col))[:MAX_CELL_CHARS] for col in self.columns
+            })
+        return page_rows, total
+
+
+@timed("render_table", bytes_arg=None)
+def render_paginated_table(title: str, table: ResultTable, key: str,
+                           page_size: int = DEFAULT_PAGE_SIZE,
+                           filter_columns: Optional[Iterable[str]] = None) -> None:
+    """
+    Renders a search box, column filters, a page selector and the current
+    page of `table`. Only the visible page is sent to the browser.
+    """
+    st.subheader(title)
+    if not table.rows:
+        st.info("Nothing to show.")
+        return
+
+    if table.index is not None:
+        search = st.text_input("🔎 Search", key=f"{key}_search",
+                               help="Terms are ANDed. Scope with field:term (e.g. level:error source:Server), "
+                                    "exclude with -term, quote phrases.")
+    else:
+        search = st.text_input("🔎 Search", key=f"{key}_search")
+
+    filters: Dict[str, List[str]] = {}
+    candidate_columns = list(filter_columns) if filter_columns is not None else table.columns
+    filter_options = {}
+    for column in candidate_columns:
+        values = table.distinct_values(column)
+        if values and len(values) > 1:
+            filter_options[column] = values
+    if filter_options:
+        filter_cols = st.columns(len(filter_options))
+        for widget_col, (column, values) in zip(filter_cols, filter_options.items()):
+            with widget_col:
+                filters[column] = st.multiselect(column, values, key=f"{key}_filter_{column}")
+
+    _, total = table.query(search, filters, page=1, page_size=page_size)
+    last_page = max(1, -(-total // page_size))
+    page_key = f"{key}_page"
+    if st.session_state.get(page_key, 1) > last_page:
+        # The filters narrowed the result, keep the page selector in range
+        st.session_state[page_key] = last_page
+    page = st.number_input("Page", min_value=1, max_value=last_page, step=1, key=page_key)
+
+    rows, total = table.query(search, filters, page=int(page), page_size=page_size)
+    if not rows:
+        st.warning("No rows match the current search and filters.")
+        return
+
+    start = (int(page) - 1) * page_size
+    import pandas as pd
+
+    st.dataframe(pd.DataFrame(rows, columns=table.columns), use_container_width=True)
+    st.caption(f"Showing {start + 1}–{start + len(rows)} of {total} (page {int(page)}/{last_page})")
@@ -0,0 +1,193 @@
+# ai_file_agent/search_index.py
+
+import logging
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+# Words, including dotted/hyphenated identifiers such as MY-013360 or local.ERROR
+_TOKEN_RE = re.compile(r"[a-z0-9_]+(?:[-.][a-z0-9_]+)*")
+_QUERY_TERM_RE = re.compile(r'(-?)(?:(\w+):)?(?:"([^"]*)"|(\S+))')
+
+# Normalized field names; regex groups differ between formats
+FIELD_ALIASES = {
+    "log_level": "level",
+    "severity": "level",
+    "msg": "message",
+    "module": "source",
+    "service": "source",
+    # Raw (unstructured) entries are stored as {"entry": text} in snapshots; index them like plain strings
+    "entry": "message",
+}
+ALL_FIELDS = "*"
+
+
+def tokenize(text: str, with_parts: bool = True) -> List[str]:
+    """
+    Lowercased tokens of `text`. Compound identifiers are indexed whole and by
+    part, so both `MY-013360` and `013360` find the same entries; queries
+    pass `with_parts=False` so a compound term only matches the whole.
+    """
+    tokens = []
+    for token in _TOKEN_RE.findall(text.lower()):
+        tokens.append(token)
+        if with_parts and ("-" in token or "." in token):
+            tokens.extend(part for part in re.split(r"[-.]", token) if part)
+    return tokens
+
+
+def entry_fields(entry: Union[Dict[str, str], str]) -> Iterator[Tuple[str, str]]:
+    """Yields (field, text) pairs of a normalized entry; raw entries are all `message`."""
+    if isinstance(entry, dict):
+        for name, value in entry.items():
+            if value is None:
+                continue
+            yield FIELD_ALIASES.get(name, name), str(value)
+    else:
+        yield "message", entry
+
+
+def _encode_varint(value: int, out: bytearray) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _decode_postings(data: bytes) -> List[int]:
+    ids = []
+    current = 0
+    value = 0
+    shift = 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        current += value
+        ids.append(current)
+        value = 0
+        shift = 0
+    return ids
+
+
+class QueryTerm:
+    def __init__(self, field: Optional[str], tokens: List[str], negate: bool):
+        self.field = FIELD_ALIASES.get(field, field) if field else None
+        self.tokens = tokens
+        self.negate = negate
+
+
+def parse_query(query: str) -> List[QueryTerm]:
+    """
+    Parses ``level:error source:Server MY-013360 -deprecated "option does not exist"``.
+
+    Terms are ANDed; ``field:`` scopes a term to one field, a leading ``-``
+    excludes it, and a quoted phrase requires all of its tokens.
+    """
+    terms = []
+    for negate, field, phrase, word in _QUERY_TERM_RE.findall(query):
+        tokens = tokenize(phrase if phrase else word, with_parts=False)
+        if tokens:
+            terms.append(QueryTerm(field or None, tokens, bool(negate)))
+    return terms
+
+
+def entry_matches(entry: Union[Dict[str, str], str], terms: List[QueryTerm]) -> bool:
+    """Evaluates parsed query terms against one entry, for one-pass filtering without an index."""
+    by_field: Dict[str, Set[str]] = {}
+    everything: Set[str] = set()
+    for field, text in entry_fields(entry):
+        tokens = set(tokenize(text))
+        by_field.setdefault(field, set()).update(tokens)
+        everything |= tokens
+
+    for term in terms:
+        haystack = by_field.get(term.field, set()) if term.field else everything
+        found = all(token in haystack for token in term.tokens)
+        if found == term.negate:
+            return False
+    return True
+
+
+class SearchIndex:
+    """
+    Inverted index over normalized entries.
+
+    Maps (field, token) to the ids of the entries containing it, plus an
+    all-fields posting per token. Posting lists are kept as delta-encoded
+    varints in bytearrays, typically one or two bytes per occurrence.
+    Entries must be added in increasing id order.
+    """
+
+    def __init__(self):
+        self._postings: Dict[Tuple[str, str], bytearray] = {}
+        self._last_id: Dict[Tuple[str, str], int] = {}
+        self.size = 0
+
+    def _append(self, key: Tuple[str, str], entry_id: int) -> None:
+        last = self._last_id.get(key)
+        if last == entry_id:
+            return
+        postings = self._postings.get(key)
+        if postings is None:
+            postings = self._postings[key] = bytearray()
+        _encode_varint(entry_id - (last if last is not None else 0), postings)
+        self._last_id[key] = entry_id
+
+    def add(self, entry_id: int, entry: Union[Dict[str, str], str]) -> None:
+        for field, text in entry_fields(entry):
+            for token in tokenize(text):
+                self._append((field, token), entry_id)
+                self._append((ALL_FIELDS, token), entry_id)
+        self.size = max(self.size, entry_id + 1)
+
+    def add_all(self, entries: Iterable[Union[Dict[str, str], str]], start_id: int = 0) -> "SearchIndex":
+        for entry_id, entry in enumerate(entries, start=start_id):
+            self.add(entry_id, entry)
+        return self
+
+    def postings(self, token: str, field: Optional[str] = None) -> List[int]:
+        data = self._postings.get((field or ALL_FIELDS, token))
+        return _decode_postings(data) if data else []
+
+    def _term_ids(self, term: QueryTerm) -> Set[int]:
+        ids: Optional[Set[int]] = None
+        for token in sorted(term.tokens, key=lambda t: len(self._postings.get((term.field or ALL_FIELDS, t), b""))):
+            token_ids = set(self.postings(token, term.field))
+            ids = token_ids if ids is None else ids & token_ids
+            if not ids:
+                return set()
+        return ids or set()
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[int]:
+        """
+        Returns the sorted ids of entries matching `query` (see `parse_query`).
+        A query made only of exclusions matches everything else.
+        """
+        terms = parse_query(query)
+        positive = [t for t in terms if not t.negate]
+        negative = [t for t in terms if t.negate]
+
+        if positive:
+            # Intersect starting from the rarest term to keep intermediate sets small
+            positive.sort(key=lambda t: min(len(self._postings.get((t.field or ALL_FIELDS, tok), b""))
+                                            for tok in t.tokens))
+            ids = self._term_ids(positive[0])
+            for term in positive[1:]:
+                if not ids:
+                    break
+                ids &= self._term_ids(term)
+        else:
+            ids = set(range(self.size)) if negative else set()
+
+        for term in negative:
+            ids -= self._term_ids(term)
+
+        result = sorted(ids)
+        return result[:limit] if limit is not None else result
+
+    def memory_bytes(self) -> int:
+        """Bytes used by the encoded posting lists (excluding dict overhead)."""
+        return sum(len(p) for p in self._postings.values())
@@ -0,0 +1,186 @@
+# ai_file_agent/similar_summaries.py
+
+import logging
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from itertools import pairwise
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+
+from analysis_store import AnalysisStore, entry_signature
+
+logger = logging.getLogger(__name__)
+
+# A past summary at least this similar is returned as is, without calling the LLM
+REUSE_SIMILARITY = float(os.getenv("LOG_ANALYZER_REUSE_SIMILARITY", "0.9"))
+# Past summaries at least this similar are given to the LLM as related diagnoses
+HINT_SIMILARITY = float(os.getenv("LOG_ANALYZER_HINT_SIMILARITY", "0.5"))
+HINT_COUNT = int(os.getenv("LOG_ANALYZER_HINT_COUNT", "3"))
+# How often the shared index checks the store for summaries added by other sessions or processes
+REFRESH_SECONDS = float(os.getenv("LOG_ANALYZER_SIMILAR_REFRESH_SECONDS", "30"))
+
+# Words of a template; placeholders such as <NUM> count as words
+_WORDS = re.compile(r"<[A-Z]+>|[A-Za-z0-9_]+(?:[.:/-][A-Za-z0-9_]+)*")
+
+
+def document_text(template: str, level: str = "", source: str = "") -> str:
+    """What is compared: an error's level, source and message template."""
+    return " ".join(part for part in (level, source, template) if part)
+
+
+def _features(text: str) -> Counter:
+    """
+    Hashed word unigrams and bigrams. crc32 rather than hash(), which is
+    salted per process, so the same text gets the same features everywhere.
+    """
+    words = [word.lower() for word in _WORDS.findall(text)]
+    grams = words + [f"{a} {b}" for a, b in pairwise(words)]
+    return Counter(zlib.crc32(gram.encode("utf-8")) for gram in grams)
+
+
+class SimilarSummary(NamedTuple):
+    similarity: float  # cosine of the TF-IDF vectors, 0..1
+    text: str
+    summary: Dict[str, Any]
+
+
+class SummaryIndex:
+    """
+    TF-IDF vectors of past errors, searched by cosine similarity.
+
+    Vectors are sparse (hashed n-grams) and stored by feature: each feature
+    keeps the rows that contain it and their weights as NumPy arrays, so a
+    query only touches the rows that share a feature with it, and the top k
+    come from one `argpartition` over the scores. Call `build` after adding
+    documents; `search` builds if needed.
+    """
+
+    def __init__(self):
+        self.texts: List[str] = []
+        self.summaries: List[Dict[str, Any]] = []
+        self._counts: List[Counter] = []
+        self._postings: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        self._idf: Dict[int, float] = {}
+        self._built = True
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def add(self, text: str, summary: Dict[str, Any]) -> None:
+        self.texts.append(text)
+        self.summaries.append(summary)
+        self._counts.append(_features(text))
+        self._built = False
+
+    def _weights(self, counts: Counter) -> Dict[int, float]:
+        """Sublinear TF times IDF, L2-normalized. Unseen features get the highest IDF."""
+        unseen = math.log(1 + len(self.texts)) + 1
+        weights = {f: (1 + math.log(tf)) * self._idf.get(f, unseen) for f, tf in counts.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+        return {f: w / norm for f, w in weights.items()}
+
+    def build(self) -> "SummaryIndex":
+        n = len(self.texts)
+        df = Counter(f for counts in self._counts for f in counts)
+        self._idf = {f: math.log((1 + n) / (1 + d)) + 1 for f, d in df.items()}
+        rows: Dict[int, List[int]] = {}
+        values: Dict[int, List[float]] = {}
+        for row, counts in enumerate(self._counts):
+            for f, w in self._weights(counts).items():
+                rows.setdefault(f, []).append(row)
+                values.setdefault(f, []).append(w)
+        self._postings = {f: (np.array(rows[f], dtype=np.int32), np.array(values[f], dtype=np.float32))
+                          for f in rows}
+        self._built = True
+        return self
+
+    def search(self, text: str, k: int = HINT_COUNT, min_similarity: float = 0.0) -> List[SimilarSummary]:
+        """The `k` past errors most similar to `text`, most similar first."""
+        if not self._built:
+            self.build()
+        if not self.texts or k <= 0:
+            return []
+        scores = np.zeros(len(self.texts), dtype=np.float32)
+        for f, w in self._weights(_features(text)).items():
+            posting = self._postings.get(f)
+            if posting is not None:
+                scores[posting[0]] += w * posting[1]
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [SimilarSummary(round(min(1.0, float(scores[i])), 4), self.texts[i], self.summaries[i])
+                for i in top if scores[i] > 0 and scores[i] >= min_similarity]
+
+
+class StoreSummaryIndex:
+    """
+    A SummaryIndex over the summaries in the AnalysisStore, rebuilt when the
+    store has new summaries (checked at most every REFRESH_SECONDS), so
+    diagnoses made by any session or process become searchable.
+    """
+
+    def __init__(self, store: Optional[AnalysisStore] = None, refresh_seconds: float = REFRESH_SECONDS):
+        self.store = store or AnalysisStore()
+        self.refresh_seconds = refresh_seconds
+        self._index = SummaryIndex()
+        self._version: Optional[Tuple[int, float]] = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def _current(self) -> SummaryIndex:
+        with self._lock:
+            now = time.monotonic()
+            if self._version is not None and now - self._checked < self.refresh_seconds:
+                return self._index
+            self._checked = now
+            version = self.store.summary_version()
+            if version != self._version:
+                index = SummaryIndex()
+                for _, template, level, source, summary in self.store.summary_documents():
+                    if summary.get("fix_suggestion") is not None:
+                        index.add(document_text(template, level, source), summary)
+                self._index = index.build()
+                self._version = version
+                logger.info(f"Indexed {len(index)} past summaries for similarity search")
+            return self._index
+
+    def search(self, text: str, k: int = HINT_COUNT, min_similarity: float = 0.0) -> List[SimilarSummary]:
+        return self._current().search(text, k, min_similarity)
+
+    def search_entry(self, entry: Union[Dict[str, str], str], k: int = HINT_COUNT,
+                     min_similarity: float = 0.0) -> List[SimilarSummary]:
+        _, template, level, source = entry_signature(entry)
+        return self.search(document_text(template, level, source), k, min_similarity)
+
+
+_shared_index: Optional[StoreSummaryIndex] = None
+_shared_lock = threading.Lock()
+
+
+def get_summary_index() -> StoreSummaryIndex:
+    """The process-wide index over the default store."""
+    global _shared_index
+    with _shared_lock:
+        if _shared_index is None:
+            _shared_index = StoreSummaryIndex()
+        return _shared_index
+
+
+def related_diagnoses(neighbours: Iterable[SimilarSummary]) -> str:
+    """Past diagnoses formatted for a prompt."""
+    blocks = []
+    for number, neighbour in enumerate(neighbours, start=1):
+        summary = neighbour.summary
+        blocks.append(
+            f"{number}. Error (similarity {neighbour.similarity:.2f}): {neighbour.text}\n"
+            f"   Root cause: {summary.get('summary')}\n"
+            f"   Fix: {summary.get('fix_suggestion')}\n"
+            f"   Where: {summary.get('code_location')}"
+        )
+    return "\n".join(blocks)
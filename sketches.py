@@ -0,0 +1,291 @@
+# ai_file_agent/sketches.py
+
+import base64
+import hashlib
+import heapq
+import logging
+import math
+import os
+from collections import Counter
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Distinct items tracked exactly by SpaceSaving; beyond this, counts become bounded estimates
+SKETCH_CAPACITY = int(os.getenv("LOG_ANALYZER_SKETCH_CAPACITY", "5000"))
+# Count-Min dimensions: overestimate <= e / width * total with probability 1 - exp(-depth)
+SKETCH_WIDTH = int(os.getenv("LOG_ANALYZER_SKETCH_WIDTH", str(2 ** 15)))
+SKETCH_DEPTH = int(os.getenv("LOG_ANALYZER_SKETCH_DEPTH", "4"))
+
+
+def _hash_pairs(items: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Two 64-bit hashes per item. blake2b rather than hash(), which is salted
+    per process: sketches built by different workers must agree to merge.
+    """
+    h1 = np.empty(len(items), dtype=np.uint64)
+    h2 = np.empty(len(items), dtype=np.uint64)
+    for i, item in enumerate(items):
+        digest = hashlib.blake2b(item.encode("utf-8", errors="surrogatepass"), digest_size=16).digest()
+        h1[i] = int.from_bytes(digest[:8], "little")
+        # Odd, so the depth rows probe distinct columns (double hashing)
+        h2[i] = int.from_bytes(digest[8:], "little") | 1
+    return h1, h2
+
+
+class CountMinSketch:
+    """
+    Approximate counts of arbitrarily many distinct items in fixed memory
+    (depth x width int64 counters).
+
+    `estimate(x)` never undercounts; it overcounts by at most
+    `error_bound()` (= e / width * total) with probability 1 - exp(-depth).
+    Sketches with the same dimensions merge by adding their tables.
+    """
+
+    def __init__(self, width: int = SKETCH_WIDTH, depth: int = SKETCH_DEPTH):
+        if width <= 0 or depth <= 0:
+            raise ValueError("Sketch width and depth must be positive.")
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.total = 0
+
+    @classmethod
+    def from_error(cls, epsilon: float, delta: float) -> "CountMinSketch":
+        """Smallest sketch that overcounts by at most `epsilon * total` with probability `1 - delta`."""
+        return cls(width=math.ceil(math.e / epsilon), depth=math.ceil(math.log(1 / delta)))
+
+    def _columns(self, items: List[str]) -> np.ndarray:
+        h1, h2 = _hash_pairs(items)
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        # uint64 arithmetic wraps around, which is what double hashing wants
+        return ((h1[None, :] + rows * h2[None, :]) % np.uint64(self.width)).astype(np.intp)
+
+    def add(self, item: str, count: int = 1) -> None:
+        self.add_counts({item: count})
+
+    def add_counts(self, counts: Dict[str, int]) -> None:
+        """Adds pre-aggregated counts (e.g. a Counter of one batch)."""
+        if not counts:
+            return
+        items = list(counts)
+        values = np.fromiter(counts.values(), dtype=np.int64, count=len(items))
+        columns = self._columns(items)
+        for row in range(self.depth):
+            np.add.at(self.table[row], columns[row], values)
+        self.total += int(values.sum())
+
+    def estimate(self, item: str) -> int:
+        return int(self.estimate_many([item])[0])
+
+    def estimate_many(self, items: List[str]) -> np.ndarray:
+        if not items:
+            return np.empty(0, dtype=np.int64)
+        columns = self._columns(items)
+        return self.table[np.arange(self.depth)[:, None], columns].min(axis=0)
+
+    def error_bound(self) -> float:
+        return math.e / self.width * self.total
+
+    @property
+    def confidence(self) -> float:
+        return 1 - math.exp(-self.depth)
+
+    def merge(self, other: "CountMinSketch") -> "CountMinSketch":
+        if (self.width, self.depth) != (other.width, other.depth):
+            raise ValueError(f"Cannot merge a {other.depth}x{other.width} sketch into a {self.depth}x{self.width} one.")
+        self.table += other.table
+        self.total += other.total
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"width": self.width, "depth": self.depth, "total": self.total,
+                "table": base64.b64encode(self.table.astype("<i8").tobytes()).decode("ascii")}
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> "CountMinSketch":
+        sketch = cls(state["width"], state["depth"])
+        table = np.frombuffer(base64.b64decode(state["table"]), dtype="<i8")
+        sketch.table = table.reshape(sketch.depth, sketch.width).astype(np.int64)
+        sketch.total = state["total"]
+        return sketch
+
+
+class SpaceSaving:
+    """
+    The `capacity` most frequent items of a stream (Metwally et al.'s
+    Space-Saving), in memory proportional to `capacity`.
+
+    While fewer than `capacity` distinct items have been seen, counts are
+    exact. After that, a new item replaces the least counted one and
+    inherits its count as `error`: every tracked count is an overestimate by
+    at most its error, and any item more frequent than total / capacity is
+    guaranteed to be tracked. Summaries merge with the same guarantees.
+    """
+
+    def __init__(self, capacity: int = SKETCH_CAPACITY):
+        if capacity <= 0:
+            raise ValueError("Capacity must be positive.")
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.total = 0
+        # (count, item) entries; stale ones (count changed since) are skipped lazily
+        self._heap: List[Tuple[int, str]] = []
+
+    def add(self, item: str, count: int = 1) -> None:
+        self.total += count
+        if item in self.counts:
+            self.counts[item] += count
+            return
+        if len(self.counts) < self.capacity:
+            self.counts[item] = count
+            self.errors[item] = 0
+            heapq.heappush(self._heap, (count, item))
+            return
+        floor, evicted = self._pop_min()
+        del self.counts[evicted]
+        del self.errors[evicted]
+        self.counts[item] = floor + count
+        self.errors[item] = floor
+        heapq.heappush(self._heap, (floor + count, item))
+
+    def add_counts(self, counts: Dict[str, int]) -> None:
+        for item, count in counts.items():
+            self.add(item, count)
+
+    def _pop_min(self) -> Tuple[int, str]:
+        while True:
+            count, item = heapq.heappop(self._heap)
+            current = self.counts.get(item)
+            if current == count:
+                return count, item
+            if current is not None:
+                heapq.heappush(self._heap, (current, item))
+
+    def min_count(self) -> int:
+        """What an untracked item may have been counted up to (0 until the summary is full)."""
+        if len(self.counts) < self.capacity:
+            return 0
+        return min(self.counts.values())
+
+    def merge(self, other: "SpaceSaving") -> "SpaceSaving":
+        """
+        Combines two summaries (Agarwal et al.'s mergeable summaries): an item
+        missing from one side may have been counted there up to that side's
+        `min_count`, which is added to its count and error.
+        """
+        own_floor, other_floor = self.min_count(), other.min_count()
+        merged: Dict[str, Tuple[int, int]] = {}
+        for item in set(self.counts) | set(other.counts):
+            count = self.counts.get(item, own_floor) + other.counts.get(item, other_floor)
+            error = self.errors.get(item, own_floor) + other.errors.get(item, other_floor)
+            merged[item] = (count, error)
+        kept = heapq.nlargest(max(self.capacity, other.capacity), merged.items(), key=lambda kv: kv[1][0])
+        self.capacity = max(self.capacity, other.capacity)
+        self.counts = {item: count for item, (count, _) in kept}
+        self.errors = {item: error for item, (_, error) in kept}
+        self.total += other.total
+        self._heap = [(count, item) for item, count in self.counts.items()]
+        heapq.heapify(self._heap)
+        return self
+
+    def top(self, n: Optional[int] = None) -> List[Tuple[str, int, int]]:
+        """(item, count, error) of the `n` highest counts, highest first."""
+        ordered = sorted(self.counts.items(), key=lambda kv: (-kv[1], kv[0]))
+        return [(item, count, self.errors[item]) for item, count in ordered[:n]]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"capacity": self.capacity, "total": self.total,
+                "items": [[item, count, self.errors[item]] for item, count in self.counts.items()]}
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> "SpaceSaving":
+        summary = cls(state["capacity"])
+        summary.total = state["total"]
+        for item, count, error in state["items"]:
+            summary.counts[item] = count
+            summary.errors[item] = error
+        summary._heap = [(count, item) for item, count in summary.counts.items()]
+        heapq.heapify(summary._heap)
+        return summary
+
+
+class HeavyHitter(NamedTuple):
+    item: str
+    count: int      # upper bound (what is shown as the count)
+    min_count: int  # guaranteed lower bound
+
+    @property
+    def exact(self) -> bool:
+        return self.count == self.min_count
+
+
+class HeavyHitters:
+    """
+    Streaming top-K with error bounds: SpaceSaving finds the candidates, and a
+    Count-Min sketch over every item tightens their upper bounds (and answers
+    `estimate` for items that are not tracked). Memory is fixed by the
+    capacity and sketch size, whatever the number of entries or distinct
+    templates. Picklable, and serializable with `to_dict` for merging the
+    results of parallel workers or of separate files and runs.
+    """
+
+    def __init__(self, capacity: int = SKETCH_CAPACITY, width: int = SKETCH_WIDTH, depth: int = SKETCH_DEPTH):
+        self.candidates = SpaceSaving(capacity)
+        self.sketch = CountMinSketch(width, depth)
+
+    @property
+    def total(self) -> int:
+        return self.candidates.total
+
+    def update(self, items: Iterable[str]) -> None:
+        """Counts a batch of items (aggregated first, so repeated templates cost one update)."""
+        counts = Counter(items)
+        self.candidates.add_counts(counts)
+        self.sketch.add_counts(counts)
+
+    def add(self, item: str, count: int = 1) -> None:
+        self.candidates.add(item, count)
+        self.sketch.add(item, count)
+
+    def estimate(self, item: str) -> int:
+        """Upper bound on the count of any item, tracked or not."""
+        if item in self.candidates.counts:
+            return min(self.candidates.counts[item], self.sketch.estimate(item))
+        return self.sketch.estimate(item)
+
+    def top(self, n: Optional[int] = None) -> List[HeavyHitter]:
+        ranked = self.candidates.top()
+        estimates = self.sketch.estimate_many([item for item, _, _ in ranked])
+        hitters = [HeavyHitter(item, int(min(count, estimate)), count - error)
+                   for (item, count, error), estimate in zip(ranked, estimates, strict=True)]
+        hitters.sort(key=lambda h: (-h.count, h.item))
+        return hitters[:n]
+
+    @property
+    def exact(self) -> bool:
+        """True while no item has been evicted, i.e. every count is exact."""
+        return len(self.candidates.counts) < self.candidates.capacity or not any(self.candidates.errors.values())
+
+    def error_bound(self) -> float:
+        """Overcount bound of the sketch estimates (holds with probability `sketch.confidence`)."""
+        return self.sketch.error_bound()
+
+    def merge(self, other: "HeavyHitters") -> "HeavyHitters":
+        self.candidates.merge(other.candidates)
+        self.sketch.merge(other.sketch)
+        return self
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"candidates": self.candidates.to_dict(), "sketch": self.sketch.to_dict()}
+
+    @classmethod
+    def from_dict(cls, state: Dict[str, Any]) -> "HeavyHitters":
+        hitters = cls.__new__(cls)
+        hitters.candidates = SpaceSaving.from_dict(state["candidates"])
+        hitters.sketch = CountMinSketch.from_dict(state["sketch"])
+        return hitters
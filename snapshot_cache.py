@@ -0,0 +1,430 @@
+# ai_file_agent/snapshot_cache.py
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Union
+
+from file_utils import extract_template
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = os.getenv("LOG_ANALYZER_SNAPSHOT_DIR", "./.cache/snapshots")
+TABLES = ("entries", "clusters", "summaries")
+OPTIONAL_TABLES = ("error_rate",)
+
+# Imported on first use (see `_load_pyarrow`); None until then or when pyarrow is missing
+pa = None
+_pyarrow_checked = False
+
+
+def _load_pyarrow() -> bool:
+    """Snapshots are an optimization; without pyarrow everything is recomputed."""
+    global pa, _pyarrow_checked
+    if not _pyarrow_checked:
+        _pyarrow_checked = True
+        try:
+            import pyarrow
+            pa = pyarrow
+        except ImportError:
+            logger.info("pyarrow is not installed; analysis snapshots are disabled.")
+    return pa is not None
+
+
+class ArrowRows(Sequence):
+    """
+    Read-only sequence of dict rows over a memory-mapped Arrow table.
+
+    Rows are converted to Python only when accessed, so opening a large
+    snapshot costs almost nothing until a page of it is rendered.
+    """
+
+    def __init__(self, table: "pa.Table"):
+        self.table = table
+        self.columns = table.column_names
+
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            return self.table.slice(start, stop - start).to_pylist()
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return {name: self.table.column(name)[index].as_py() for name in self.columns}
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for batch in self.table.to_batches(max_chunksize=4096):
+            yield from batch.to_pylist()
+
+
+class Snapshot:
+    """
+    A stored analysis. Rows are memory-mapped ArrowRows when read from disk,
+    or plain lists when pyarrow is missing (see SnapshotWriter).
+    """
+
+    def __init__(self, directory: Optional[str], meta: Dict[str, Any], entries: Sequence, clusters: Sequence,
+                 summaries: Sequence, error_rate: Optional[Sequence] = None):
+        self.directory = directory
+        self.meta = meta
+        self.entries = entries
+        self.clusters = clusters
+        self.summaries = summaries
+        # Error counts per (template, minute); None for snapshots saved before they were recorded
+        self.error_rate = error_rate
+
+
+def snapshot_available() -> bool:
+    return _load_pyarrow()
+
+
+# Layout per key, under SNAPSHOT_DIR/<first two characters of the key>/:
+#   <key>.<random>/   one directory per written version
+#   <key>.current     pointer file naming the published version, swapped with os.replace
+#   <key>/            snapshots written before versions existed; read when there is no pointer
+# A version that was published gets a `published` marker once the pointer has moved to it,
+# so a superseded one can be told apart from a version another writer is still filling.
+_PUBLISHED_MARKER = "published"
+
+
+def _key_parent(key: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, key[:2])
+
+
+def _pointer_path(key: str) -> str:
+    return os.path.join(_key_parent(key), f"{key}.current")
+
+
+def _current_dir(key: str) -> Optional[str]:
+    """The directory of the published version of `key`, or None."""
+    try:
+        with open(_pointer_path(key), encoding="utf-8") as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        legacy = os.path.join(_key_parent(key), key)
+        return legacy if os.path.isdir(legacy) else None
+    return os.path.join(_key_parent(key), name) if name else None
+
+
+def _publish(key: str, directory: str) -> None:
+    """
+    Points `key` at `directory` with one atomic rename, then removes the
+    versions it superseded. Readers see the old version or the new one,
+    never a missing or half-replaced one.
+    """
+    pointer = _pointer_path(key)
+    tmp_pointer = f"{pointer}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp_pointer, "w", encoding="utf-8") as f:
+        f.write(os.path.basename(directory))
+    os.replace(tmp_pointer, pointer)
+
+    # Published from here on: cleanup problems are logged, never raised (the caller would abort the version)
+    parent = _key_parent(key)
+    try:
+        # Marked only after the swap: an unmarked version may still be about to be published by another writer
+        open(os.path.join(directory, _PUBLISHED_MARKER), "w").close()
+        current = _current_dir(key)
+        for name in os.listdir(parent):
+            path = os.path.join(parent, name)
+            if (name.startswith(f"{key}.") and path != current and os.path.isdir(path)
+                    and os.path.exists(os.path.join(path, _PUBLISHED_MARKER))):
+                # Renamed away first, so it disappears at once rather than file by file. A reader
+                # still mapping it keeps its open files (on Windows the removal fails until next time)
+                trash = os.path.join(parent, f".trash-{uuid.uuid4().hex[:8]}")
+                try:
+                    os.replace(path, trash)
+                except FileNotFoundError:
+                    continue  # Another writer removed it first
+                shutil.rmtree(trash, ignore_errors=True)
+        shutil.rmtree(os.path.join(parent, key), ignore_errors=True)
+    except OSError as e:
+        logger.warning(f"Could not remove superseded versions of snapshot {key[:12]}: {e}")
+
+
+def _as_text(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, default=str)
+    return str(value)
+
+
+def _rows_to_table(rows: List[Union[Dict[str, Any], str]], columns: Optional[List[str]] = None) -> "pa.Table":
+    """
+    Builds a table of string columns; raw string rows go to an `entry` column.
+    With `columns`, exactly those columns are built (missing values are null).
+    """
+    dict_rows = [row if isinstance(row, dict) else {"entry": row} for row in rows]
+    if columns is None:
+        columns = []
+        for row in dict_rows:
+            columns.extend(k for k in row if k not in columns)
+    return pa.table({
+        name: pa.array([_as_text(row.get(name)) for row in dict_rows], type=pa.string())
+        for name in columns
+    })
+
+
+def _part_path(path: str, index: int) -> str:
+    """Part files of a table: `entries.arrow`, then `entries.1.arrow`, `entries.2.arrow`, ..."""
+    if index == 0:
+        return path
+    base, ext = os.path.splitext(path)
+    return f"{base}.{index}{ext}"
+
+
+class _TableWriter:
+    """
+    Appends row batches to an Arrow IPC file; the schema is taken from the
+    first batch. A batch with columns the schema lacks starts a new part file
+    with the widened schema, so no field is dropped; `_read_table` puts the
+    parts back together, with nulls where a part lacks a column.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rows = 0
+        self.parts = 0
+        self._sink = None
+        self._writer = None
+        self._columns: Optional[List[str]] = None
+
+    def write(self, rows: List[Union[Dict[str, Any], str]]) -> None:
+        if not rows:
+            return
+        if self._columns is not None:
+            known = set(self._columns)
+            names = (k for row in rows for k in (row if isinstance(row, dict) else ("entry",)))
+            added = [k for k in dict.fromkeys(names) if k not in known]
+            if added:
+                logger.info(f"Columns {added} are new in {self.path}; starting part {self.parts + 1}")
+                self._close_part()
+                self._columns = self._columns + added
+        table = _rows_to_table(rows, self._columns)
+        if self._writer is None:
+            self._columns = table.column_names
+            self._sink = pa.OSFile(_part_path(self.path, self.parts), "wb")
+            self._writer = pa.ipc.new_file(self._sink, table.schema)
+            self.parts += 1
+        self._writer.write_table(table)
+        self.rows += len(rows)
+
+    def _close_part(self) -> None:
+        self._writer.close()
+        self._sink.close()
+        self._writer = None
+        self._sink = None
+
+    def close(self) -> None:
+        if self._writer is None and self.parts == 0:
+            # Nothing was written: still leave a readable, empty table
+            self._sink = pa.OSFile(self.path, "wb")
+            self._writer = pa.ipc.new_file(self._sink, pa.schema([("entry", pa.string())]))
+            self.parts = 1
+        if self._writer is not None:
+            self._close_part()
+
+
+def _read_table(path: str) -> "pa.Table":
+    """Memory-maps a table written by _TableWriter, all its parts included."""
+    tables = []
+    while True:
+        part = _part_path(path, len(tables))
+        if tables and not os.path.exists(part):
+            break
+        tables.append(pa.ipc.open_file(pa.memory_map(part, "r")).read_all())
+    if len(tables) == 1:
+        return tables[0]
+    try:
+        return pa.concat_tables(tables, promote_options="default")
+    except TypeError:  # pyarrow < 14
+        return pa.concat_tables(tables, promote=True)
+
+
+class SnapshotWriter:
+    """
+    Writes a snapshot batch by batch, so entries and summaries stream to
+    disk instead of accumulating in memory. Template counts are kept in a
+    fixed-size HeavyHitters sketch: exact up to SKETCH_CAPACITY distinct
+    templates, bounded estimates of the most frequent ones beyond that.
+
+    Everything goes to a new version directory that `finish` publishes by
+    swapping the key's pointer file, so readers never see a partial snapshot
+    and concurrent writers of the same key never collide. Without pyarrow
+    the rows are kept in lists and `finish` returns an in-memory Snapshot.
+    """
+
+    def __init__(self, key: str, meta: Dict[str, Any]):
+        self.key = key
+        self.meta = meta
+        from sketches import HeavyHitters
+        self.templates = HeavyHitters()
+        self.on_disk = _load_pyarrow()
+        self.staging: Optional[str] = None
+        if self.on_disk:
+            os.makedirs(_key_parent(key), exist_ok=True)
+            self.staging = tempfile.mkdtemp(prefix=f"{key}.", dir=_key_parent(key))
+            self._entries = _TableWriter(os.path.join(self.staging, "entries.arrow"))
+            self._summaries = _TableWriter(os.path.join(self.staging, "summaries.arrow"))
+        else:
+            self._entry_rows: List[Union[Dict[str, Any], str]] = []
+            self._summary_rows: List[Dict[str, Any]] = []
+        self._extra: Dict[str, Dict[str, List[Any]]] = {}
+
+    @property
+    def entry_count(self) -> int:
+        return self._entries.rows if self.on_disk else len(self._entry_rows)
+
+    @property
+    def summary_count(self) -> int:
+        return self._summaries.rows if self.on_disk else len(self._summary_rows)
+
+    def add_entries(self, entries: List[Union[Dict[str, Any], str]], templates: Optional[List[str]] = None) -> None:
+        self.templates.update(templates if templates is not None else (extract_template(e) for e in entries))
+        if self.on_disk:
+            self._entries.write(entries)
+        else:
+            self._entry_rows.extend(entries)
+
+    def add_summaries(self, rows: List[Dict[str, Any]]) -> None:
+        if self.on_disk:
+            self._summaries.write(rows)
+        else:
+            self._summary_rows.extend(rows)
+
+    def add_table(self, name: str, columns: Dict[str, List[Any]]) -> None:
+        """A small extra table (e.g. `error_rate`), written as given when the snapshot is finished."""
+        self._extra[name] = columns
+
+    def _cluster_columns(self) -> Dict[str, List[Any]]:
+        ordered = self.templates.top()
+        columns = {"template": [h.item for h in ordered], "count": [h.count for h in ordered]}
+        if not self.templates.exact:
+            # Counts are upper bounds once rare templates were evicted; show by how much they may be off
+            columns["max_overcount"] = [h.count - h.min_count for h in ordered]
+        return columns
+
+    def finish(self, complete: bool = True) -> Snapshot:
+        """
+        Publishes the snapshot and returns it opened. With `complete=False`
+        (e.g. some summaries failed) it is stored for display, but
+        `load_snapshot` will not reuse it for later uploads.
+        """
+        meta = {**self.meta, "key": self.key, "entries": self.entry_count, "summaries": self.summary_count,
+                "complete": complete}
+        if not self.on_disk:
+            def as_rows(columns: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+                return [dict(zip(columns, values, strict=True)) for values in zip(*columns.values(), strict=True)]
+            extra = self._extra.get("error_rate")
+            return Snapshot(None, meta, self._entry_rows, as_rows(self._cluster_columns()), self._summary_rows,
+                            as_rows(extra) if extra is not None else None)
+
+        try:
+            self._entries.close()
+            self._summaries.close()
+            for name, columns in {"clusters": self._cluster_columns(), **self._extra}.items():
+                table = pa.table(columns)
+                with pa.OSFile(os.path.join(self.staging, f"{name}.arrow"), "wb") as sink:
+                    with pa.ipc.new_file(sink, table.schema) as writer:
+                        writer.write_table(table)
+            with open(os.path.join(self.staging, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            # Opened before publishing: once published, a later writer may supersede and remove it
+            snapshot = _open_snapshot(self.staging)
+            if snapshot is None:
+                raise RuntimeError(f"Snapshot {self.key[:12]} could not be read back")
+            _publish(self.key, self.staging)
+        except Exception:
+            self.abort()
+            raise
+
+        self.staging = None
+        logger.info(f"Saved snapshot {self.key[:12]} ({meta['entries']} entries, {meta['summaries']} summaries)")
+        return snapshot
+
+    def abort(self) -> None:
+        if self.staging:
+            shutil.rmtree(self.staging, ignore_errors=True)
+            self.staging = None
+
+
+def save_snapshot(key: str, meta: Dict[str, Any], entries: List[Union[Dict[str, Any], str]],
+                  summaries: List[Dict[str, Any]]) -> Optional[str]:
+    """
+    Stores normalized entries, their template clusters and summaries as
+    uncompressed Arrow IPC files (memory-mappable) under the given key.
+
+    `key` must cover both the file content and the pipeline version (the
+    pipeline's read-stage key does). The snapshot is written to a new
+    directory and published atomically, so readers never see a partial one.
+    Returns the snapshot directory, or None when pyarrow is not installed.
+    """
+    if not _load_pyarrow():
+        return None
+
+    writer = SnapshotWriter(key, meta)
+    try:
+        writer.add_entries(entries)
+        writer.add_summaries(summaries)
+        return writer.finish().directory
+    except Exception:
+        logger.exception(f"Failed to save snapshot {key[:12]}")
+        return None
+
+
+def _open_snapshot(directory: str) -> Optional[Snapshot]:
+    meta_path = os.path.join(directory, "meta.json")
+    if not os.path.exists(meta_path):
+        return None
+
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            meta = json.load(f)
+        tables = {}
+        for name in TABLES + OPTIONAL_TABLES:
+            path = os.path.join(directory, f"{name}.arrow")
+            if name in OPTIONAL_TABLES and not os.path.exists(path):
+                continue
+            tables[name] = ArrowRows(_read_table(path))
+    except Exception as e:
+        if not os.path.isdir(directory):
+            # Superseded and removed by a newer version while it was being opened
+            logger.debug(f"Snapshot version {os.path.basename(directory)} was removed while opening it")
+            return None
+        logger.warning(f"Ignoring unreadable snapshot {os.path.basename(directory)[:12]}: {e}")
+        return None
+
+    return Snapshot(directory, meta, tables["entries"], tables["clusters"], tables["summaries"],
+                    tables.get("error_rate"))
+
+
+def load_snapshot(key: str) -> Optional[Snapshot]:
+    """
+    Opens a stored snapshot with memory-mapped, zero-copy Arrow tables, or
+    returns None if there is no complete one for `key` (or it is unreadable).
+    """
+    if not _load_pyarrow():
+        return None
+
+    snapshot = None
+    for _ in range(3):
+        directory = _current_dir(key)
+        if directory is None:
+            return None
+        snapshot = _open_snapshot(directory)
+        # Unreadable because a writer superseded (and removed) it meanwhile: read the new version
+        if snapshot is not None or _current_dir(key) == directory:
+            break
+    if snapshot is None or not snapshot.meta.get("complete", True):
+        return None
+    logger.info(f"Loaded snapshot {key[:12]}")
+    return snapshot
@@ -0,0 +1,399 @@
+# ai_file_agent/stream_pipeline.py
+
+import contextvars
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import closing, nullcontext
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Union
+
+from analysis_store import AnalysisStore, entry_signature
+from file_utils import iter_content_defined_chunks, open_log_stream
+from metrics import record_wait
+from pipeline import LogPipeline, PIPELINE_VERSION, is_failed_summary
+from snapshot_cache import Snapshot, SnapshotWriter
+
+logger = logging.getLogger(__name__)
+
+# Items (chunks or entry batches) allowed to wait between two stages. Together with
+# STREAM_BATCH_ENTRIES this bounds how much of a file is in memory at once.
+STREAM_QUEUE_SIZE = int(os.getenv("LOG_ANALYZER_STREAM_QUEUE", "8"))
+STREAM_BATCH_ENTRIES = int(os.getenv("LOG_ANALYZER_STREAM_BATCH", "1000"))
+# LLM calls in flight at once while summarizing
+LLM_CONCURRENCY = int(os.getenv("LOG_ANALYZER_LLM_CONCURRENCY", "4"))
+# Chunks kept for the preview table
+PREVIEW_CHUNKS = int(os.getenv("LOG_ANALYZER_PREVIEW_CHUNKS", "200"))
+
+_DONE = object()
+
+
+class StreamStopped(Exception):
+    """Raised inside a stage when the chain is closed early, so the stage aborts instead of finishing."""
+
+
+class _Failure:
+    def __init__(self, stage: str, error: BaseException):
+        self.stage = stage
+        self.error = error
+
+
+class StageChain:
+    """
+    Generator stages connected by bounded queues.
+
+    The source and every stage run on their own thread, so reading, parsing
+    and LLM calls overlap; a stage whose output queue is full blocks until
+    the next one catches up (the wait is recorded as ``stream_<stage>``), so
+    a fast reader can never run ahead of a slow consumer by more than
+    `queue_size` items. Iterating the chain yields the last stage's output on
+    the calling thread. An exception in any stage is re-raised there, and
+    closing the iterator early stops every stage.
+
+    With `threaded=False` the stages are plain nested generators on the
+    calling thread (used in profiling mode, which profiles one thread). A
+    `profiler` (profiling.StageProfiler) then profiles every stage as
+    ``stream_<stage>``.
+    """
+
+    def __init__(self, name: str, source: Callable[[], Iterable], queue_size: int = STREAM_QUEUE_SIZE,
+                 threaded: bool = True, profiler=None):
+        self.queue_size = queue_size
+        self.threaded = threaded
+        self.profiler = profiler if not threaded else None
+        self._stages: List[tuple] = [(name, lambda _: source())]
+        self._stop = threading.Event()
+
+    def then(self, name: str, transform: Callable[[Iterator], Iterable]) -> "StageChain":
+        """Adds a stage: `transform` receives the previous stage's items and yields its own."""
+        self._stages.append((name, transform))
+        return self
+
+    def __iter__(self) -> Iterator[Any]:
+        if not self.threaded:
+            items: Iterator = iter(())
+            for name, transform in self._stages:
+                items = iter(transform(items))
+                if self.profiler is not None:
+                    items = _profiled(f"stream_{name}", items, self.profiler)
+            yield from items
+            return
+
+        inbox: Optional[queue.Queue] = None
+        threads = []
+        for name, transform in self._stages:
+            outbox: queue.Queue = queue.Queue(maxsize=self.queue_size)
+            # Each thread runs in a copy of this context, so capture_timings() still sees its stages
+            context = contextvars.copy_context()
+            thread = threading.Thread(target=context.run, args=(self._run, name, transform, inbox, outbox),
+                                      name=f"stage-{name}", daemon=True)
+            threads.append(thread)
+            inbox = outbox
+        for thread in threads:
+            thread.start()
+        try:
+            yield from self._drain(inbox)
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+
+    def _run(self, name: str, transform: Callable[[Iterator], Iterable], inbox: Optional[queue.Queue],
+             outbox: queue.Queue) -> None:
+        try:
+            items = transform(self._drain(inbox) if inbox is not None else iter(()))
+            for item in items:
+                if not self._put(outbox, item, name):
+                    return
+        except StreamStopped:
+            return
+        except BaseException as e:
+            self._put(outbox, _Failure(name, e), name)
+            return
+        self._put(outbox, _DONE, name)
+
+    def _put(self, outbox: queue.Queue, item: Any, name: str) -> bool:
+        try:
+            outbox.put_nowait(item)
+            return True
+        except queue.Full:
+            pass
+        start = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                outbox.put(item, timeout=0.1)
+                record_wait(f"stream_{name}", time.perf_counter() - start)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _drain(self, inbox: queue.Queue) -> Iterator[Any]:
+        while True:
+            try:
+                item = inbox.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop.is_set():
+                    raise StreamStopped()
+                continue
+            if item is _DONE:
+                return
+            if isinstance(item, _Failure):
+                logger.error(f"Stage '{item.stage}' failed: {item.error}")
+                raise item.error
+            yield item
+
+
+def _profiled(name: str, items: Iterator, profiler) -> Iterator[Any]:
+    """
+    Profiles a stage's work item by item: only the step that produces each
+    item runs inside the profiler stage, so the stage pulling from this one
+    is paused while it runs instead of being counted with it.
+    """
+    try:
+        while True:
+            with profiler.stage(name):
+                item = next(items, _DONE)
+            if item is _DONE:
+                return
+            yield item
+    finally:
+        if hasattr(items, "close"):
+            items.close()
+
+
+class EntryBatch:
+    """Entries moving through the stream, with what the stages learn about them."""
+
+    def __init__(self, entries: List[Union[Dict[str, str], str]]):
+        self.entries = entries
+        self.signatures: List[str] = []
+        self.templates: List[str] = []
+        self.described: List[tuple] = []
+        self.summaries: List[Dict[str, Any]] = []
+
+
+class StreamResult:
+    """What the consumer of a stream needs once it is done; filled in as the stages run."""
+
+    def __init__(self, file_size: int):
+        self.file_size = file_size
+        self.chars_read = 0
+        self.preview_chunks: List[str] = []
+        self.chunk_count = 0
+        self.entry_count = 0
+        self.new_signatures: List[str] = []
+        self.already_ingested = False
+        self.all_summarized = True
+        self.llm_calls = 0
+        self.exported = 0
+        # The batch `progress` is called for: its entries and summary rows
+        self.last_entries: List[Union[Dict[str, str], str]] = []
+        self.last_rows: List[Dict[str, Any]] = []
+        self.snapshot: Optional[Snapshot] = None
+
+    @property
+    def fraction_read(self) -> float:
+        # Characters vs bytes: close enough for a progress bar
+        return min(1.0, self.chars_read / self.file_size) if self.file_size else 1.0
+
+
+def _read_chunks(file_path: str, boundary_pattern: Optional[str], result: StreamResult) -> Iterator[str]:
+    with open_log_stream(file_path) as stream:
+        for chunk in iter_content_defined_chunks(stream, boundary_pattern):
+            result.chars_read += len(chunk)
+            result.chunk_count += 1
+            if len(result.preview_chunks) < PREVIEW_CHUNKS:
+                result.preview_chunks.append(chunk)
+            yield chunk
+
+
+def _parse(chunks: Iterator[str], pipeline: LogPipeline, pattern: str, structured: bool,
+           batch_size: int) -> Iterator[EntryBatch]:
+    """Normalizes chunk by chunk (cached per chunk) and regroups the entries into fixed-size batches."""
+    pending: List[Union[Dict[str, str], str]] = []
+    for chunk in chunks:
+        pending.extend(pipeline.normalize_chunk(chunk, pattern, structured))
+        while len(pending) >= batch_size:
+            yield EntryBatch(pending[:batch_size])
+            pending = pending[batch_size:]
+    if pending:
+        yield EntryBatch(pending)
+
+
+def _cluster(batches: Iterator[EntryBatch]) -> Iterator[EntryBatch]:
+    for batch in batches:
+        batch.described = [entry_signature(entry) for entry in batch.entries]
+        batch.signatures = [d[0] for d in batch.described]
+        batch.templates = [d[1] for d in batch.described]
+        yield batch
+
+
+def _store(batches: Iterator[EntryBatch], store: AnalysisStore, content_hash: str, file_name: str,
+           log_type: str, result: StreamResult) -> Iterator[EntryBatch]:
+    from timestamps import timestamp_column
+
+    ingest = store.begin_ingest(content_hash, file_name, log_type)
+    try:
+        for batch in batches:
+            ingest.add(batch.entries, batch.described, timestamp_column(batch.entries))
+            yield batch
+        stored = ingest.finish()
+    except BaseException:
+        ingest.abort()
+        raise
+    result.already_ingested = stored.already_ingested
+    result.new_signatures = stored.new_signatures
+
+
+def _summarize(batches: Iterator[EntryBatch], pipeline: LogPipeline, store: AnalysisStore, concurrency: int,
+               window: int, result: StreamResult, flush_every: int = 50) -> Iterator[EntryBatch]:
+    """
+    Summarizes the first entry of every signature without a stored summary,
+    up to `concurrency` LLM calls at a time, and attaches a summary to every
+    entry. Batches leave in order; at most `window` batches wait for their
+    summaries, which is what keeps a slow LLM from buffering the whole file.
+    With a profiler on the pipeline the calls run in line, on the thread
+    the profiler follows.
+    """
+    known: Dict[str, Dict[str, Any]] = {}
+    in_flight: Dict[str, Future] = {}
+    pending_save: Dict[str, Dict[str, Any]] = {}
+    waiting: Deque[EntryBatch] = deque()
+
+    def finish(batch: EntryBatch) -> EntryBatch:
+        for signature in batch.signatures:
+            if signature not in known:
+                summary = in_flight.pop(signature).result()
+                known[signature] = summary
+                if is_failed_summary(summary):
+                    result.all_summarized = False
+                else:
+                    pending_save[signature] = summary
+        batch.summaries = [known[signature] for signature in batch.signatures]
+        if len(pending_save) >= flush_every:
+            store.save_summaries(pending_save)
+            pending_save.clear()
+        return batch
+
+    executor = None
+    if pipeline.profiler is None:
+        executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="llm")
+
+    def submit(entry) -> Future:
+        if executor is not None:
+            return executor.submit(lambda e: pipeline.summarize(e)[0], entry)
+        future: Future = Future()
+        try:
+            future.set_result(pipeline.summarize(entry)[0])
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    try:
+        for batch in batches:
+            unseen = [s for s in dict.fromkeys(batch.signatures) if s not in known and s not in in_flight]
+            if unseen:
+                known.update(store.summaries(unseen))
+            for entry, signature in zip(batch.entries, batch.signatures, strict=True):
+                if signature not in known and signature not in in_flight:
+                    in_flight[signature] = submit(entry)
+                    result.llm_calls += 1
+            waiting.append(batch)
+            while waiting and (len(waiting) > window or all(
+                    s in known or in_flight[s].done() for s in waiting[0].signatures)):
+                yield finish(waiting.popleft())
+        while waiting:
+            yield finish(waiting.popleft())
+    finally:
+        # Stopped early: do not start summaries nobody will read
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        store.save_summaries(pending_save)
+        logger.info(f"Summarized {result.llm_calls} unseen signatures")
+
+
+def stream_analysis(pipeline: LogPipeline, store: AnalysisStore, file_path: str, file_name: str, log_type: str,
+                    pattern: str, structured: bool, boundary_pattern: Optional[str],
+                    progress: Optional[Callable[[StreamResult], None]] = None, export_path: Optional[str] = None,
+                    batch_size: int = STREAM_BATCH_ENTRIES, queue_size: int = STREAM_QUEUE_SIZE,
+                    concurrency: int = LLM_CONCURRENCY) -> StreamResult:
+    """
+    Normalizes, stores and summarizes a log file as one stream:
+
+        read chunks -> parse -> cluster -> store -> summarize -> snapshot
+
+    Every stage runs concurrently with the others and only the items in the
+    bounded queues between them are in memory. The consumer (this thread)
+    writes entries and summary rows to an Arrow snapshot as they arrive, so
+    the result is displayed from a memory-mapped file rather than from
+    lists that grow with the input. With `export_path` the summary rows are
+    also streamed to that export sink (see export_sinks.get_sink). `progress`
+    is called on this thread after every batch, with `last_entries` and
+    `last_rows` of the result set to that batch (the batch starts at entry
+    `entry_count - len(last_entries)`), so callers can persist partial results.
+
+    `pipeline.keys["read"]` must already be set (see `LogPipeline.read_key`).
+    Returns the StreamResult, whose `snapshot` holds the entries and summaries.
+    """
+    from export_sinks import get_sink
+    from timestamps import ErrorRate
+
+    content_hash = pipeline.keys["read"]
+    result = StreamResult(os.path.getsize(file_path))
+    # The profiler follows one thread; profiling mode runs the stages in line
+    threaded = pipeline.profiler is None
+    if not threaded:
+        concurrency = 1
+
+    chain = (
+        StageChain("read", lambda: _read_chunks(file_path, boundary_pattern, result), queue_size, threaded,
+                   profiler=pipeline.profiler)
+        .then("parse", lambda chunks: _parse(chunks, pipeline, pattern, structured, batch_size))
+        .then("cluster", _cluster)
+        .then("store", lambda batches: _store(batches, store, content_hash, file_name, log_type, result))
+        .then("summarize", lambda batches: _summarize(batches, pipeline, store, concurrency, queue_size, result))
+    )
+
+    def profiled(name: str):
+        return pipeline.profiler.stage(name) if pipeline.profiler is not None else nullcontext()
+
+    writer = SnapshotWriter(content_hash, {"pipeline_version": PIPELINE_VERSION, "file_name": file_name,
+                                           "log_type": log_type, "pattern": pattern})
+    error_rate = ErrorRate(log_type)
+    sink = get_sink(export_path) if export_path else None
+    try:
+        with closing(iter(chain)) as batches:
+            for batch in batches:
+                with profiled("stream_snapshot"):
+                    writer.add_entries(batch.entries, batch.templates)
+                    error_rate.add(batch.entries, batch.templates)
+                    rows = [
+                        {"log": entry, "Message": summary["message"], "summary": summary["summary"],
+                         "fix_suggestion": summary["fix_suggestion"], "code_fix": summary["code_fix"],
+                         "code_location": summary["code_location"],
+                         "resources": ", ".join(summary["resources"] or [])}
+                        for entry, summary in zip(batch.entries, batch.summaries, strict=True)
+                    ]
+                    writer.add_summaries(rows)
+                    if sink is not None:
+                        result.exported = sink.write_many(rows)
+                result.entry_count += len(batch.entries)
+                result.last_entries, result.last_rows = batch.entries, rows
+                if progress is not None:
+                    progress(result)
+        with profiled("stream_snapshot"):
+            writer.add_table("error_rate", error_rate.columns())
+            writer.meta["errors"] = error_rate.errors
+            result.snapshot = writer.finish(complete=result.all_summarized and result.entry_count > 0)
+        if sink is not None:
+            sink.close()
+    except BaseException:
+        writer.abort()
+        if sink is not None:
+            sink.abort()
+        raise
+    return result
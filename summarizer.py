@@ -1,28 +1,26 @@
 # ai_file_agent/summarizer.py
 
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import Runnable
-from langchain_openai import ChatOpenAI
-from openai import OpenAI
 import os
 import asyncio
 import json
-import time
 import logging
-import sys
-import uuid
+import threading
 import traceback
-from tenacity import retry, stop_after_attempt, wait_fixed
-from typing import List, Union
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_fixed
+from typing import List, Sequence, Tuple, Union
 from dotenv import load_dotenv
 
+from llm_json import SUMMARY_FIELDS, parse_summary, summary_schema
+from metrics import REGISTRY, timed
+from similar_summaries import HINT_SIMILARITY, REUSE_SIMILARITY, get_summary_index, related_diagnoses
+
 load_dotenv()
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.DEBUG, format="%(levelname)s:%(name)s:%(message)s")
 
-# Suppress watchdog debug logs by setting its level to WARNING or ERROR
-logging.getLogger("watchdog").setLevel(logging.WARNING)
-logging.getLogger("watchdog.observers.inotify_buffer").setLevel(logging.WARNING)
+# Ask for replies that follow the summary JSON schema (turned off for the process if the endpoint rejects it)
+STRUCTURED_OUTPUT = os.getenv("LOG_ANALYZER_STRUCTURED_OUTPUT", "true").lower() not in ("0", "false", "no")
+# Follow-up requests for fields a reply left out or had cut off
+REASK_ATTEMPTS = int(os.getenv("LOG_ANALYZER_REASK_ATTEMPTS", "1"))
 
 # Prompt template to analyze log messages and exceptions
 #
@@ -87,6 +85,39 @@ Log Entry:
 {log_entry}
 """
 
+# Shorter prompt used when past diagnoses of similar errors are available
+RELATED_PROMPT_TEMPLATE = """
+You are a log analysis assistant. Diagnose the log entry below for the developer who has to fix it.
+
+These similar errors were diagnosed before. Reuse what applies to this entry and correct what does not:
+{related}
+
+Return only a JSON object with these exact fields:
+
+{{
+  "message": "<Brief, human-readable summary of the log error>",
+  "summary": "<Concise root cause explanation>",
+  "fix_suggestion": "<Clear, actionable advice for resolving the issue>",
+  "code_fix": "<Example code/config adjustment with reasoning, if applicable>",
+  "code_location": "<Where to apply or investigate the fix in the code/configuration>",
+  "resources": ["<URL or resource title>", "..."]
+}}
+
+Log Entry:
+{log_entry}
+"""
+
+# Follow-up prompt asking only for the fields an earlier reply did not deliver
+REASK_PROMPT_TEMPLATE = """
+Your analysis of the log entry below was incomplete. These fields are done:
+{done}
+
+Return only a JSON object with the missing fields: {fields}
+
+Log Entry:
+{log_entry}
+"""
+
 # Initialize OpenAI chat model
 #llm = ChatOpenAI(
   #  model="gpt-3.5-turbo",
@@ -95,84 +126,179 @@ Log Entry:
 #)
 
 # Replace this with your actual OpenAI or compatible LLM client
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    The OpenAI client, created on first use: importing the SDK takes most of
+    a second, which the app should not pay before the upload widget shows.
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                from openai import OpenAI
+                _client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    return _client
 
 # Create the chain to send prompt to LLM
 #chain: Runnable = prompt | llm
 
 
-#@retry(stop=stop_after_attempt(3), wait=wait_fixed(2))
+class MalformedReply(ValueError):
+    """An LLM reply from which none of the requested fields could be read."""
+
+
+# openai errors worth another attempt (matched by name so the SDK is not imported to define them)
+_TRANSIENT_ERRORS = {"APIConnectionError", "APITimeoutError", "RateLimitError", "InternalServerError"}
+_structured_output = STRUCTURED_OUTPUT
+
+
+def _should_retry(error: BaseException) -> bool:
+    error_type = type(error)
+    return isinstance(error, MalformedReply) or (
+        error_type.__module__.startswith("openai") and error_type.__name__ in _TRANSIENT_ERRORS)
+
+
+def _complete(prompt: str, fields: Sequence[str]) -> Tuple[str, str]:
+    """Sends `prompt`; returns the reply text and its finish reason."""
+    global _structured_output
+    request = dict(model="gpt-4o-mini", messages=[{"role": "user", "content": prompt}], temperature=0.3)
+    response = None
+    if _structured_output:
+        response_format = {"type": "json_schema",
+                           "json_schema": {"name": "log_summary", "strict": True, "schema": summary_schema(fields)}}
+        try:
+            response = get_client().chat.completions.create(**request, response_format=response_format)
+        except Exception as e:
+            if type(e).__name__ != "BadRequestError" or "response_format" not in str(e):
+                raise
+            logger.warning(f"Structured output not supported by the model or endpoint, disabled: {e}")
+            _structured_output = False
+    if response is None:
+        response = get_client().chat.completions.create(**request)
+    choice = response.choices[0]
+    return choice.message.content or "", choice.finish_reason or ""
+
+
+@retry(retry=retry_if_exception(_should_retry), stop=stop_after_attempt(3), wait=wait_fixed(2), reraise=True)
+@timed("call_llm")
+def call_llm(prompt: str, fields: Sequence[str] = SUMMARY_FIELDS) -> Tuple[dict, List[str]]:
+    """
+    Asks the LLM for the summary `fields` and reads them from its reply.
+
+    The reply is parsed tolerantly (see `llm_json.TolerantJSONParser`):
+    fences, prose around the JSON, common syntax slips and truncation are
+    repaired locally, so a bad reply only costs a round trip when nothing at
+    all can be read from it. Connection, rate-limit and server errors are
+    retried as well.
+
+    Returns:
+    - Tuple[dict, list]: The summary fields, and those missing, empty or cut
+      off (see `reask_missing`).
+
+    Raises:
+    - MalformedReply: If no field could be read after 3 attempts.
+    """
+    logger.debug("Calling LLM with prompt...")
+    result_text, finish_reason = _complete(prompt, fields)
+    logger.debug(f"Raw LLM response ({finish_reason}): {result_text}")
+    summary, missing = parse_summary(result_text, fields)
+    if not any(summary[field] for field in fields):
+        REGISTRY.inc("log_analyzer_llm_replies_total", outcome="malformed")
+        logger.error(f"LLM reply has none of the expected fields ({finish_reason}): {result_text[:200]!r}")
+        raise MalformedReply(f"No summary fields in the LLM reply: {result_text[:200]!r}")
+    if missing:
+        outcome = "partial"
+    else:
+        try:
+            json.loads(result_text)
+            outcome = "valid"
+        except ValueError:
+            outcome = "repaired"
+    REGISTRY.inc("log_analyzer_llm_replies_total", outcome=outcome)
+    return summary, missing
+
 
-def call_llm(prompt: str) -> dict:
+def reask_missing(log_text: str, summary: dict, missing: List[str]) -> Tuple[dict, List[str]]:
     """
-    Call the LLM with retry and JSON output validation.
+    Asks only for the `missing` fields of `summary` (up to REASK_ATTEMPTS
+    times) and merges them in. Fields still missing afterwards keep whatever
+    partial value they had.
+    """
+    for _ in range(REASK_ATTEMPTS):
+        if not missing:
+            break
+        done = {field: value for field, value in summary.items() if field not in missing}
+        prompt = REASK_PROMPT_TEMPLATE.format(done=json.dumps(done, indent=2, ensure_ascii=False),
+                                              fields=", ".join(missing), log_entry=log_text)
+        logger.info(f"🔁 Asking again for missing summary fields: {', '.join(missing)}")
+        REGISTRY.inc("log_analyzer_llm_reasks_total")
+        try:
+            found, still_missing = call_llm(prompt, missing)
+        except MalformedReply:
+            break
+        for field, value in found.items():
+            # A partial answer does not replace a partial value already there
+            if field not in still_missing or not summary.get(field):
+                summary[field] = value
+        missing = still_missing
+    return summary, missing
+
+
+def similar_diagnoses(entry: Union[str, dict]) -> list:
+    """
+    Past summaries of errors similar to `entry`, most similar first. Retrieval
+    problems are logged and treated as "nothing similar": they must not stop
+    the entry from being summarized.
     """
     try:
-        logger.debug("Calling LLM with prompt...")
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.3
-        )
-        result_text = response.choices[0].message.content.strip()
-        # Strip Markdown JSON block if present
-        if result_text.startswith("```json"):
-            result_text = result_text.removeprefix("```json").strip()
-        if result_text.endswith("```"):
-            result_text = result_text.removesuffix("```").strip()
-        logger.debug(f"Raw LLM response: {result_text}")
-       # print("type of result_text:", type(result_text))
-       # print(f"LLM response content New:\n{result_text}\n")
-        #sys.exit(0)
-        json_result = json.loads(result_text)
-      #  print(f"LLM Json response content:\n{json_result}\n")
-      #  print("type of result_text:", type(json_result))
-        #sys.exit(0)
-        if not isinstance(json_result, dict):
-            raise ValueError("Invalid JSON response structure.")
-        return json_result
+        return get_summary_index().search_entry(entry)
     except Exception as e:
-        logger.error(f"LLM call or JSON decode failed: {e}")
-        raise
+        logger.warning(f"Similar-summary search failed: {e}")
+        return []
 
+
+@timed("summarize_log_entries", bytes_arg=None, count_result=True)
 def summarize_log_entries(entries: List[Union[str, dict]]) -> List[dict]:
     """
     Summarize a single log entries using the LLM and return structured results.
     """
     summaries = []
-    print(f"Total log entries to summarize: {entries}")
-    
+    logger.debug(f"Total log entries to summarize: {entries}")
+
     try:
             logger.info(f"🔍 Summarizing log entry{entries}")
             log_text = json.dumps(entries) if isinstance(entries, dict) else str(entries)
-            print(f"Log entry  content:\n{log_text}\n")
-            log_entry = {
-                "message": log_text,
-                "exception": None,
-                "request_id": str(uuid.uuid4())  # Ensure uniqueness
-            }
-            print(f"Log entry  content:\n{log_entry}\n")
-            #sys.exit(0)
-            prompt = LOG_PROMPT_TEMPLATE.format(log_entry=log_text)
-            #prompt = LOG_PROMPT_TEMPLATE.format(log_entry=json.dumps(log_entry, indent=2))
-            print(f"LLM prompt content:\n{prompt}\n")
-            #sys.exit(0)
-            summary = call_llm(prompt)
-            print(f"LLM summary content:\n{summary}\n")
-           # print("type of summary:", type(summary))
-            #sys.exit(0)
-          #  if not summary.get("message") or not summary.get("summary"):
-           #     logger.warning(f"⚠️ Entry {entries}: LLM did not return expected fields. Retrying...")
-            
-
-           # summaries.append(summary)
+            logger.debug(f"Log entry content:\n{log_text}")
+            neighbours = similar_diagnoses(entries)
+            if neighbours and neighbours[0].similarity >= REUSE_SIMILARITY:
+                # A closely related error was already diagnosed: reuse its fix instead of asking again
+                best = neighbours[0]
+                logger.info(f"♻️ Reusing the diagnosis of a similar error ({best.similarity:.2f}): {best.text}")
+                REGISTRY.inc("log_analyzer_summary_retrieval_total", outcome="reused")
+                summaries.append({**best.summary, "similar_to": best.text, "similarity": best.similarity})
+                return summaries
+            related = [n for n in neighbours if n.similarity >= HINT_SIMILARITY]
+            if related:
+                REGISTRY.inc("log_analyzer_summary_retrieval_total", outcome="related")
+                prompt = RELATED_PROMPT_TEMPLATE.format(log_entry=log_text, related=related_diagnoses(related))
+            else:
+                REGISTRY.inc("log_analyzer_summary_retrieval_total", outcome="none")
+                prompt = LOG_PROMPT_TEMPLATE.format(log_entry=log_text)
+            logger.debug(f"LLM prompt content:\n{prompt}")
+            summary, missing = call_llm(prompt)
+            if missing:
+                summary, missing = reask_missing(log_text, summary, missing)
+            logger.debug(f"LLM summary content:\n{summary}")
             if isinstance(summary, dict) and summary.get("message") and summary.get("summary"):
                 summaries.append(summary)
             else:
                 raise ValueError(f"Unexpected LLM output format: {summary}")
 
     except Exception as e:
-            #logger.error(f"❌ Failed to summarize entry {entries}: {e}")
             logger.error(f"❌ Failed to summarize entry {entries}: {e}\n{traceback.format_exc()}")
             summaries.append({
                 "message": f"Failed to analyze log entry {entries}",
@@ -184,7 +310,6 @@ def summarize_log_entries(entries: List[Union[str, dict]]) -> List[dict]:
             })
 
     logger.info(f"✅ Total summarized entries: {len(summaries)}")
-    #print(f"Summaries: {summaries}")
     return summaries
 
 # Main summarization function
@@ -197,7 +322,7 @@ async def summarize_logs(log_entries):
         }, indent=2)
 
         try:
-            print(f"Sending to LLM:\n{message}")
+            logger.debug(f"Sending to LLM:\n{message}")
             result = await chain.ainvoke({"message": message})
             summary = result.content
             return {"message": message, "summary": summary}
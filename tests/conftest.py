@@ -0,0 +1,7 @@
+# ai_file_agent/tests/conftest.py
+
+import os
+import sys
+
+# The app is a set of top-level modules, not a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,66 @@
+# ai_file_agent/tests/test_api.py
+
+import json
+
+import pytest
+
+pytest.importorskip("fastapi")
+from fastapi.testclient import TestClient
+
+import api
+
+LARAVEL_LINES = [
+    "[2024-03-01 10:00:0{n}] local.ERROR: SQLSTATE[HY000] [2002] Connection refused (Connection: mysql)\n",
+    "#0 /var/www/vendor/laravel/framework/src/Illuminate/Database/Connection.php(671): PDO->__construct()\n",
+    "[2024-03-01 10:01:0{n}] local.WARNING: Cache miss for key user_{n}\n",
+]
+
+
+def _upload(entries: int):
+    """The upload as several body chunks, cut mid-line, so the server sees a chunked request."""
+    text = "".join(line.format(n=i % 10) for i in range(entries) for line in LARAVEL_LINES).encode()
+    for start in range(0, len(text), 1000):
+        yield text[start:start + 1000]
+
+
+def test_analyze_streams_events_for_a_chunked_upload():
+    client = TestClient(api.app)
+    response = client.post("/analyze", params={"format": "ndjson", "summarize": "false"}, content=_upload(40))
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    events = [json.loads(line) for line in response.text.splitlines()]
+    types = [event["type"] for event in events]
+    assert types[0] == "format" and types[1] == "normalized" and types[-1] == "done"
+    assert set(types[2:-1]) == {"cluster"}
+    assert events[0]["log_type"] == "laravel"
+    assert events[1]["entries"] == 80
+    clusters = [event for event in events if event["type"] == "cluster"]
+    assert sum(cluster["count"] for cluster in clusters) == 80
+    # The stack trace line stays with its entry
+    assert any("Connection.php" in cluster["example"] for cluster in clusters)
+
+
+def test_analyze_sse_framing():
+    client = TestClient(api.app)
+    response = client.post("/analyze", params={"format": "sse", "summarize": "false"}, content=_upload(5))
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [line[len("event: "):] for line in response.text.splitlines() if line.startswith("event: ")]
+    assert events[0] == "format" and events[1] == "normalized" and events[-1] == "done"
+
+
+def test_analyze_rejects_oversized_upload(monkeypatch):
+    monkeypatch.setattr(api, "MAX_UPLOAD_BYTES", 100)
+    client = TestClient(api.app)
+    response = client.post("/analyze", params={"summarize": "false"}, content=_upload(5))
+
+    assert response.status_code == 413
+    # The slot was given back
+    assert not api._request_slots.locked()
+
+
+def test_analyze_rejects_unknown_format():
+    response = TestClient(api.app).post("/analyze", params={"format": "xml"}, content=b"x")
+    assert response.status_code == 422
@@ -0,0 +1,87 @@
+# ai_file_agent/tests/test_llm_json.py
+
+from llm_json import SUMMARY_FIELDS, TolerantJSONParser, parse_summary
+
+COMPLETE = ('{"message": "DB down", "summary": "MySQL refused the connection", '
+            '"fix_suggestion": "Start MySQL", "code_fix": null, "code_location": ".env", '
+            '"resources": ["https://dev.mysql.com/doc/"]}')
+
+
+def test_complete_reply():
+    summary, missing = parse_summary(COMPLETE)
+    assert missing == []
+    assert summary["message"] == "DB down"
+    assert summary["code_fix"] is None
+    assert summary["resources"] == ["https://dev.mysql.com/doc/"]
+    assert list(summary) == SUMMARY_FIELDS
+
+
+def test_prose_and_markdown_fence_around_the_object():
+    summary, missing = parse_summary(f"Here is the analysis:\n```json\n{COMPLETE}\n```\nHope it helps!")
+    assert missing == []
+    assert summary["fix_suggestion"] == "Start MySQL"
+
+
+def test_python_style_reply():
+    reply = ("{'message': 'Timeout', 'summary': 'Upstream slow', 'fix_suggestion': 'Raise the timeout', "
+             "'code_fix': None, 'code_location': None, 'resources': [], }")
+    summary, missing = parse_summary(reply)
+    assert missing == []
+    assert summary["message"] == "Timeout"
+    assert summary["resources"] == []
+
+
+def test_bare_keys_missing_commas_and_raw_line_breaks():
+    reply = '{message: "Disk full"\n summary: "The /var partition\nis full" fix_suggestion: "Rotate logs",}'
+    summary, missing = parse_summary(reply)
+    assert summary["message"] == "Disk full"
+    assert summary["summary"] == "The /var partition\nis full"
+    assert summary["fix_suggestion"] == "Rotate logs"
+    # Optional fields absent from the reply are reported, with empty values
+    assert missing == ["code_fix", "code_location", "resources"]
+    assert summary["resources"] == []
+
+
+def test_truncated_reply_keeps_the_partial_value():
+    summary, missing = parse_summary('{"message": "OOM", "summary": "The worker ran out of mem')
+    assert summary["message"] == "OOM"
+    assert summary["summary"] == "The worker ran out of mem"
+    assert "summary" in missing and "fix_suggestion" in missing
+    assert "message" not in missing
+
+
+def test_key_spellings_and_resources_as_text():
+    reply = ('{"Message": "x", "Summary": "y", "fixSuggestion": "z", "code-fix": "a", '
+             '"Code Location": "b", "resources": "- https://a.example\\n- https://b.example"}')
+    summary, missing = parse_summary(reply)
+    assert missing == []
+    assert summary["fix_suggestion"] == "z"
+    assert summary["code_fix"] == "a"
+    assert summary["code_location"] == "b"
+    assert summary["resources"] == ["https://a.example", "https://b.example"]
+
+
+def test_empty_required_field_is_missing():
+    summary, missing = parse_summary('{"message": "", "summary": "s", "fix_suggestion": "f"}')
+    assert summary["message"] is None
+    assert "message" in missing
+
+
+def test_no_object_at_all():
+    summary, missing = parse_summary("I cannot help with that.")
+    assert missing == SUMMARY_FIELDS
+    assert all(summary[field] in (None, []) for field in SUMMARY_FIELDS)
+
+
+def test_unicode_escapes_and_nested_values():
+    summary, _ = parse_summary('{"message": "caf\\u00e9", "summary": {"cause": "x"}, "fix_suggestion": 3}')
+    assert summary["message"] == "café"
+    assert summary["summary"] == '{"cause": "x"}'
+    assert summary["fix_suggestion"] == "3"
+
+
+def test_streamed_chunks_parse_like_the_whole_reply():
+    parser = TolerantJSONParser()
+    for start in range(0, len(COMPLETE), 7):
+        parser.feed(COMPLETE[start:start + 7])
+    assert parser.result() == TolerantJSONParser().feed(COMPLETE).result()
@@ -0,0 +1,67 @@
+# ai_file_agent/tests/test_search_index.py
+
+from search_index import SearchIndex, entry_matches, parse_query
+
+ENTRIES = [
+    {"level": "ERROR", "source": "Server", "message": "[MY-013360] [Server] Plugin mysql_native_password is deprecated"},
+    {"log_level": "warning", "module": "Cache", "msg": "Cache miss for key user_42"},
+    "[2024-03-17 14:12:30] local.ERROR: The \"--force\" option does not exist.",
+    {"level": "ERROR", "source": "InnoDB", "message": "Table test.users does not exist"},
+]
+
+
+def _index() -> SearchIndex:
+    return SearchIndex().add_all(ENTRIES)
+
+
+def test_terms_are_anded_and_case_insensitive():
+    assert _index().search("error") == [0, 2, 3]
+    assert _index().search("ERROR exist") == [2, 3]
+
+
+def test_field_scope_uses_aliases():
+    index = _index()
+    assert index.search("level:error") == [0, 3]
+    # log_level and module are aliases of level and source
+    assert index.search("level:warning source:cache") == [1]
+    assert index.search("source:server") == [0]
+
+
+def test_raw_entries_are_searchable_as_message():
+    index = SearchIndex().add_all(["disk full on /var", {"entry": "disk quota exceeded"}])
+    assert index.search("message:disk") == [0, 1]
+
+
+def test_compound_identifiers_match_whole_and_by_part():
+    index = _index()
+    assert index.search("MY-013360") == [0]
+    assert index.search("013360") == [0]
+    # A compound query term only matches the whole identifier
+    assert index.search("local.error") == [2]
+    assert index.search("local.warning") == []
+
+
+def test_exclusions_and_phrases():
+    index = _index()
+    assert index.search("error -deprecated") == [2, 3]
+    assert index.search("-error") == [1]
+    assert index.search('"option does not exist"') == [2]
+
+
+def test_limit_and_empty_query():
+    assert _index().search("error", limit=2) == [0, 2]
+    assert _index().search("") == []
+    assert _index().search("nothing-like-this") == []
+
+
+def test_entry_matches_agrees_with_the_index():
+    index = _index()
+    for query in ("error", "level:error -innodb", '"does not exist"', "-error", "source:cache miss"):
+        terms = parse_query(query)
+        assert [i for i, entry in enumerate(ENTRIES) if entry_matches(entry, terms)] == index.search(query), query
+
+
+def test_ids_continue_from_start_id():
+    index = SearchIndex().add_all(["first error"]).add_all(["second error"], start_id=1)
+    assert index.search("error") == [0, 1]
+    assert index.size == 2
@@ -0,0 +1,20 @@
+# ai_file_agent/tests/test_startup.py
+
+import pytest
+
+pytest.importorskip("streamlit")
+
+import benchmark
+
+
+def test_app_imports_within_budget_without_heavy_modules(capsys):
+    # Runs the probe in fresh interpreters: `import main` within the budget, no DEFERRED_MODULES loaded
+    problems = benchmark.check_startup()
+    assert problems == [], "; ".join(problems)
+
+
+def test_probe_reports_deferred_modules(monkeypatch):
+    # The check itself must catch an eager import: streamlit is always loaded by the probe
+    monkeypatch.setattr(benchmark, "DEFERRED_MODULES", benchmark.DEFERRED_MODULES + ("streamlit",))
+    problems = benchmark.check_startup(repeat=1)
+    assert any("imported at startup: streamlit" in problem for problem in problems)
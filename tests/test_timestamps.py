@@ -0,0 +1,70 @@
+# ai_file_agent/tests/test_timestamps.py
+
+import calendar
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from timestamps import NAT, detect_layout, parse_timestamps
+
+
+def _epoch(year, month, day, hour=0, minute=0, second=0) -> int:
+    return calendar.timegm((year, month, day, hour, minute, second))
+
+
+def test_iso_with_brackets_fraction_and_trailing_text():
+    values = ["[2024-03-17 14:50:24] local.ERROR: boom", "2024-03-17T14:50:24.5Z", "2022-11-02 00:00:00"]
+    epochs = parse_timestamps(values, unit="ms")
+    assert epochs.tolist() == [_epoch(2024, 3, 17, 14, 50, 24) * 1000,
+                               _epoch(2024, 3, 17, 14, 50, 24) * 1000 + 500,
+                               _epoch(2022, 11, 2) * 1000]
+
+
+def test_mixed_brackets_in_one_column():
+    epochs = parse_timestamps(["[2024-01-01 00:00:01]", "2024-01-01 00:00:02"], layout="iso")
+    assert epochs.tolist() == [_epoch(2024, 1, 1, 0, 0, 1), _epoch(2024, 1, 1, 0, 0, 2)]
+
+
+def test_slash_layout():
+    assert parse_timestamps(["2024/03/17 14:50:24 [error] 12#12: oops"], log_format="nginx").tolist() == \
+        [_epoch(2024, 3, 17, 14, 50, 24)]
+
+
+def test_apache_with_and_without_fraction():
+    epochs = parse_timestamps(["[Sat Jun 07 00:00:22.712954 2025] [core:error]", "Sat Jun 07 00:00:22 2025"],
+                              layout="apache", unit="us")
+    assert epochs.tolist() == [_epoch(2025, 6, 7, 0, 0, 22) * 1_000_000 + 712954,
+                               _epoch(2025, 6, 7, 0, 0, 22) * 1_000_000]
+
+
+def test_syslog_uses_the_default_year():
+    epochs = parse_timestamps(["Jun  7 00:00:22 host sshd[1]: x", "Dec 31 23:59:59 host cron"],
+                              layout="syslog", default_year=2023)
+    assert epochs.tolist() == [_epoch(2023, 6, 7, 0, 0, 22), _epoch(2023, 12, 31, 23, 59, 59)]
+
+
+def test_unparseable_values_become_nat():
+    epochs = parse_timestamps(["2024-13-01 00:00:00", None, "", "not a date", "2024-02-30 10:00:00"],
+                              layout="iso")
+    assert epochs[:4].tolist() == [NAT] * 4
+    # Day 30 passes the per-field range check; it is not validated against the month
+    assert epochs[4] != NAT
+
+
+def test_empty_and_undetectable_columns():
+    assert parse_timestamps([]).shape == (0,)
+    assert parse_timestamps(["no timestamp here"]).tolist() == [NAT]
+
+
+def test_detect_layout():
+    assert detect_layout(["x"], log_format="apache") == "apache"
+    assert detect_layout([None, "", "2024/01/01 00:00:00"]) == "slash"
+    assert detect_layout(["Jun  7 00:00:22 host"]) == "syslog"
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        parse_timestamps(["2024-01-01 00:00:00"], unit="ns")
+    with pytest.raises(ValueError):
+        parse_timestamps(["2024-01-01 00:00:00"], layout="rfc2822")
@@ -0,0 +1,193 @@
+# ai_file_agent/timeline.py
+
+import heapq
+import logging
+import os
+from collections import deque
+from datetime import datetime, timezone
+from typing import Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple, Union
+
+from file_utils import (
+    STREAM_SAMPLE_BYTES,
+    detect_stream_format,
+    extract_template,
+    iter_normalized_entries,
+    open_log_stream,
+)
+from search_index import entry_matches, parse_query
+from sketches import SKETCH_CAPACITY, HeavyHitters
+from timestamps import ERROR_LEVELS, NAT, entry_level, parse_timestamps, timestamp_column
+
+logger = logging.getLogger(__name__)
+
+# Entries whose timestamps are parsed together (one vectorized parse_timestamps call)
+TIMELINE_BATCH = 1000
+# Only these levels take part in correlation by default; info/debug chatter would drown the signal
+NOTABLE_LEVELS = frozenset(ERROR_LEVELS | {"warning", "warn"})
+# Events and pairs buffered before they are counted in the sketches
+_FLUSH_EVERY = 10_000
+# Separates the parts of the string keys counted in the sketches
+_SEP = "\x1f"
+
+
+class TimelineEvent(NamedTuple):
+    epoch_us: int   # merge key: the entry's timestamp, never behind the previous entry of its source
+    parsed: bool    # False when the entry had no readable timestamp and inherits the previous one
+    source: str
+    log_format: str
+    seq: int        # position in its source, from 1
+    entry: Union[Dict[str, str], str]
+    template: str
+    level: str
+
+    @property
+    def time(self) -> Optional[str]:
+        if self.epoch_us == NAT:
+            return None
+        return datetime.fromtimestamp(self.epoch_us / 1_000_000, tz=timezone.utc).isoformat()
+
+
+class TimelineSource:
+    """
+    One log file as a stream of TimelineEvents, normalized with the format
+    detected for this file alone (so an Apache, a MySQL and a Laravel log can
+    be merged with each other).
+
+    Timestamps are parsed in batches. Continuation entries and entries without
+    a readable timestamp take the previous entry's, and an entry stamped
+    earlier than the one before it is merged at the earlier one's time, so
+    every source is sorted as the k-way merge requires. Iterate once; the
+    counters (and `error`, if reading failed) are set as it goes.
+    """
+
+    def __init__(self, file_path: str, name: Optional[str] = None, query: Optional[str] = None,
+                 default_year: Optional[int] = None):
+        self.file_path = file_path
+        self.name = name or os.path.basename(file_path)
+        self.terms = parse_query(query) if query else None
+        # Syslog stamps carry no year; assume the one the file was last written in
+        self.default_year = default_year or datetime.fromtimestamp(os.path.getmtime(file_path), tz=timezone.utc).year
+        self.log_format: Optional[str] = None
+        self.entries = 0
+        self.matched = 0
+        self.error: Optional[str] = None
+
+    def __iter__(self) -> Iterator[TimelineEvent]:
+        try:
+            with open_log_stream(self.file_path) as stream:
+                sample = stream.read(STREAM_SAMPLE_BYTES)
+                stream.seek(0)
+                self.log_format, pattern, structured = detect_stream_format(sample)
+                batch: List[Union[Dict[str, str], str]] = []
+                last = NAT
+                for entry in iter_normalized_entries(stream, pattern, structured):
+                    batch.append(entry)
+                    if len(batch) >= TIMELINE_BATCH:
+                        last = yield from self._events(batch, last)
+                        batch = []
+                yield from self._events(batch, last)
+        except Exception as e:
+            logger.error(f"Failed to read {self.file_path} for the timeline: {e}")
+            self.error = str(e)
+
+    def _events(self, batch: List[Union[Dict[str, str], str]], last: int) -> Iterator[TimelineEvent]:
+        """Yields the batch's events and returns the merge key of the last one."""
+        epochs = parse_timestamps(timestamp_column(batch), log_format=self.log_format, unit="us",
+                                  default_year=self.default_year).tolist()
+        for entry, epoch in zip(batch, epochs):
+            self.entries += 1
+            parsed = epoch != NAT
+            last = max(last, epoch) if parsed else last
+            if self.terms is not None and not entry_matches(entry, self.terms):
+                continue
+            self.matched += 1
+            yield TimelineEvent(last, parsed, self.name, self.log_format, self.entries, entry,
+                                extract_template(entry), entry_level(entry))
+        return last
+
+
+def merge_timeline(sources: Iterable[Iterable[TimelineEvent]]) -> Iterator[TimelineEvent]:
+    """
+    Lazily merges time-sorted sources into one timeline (k-way heap merge).
+    Only the current event of each source is held; events with the same
+    timestamp keep the order of `sources`.
+    """
+    return heapq.merge(*sources, key=lambda event: event.epoch_us)
+
+
+class Correlation(NamedTuple):
+    before_source: str
+    before_template: str
+    after_source: str
+    after_template: str
+    count: int       # "after" events preceded by "before" within the window (upper bound)
+    min_count: int   # guaranteed lower bound of `count`
+    after_total: int  # occurrences of "after" (upper bound)
+
+    @property
+    def confidence(self) -> float:
+        """Share of the "after" events that had a "before" event within the window before them."""
+        return min(1.0, self.count / self.after_total) if self.after_total else 0.0
+
+
+class CoOccurrence:
+    """
+    Counts, over a merged timeline, how often a template of one source is
+    followed within `window_seconds` by a template of another source
+    ("MySQL warning X precedes Laravel error Y").
+
+    Only the events inside the window are held (and only one per distinct
+    source and template is compared). Event and pair counts go to fixed-size
+    HeavyHitters sketches, so memory does not grow with the timeline.
+    Each "after" event counts a given "before" at most once.
+    Pass `levels=None` to correlate every event regardless of level.
+    """
+
+    def __init__(self, window_seconds: float = 60, levels: Optional[Iterable[str]] = NOTABLE_LEVELS,
+                 capacity: int = SKETCH_CAPACITY):
+        self.window_us = int(window_seconds * 1_000_000)
+        self.levels: Optional[Set[str]] = set(levels) if levels is not None else None
+        self.events = HeavyHitters(capacity)
+        self.pairs = HeavyHitters(capacity)
+        self._window: Deque[Tuple[int, str]] = deque()
+        # Distinct "source<sep>template" keys in the window, with how many times each is there
+        self._present: Dict[str, int] = {}
+        self._pending_events: List[str] = []
+        self._pending_pairs: List[str] = []
+
+    def add(self, event: TimelineEvent) -> None:
+        if event.epoch_us == NAT or (self.levels is not None and event.level not in self.levels):
+            return
+        while self._window and self._window[0][0] < event.epoch_us - self.window_us:
+            _, expired = self._window.popleft()
+            self._present[expired] -= 1
+            if not self._present[expired]:
+                del self._present[expired]
+
+        key = f"{event.source}{_SEP}{event.template}"
+        own_prefix = f"{event.source}{_SEP}"
+        self._pending_pairs.extend(f"{prior}{_SEP}{key}" for prior in self._present
+                                   if not prior.startswith(own_prefix))
+        self._pending_events.append(key)
+        self._window.append((event.epoch_us, key))
+        self._present[key] = self._present.get(key, 0) + 1
+        if len(self._pending_events) >= _FLUSH_EVERY or len(self._pending_pairs) >= _FLUSH_EVERY:
+            self._flush()
+
+    def _flush(self) -> None:
+        self.events.update(self._pending_events)
+        self.pairs.update(self._pending_pairs)
+        self._pending_events = []
+        self._pending_pairs = []
+
+    def top(self, n: int = 20) -> List[Correlation]:
+        """The `n` most frequent cross-source pairs, most frequent first."""
+        self._flush()
+        correlations = []
+        for hitter in self.pairs.top(n):
+            before_source, before_template, after_source, after_template = hitter.item.split(_SEP)
+            after_total = self.events.estimate(f"{after_source}{_SEP}{after_template}")
+            correlations.append(Correlation(before_source, before_template, after_source, after_template,
+                                            hitter.count, hitter.min_count, after_total))
+        return correlations
+
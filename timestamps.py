@@ -0,0 +1,330 @@
+# ai_file_agent/timestamps.py
+
+import logging
+import re
+from collections import Counter
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Marks values that could not be parsed in the int64 epoch arrays
+NAT = np.iinfo(np.int64).min
+
+# Fixed-width timestamp layouts. Offsets are relative to the first character
+# after an optional leading "[".
+#   iso:    2024-03-17T14:50:24.028780Z / 2022-11-02 14:14:09
+#   slash:  2024/03/17 14:50:24                      (nginx)
+#   apache: Sat Jun 07 00:00:22.712954 2025
+#   syslog: Jun  7 00:00:22                          (no year)
+LAYOUT_BY_FORMAT = {
+    "laravel": "iso",
+    "asterisk": "iso",
+    "php": "iso",
+    "mysql": "iso",
+    "docker": "iso",
+    "default": "iso",
+    "nginx": "slash",
+    "apache": "apache",
+    "syslog": "syslog",
+}
+_LAYOUT_PATTERNS = [
+    ("iso", re.compile(r"\[?\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}")),
+    ("slash", re.compile(r"\[?\d{4}/\d{2}/\d{2} \d{2}:\d{2}:\d{2}")),
+    ("apache", re.compile(r"\[?[A-Za-z]{3} [A-Za-z]{3} [ \d]\d \d{2}:\d{2}:\d{2}(?:\.\d+)? \d{4}")),
+    ("syslog", re.compile(r"\[?[A-Za-z]{3} [ \d]\d \d{2}:\d{2}:\d{2}")),
+]
+# Bytes of each value looked at; enough for every layout above including the bracket
+_WIDTH = 32
+
+_MONTHS = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+_MONTH_KEYS = np.array([(ord(m[0]) << 16) | (ord(m[1]) << 8) | ord(m[2]) for m in _MONTHS], dtype=np.int64)
+_MONTH_ORDER = np.argsort(_MONTH_KEYS)
+_UNITS = {"s": 1, "ms": 1_000, "us": 1_000_000}
+
+BUCKET_SECONDS = {"minute": 60, "hour": 3600, "day": 86400}
+
+
+def detect_layout(values: Sequence[Optional[str]], log_format: Optional[str] = None) -> Optional[str]:
+    """Picks the layout for a column from its format name, else from its first non-empty value."""
+    if log_format in LAYOUT_BY_FORMAT:
+        return LAYOUT_BY_FORMAT[log_format]
+    for value in values:
+        if value:
+            for layout, pattern in _LAYOUT_PATTERNS:
+                if pattern.match(value):
+                    return layout
+            return None
+    return None
+
+
+def _days_from_civil(year: np.ndarray, month: np.ndarray, day: np.ndarray) -> np.ndarray:
+    """Days since 1970-01-01 for proleptic Gregorian dates (H. Hinnant's algorithm), vectorized."""
+    year = year - (month <= 2)
+    era = np.floor_divide(year, 400)
+    yoe = year - era * 400
+    mp = (month + 9) % 12
+    doy = (153 * mp + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    return era * 146097 + doe - 719468
+
+
+def parse_timestamps(values: Sequence[Optional[str]], layout: Optional[str] = None,
+                     log_format: Optional[str] = None, unit: str = "s",
+                     default_year: int = 1970) -> np.ndarray:
+    """
+    Parses a whole column of timestamp strings into an int64 epoch array.
+
+    The column is copied once into a fixed-width byte matrix and every field
+    is computed with array arithmetic on digit offsets, so there is no
+    per-value Python parsing. Values may carry trailing text (raw entries
+    can be passed as-is, the timestamp only has to lead). Timestamps are read
+    as UTC. Unparseable values become `NAT`.
+
+    Parameters:
+    - values: Timestamp strings (None allowed).
+    - layout: "iso", "slash", "apache" or "syslog"; detected when omitted.
+    - log_format: Format name from LOG_PATTERNS, used to pick the layout.
+    - unit: "s", "ms" or "us".
+    - default_year: Year used for syslog stamps, which carry none.
+    """
+    if unit not in _UNITS:
+        raise ValueError(f"Unsupported unit: {unit}")
+
+    n = len(values)
+    if n == 0:
+        return np.empty(0, dtype=np.int64)
+
+    layout = layout or detect_layout(values, log_format)
+    if layout is None:
+        logger.warning("Could not determine the timestamp layout; returning NaT for every value.")
+        return np.full(n, NAT, dtype=np.int64)
+
+    # A fixed-width unicode array is a plain copy of the strings (no encoding); viewed as
+    # a code point matrix, each character position is one column. Longer values are truncated.
+    raw = np.array([v or "" for v in values], dtype=f"U{_WIDTH}")
+    m = raw.view(np.uint32).reshape(n, _WIDTH)
+    bracketed = m[:, 0] == ord("[")
+    if bracketed.all():
+        m = m[:, 1:]
+    elif bracketed.any():
+        m = np.where(bracketed[:, None], np.roll(m, -1, axis=1), m)
+    # One byte per character: every character that matters is ASCII, anything else is
+    # clamped to 255 so it can never pass for a digit or a month name.
+    # Stored transposed so each character position is one contiguous row.
+    c = np.ascontiguousarray(np.minimum(m, 255).astype(np.uint8).T)
+    # Unsigned wrap-around makes every non-digit (including ' ' and '.') exceed 9
+    d = c - np.uint8(ord("0"))
+    is_digit = d <= 9
+    valid = np.ones(n, dtype=bool)
+
+    def char(offset: int) -> np.ndarray:
+        return c[offset]
+
+    def number(offset: int, length: int, space_is_zero: bool = False) -> np.ndarray:
+        nonlocal valid
+        result = np.zeros(n, dtype=np.int32)
+        for i in range(offset, offset + length):
+            digit = d[i]
+            ok = is_digit[i]
+            if space_is_zero:
+                blank = c[i] == ord(" ")
+                digit = np.where(blank, 0, digit)
+                ok = ok | blank
+            valid &= ok
+            result *= 10
+            result += digit
+        return result
+
+    def month_name(offset: int) -> np.ndarray:
+        nonlocal valid
+        letters = [char(i).astype(np.int64) | 0x20 for i in range(offset, offset + 3)]
+        key = (letters[0] << 16) | (letters[1] << 8) | letters[2]
+        pos = np.searchsorted(_MONTH_KEYS[_MONTH_ORDER], key)
+        pos = np.clip(pos, 0, 11)
+        found = _MONTH_KEYS[_MONTH_ORDER][pos] == key
+        valid &= found
+        return _MONTH_ORDER[pos] + 1
+
+    def fraction(dot_offset: int) -> np.ndarray:
+        """Microseconds from up to six digits after a '.', zero when there is none."""
+        still_digits = char(dot_offset) == ord(".")
+        micros = np.zeros(n, dtype=np.int32)
+        scale = 100_000
+        # Only the run of digits right after the dot counts ("22.7 2025" is 700000us)
+        for i in range(dot_offset + 1, dot_offset + 7):
+            still_digits &= is_digit[i]
+            micros += np.where(still_digits, d[i] * np.int32(scale), 0)
+            scale //= 10
+        return micros
+
+    if layout in ("iso", "slash"):
+        year, month, day = number(0, 4), number(5, 2), number(8, 2)
+        hour, minute, second = number(11, 2), number(14, 2), number(17, 2)
+        micros = fraction(19)
+    elif layout == "apache":
+        month, day = month_name(4), number(8, 2, space_is_zero=True)
+        hour, minute, second = number(11, 2), number(14, 2), number(17, 2)
+        micros = fraction(19)
+        has_fraction = char(19) == ord(".")
+        # The year follows the fraction when there is one: "...:22.712954 2025" vs "...:22 2025"
+        fields_valid = valid
+        valid = np.ones(n, dtype=bool)
+        year_with = number(27, 4)
+        with_valid = valid
+        valid = np.ones(n, dtype=bool)
+        year_without = number(20, 4)
+        valid = fields_valid & np.where(has_fraction, with_valid, valid)
+        year = np.where(has_fraction, year_with, year_without)
+    elif layout == "syslog":
+        month, day = month_name(0), number(4, 2, space_is_zero=True)
+        hour, minute, second = number(7, 2), number(10, 2), number(13, 2)
+        year = np.full(n, default_year, dtype=np.int64)
+        micros = np.zeros(n, dtype=np.int64)
+    else:
+        raise ValueError(f"Unknown timestamp layout: {layout}")
+
+    valid &= (month >= 1) & (month <= 12) & (day >= 1) & (day <= 31)
+    valid &= (hour <= 23) & (minute <= 59) & (second <= 60)
+
+    days = _days_from_civil(year, month, day).astype(np.int64)
+    seconds = days * 86400 + hour * 3600 + minute * 60 + second
+    scale = _UNITS[unit]
+    epochs = seconds * scale + micros // (1_000_000 // scale)
+    return np.where(valid, epochs, NAT)
+
+
+def timestamp_column(entries: Sequence[Union[Dict[str, str], str]]) -> List[Optional[str]]:
+    """
+    Timestamp strings of normalized entries: the `timestamp` group of dict
+    entries, or the leading text of raw entries (which start with it).
+    """
+    return [
+        (entry.get("timestamp") if isinstance(entry, dict) else entry[:_WIDTH])
+        for entry in entries
+    ]
+
+
+class Histogram(NamedTuple):
+    bucket_seconds: int
+    templates: np.ndarray      # distinct template strings, in order of first appearance
+    template_ids: np.ndarray   # per non-empty cell: index into `templates`
+    bucket_starts: np.ndarray  # per non-empty cell: bucket start, epoch seconds
+    counts: np.ndarray         # per non-empty cell: number of entries
+
+
+def histogram(epochs: np.ndarray, templates: Sequence[str], bucket: str = "minute",
+              mask: Optional[np.ndarray] = None, weights: Optional[np.ndarray] = None) -> Histogram:
+    """
+    Counts entries per (template, time bucket), as sparse cells sorted by
+    template (first appearance) then time.
+
+    Parameters:
+    - epochs: int64 epoch seconds from `parse_timestamps`; NAT rows are skipped.
+    - templates: Template of every entry (same length as `epochs`).
+    - bucket: "minute", "hour" or "day".
+    - mask: Optional boolean array selecting the entries to count (e.g. errors only).
+    - weights: Optional count per entry (default 1), e.g. to re-bucket an existing histogram.
+    """
+    if bucket not in BUCKET_SECONDS:
+        raise ValueError(f"Unsupported bucket: {bucket}")
+    size = BUCKET_SECONDS[bucket]
+
+    keep = epochs != NAT
+    if mask is not None:
+        keep &= mask
+    # Factorize with a dict: hashing is much cheaper than sorting millions of strings
+    codes: Dict[str, int] = {}
+    template_codes = np.fromiter((codes.setdefault(t, len(codes)) for t in templates),
+                                 dtype=np.int64, count=len(templates))
+    template_values = np.array(list(codes), dtype=object)
+    template_codes = template_codes[keep]
+    buckets = epochs[keep] // size
+    if weights is not None:
+        weights = np.asarray(weights)[keep]
+
+    if buckets.size == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return Histogram(size, template_values, empty, empty, empty)
+
+    first = buckets.min()
+    span = buckets.max() - first + 1
+    keys = template_codes.astype(np.int64) * span + (buckets - first)
+    if weights is None:
+        cells, counts = np.unique(keys, return_counts=True)
+    else:
+        cells, inverse = np.unique(keys, return_inverse=True)
+        counts = np.bincount(inverse, weights=weights, minlength=len(cells)).astype(np.int64)
+    return Histogram(size, template_values, cells // span, (cells % span + first) * size, counts)
+
+
+_LEVEL_RE = re.compile(r"\b(emergency|alert|critical|error|warning|warn|notice|info|debug)\b", re.IGNORECASE)
+ERROR_LEVELS = {"emergency", "alert", "critical", "error", "fatal"}
+
+
+def entry_level(entry: Union[Dict[str, str], str]) -> str:
+    """Lower-case level of an entry (field, or word in a raw entry's first line); "" when there is none."""
+    if isinstance(entry, dict):
+        level = entry.get("level") or entry.get("log_level") or ""
+    else:
+        match = _LEVEL_RE.search(entry.split("\n", 1)[0])
+        level = match.group(1) if match else ""
+    return level.rsplit(".", 1)[-1].lower()
+
+
+def error_mask(entries: Sequence[Union[Dict[str, str], str]]) -> np.ndarray:
+    """True for entries whose level is error or worse."""
+    levels = [entry_level(entry) for entry in entries]
+    return np.isin(np.array(levels, dtype=object), list(ERROR_LEVELS))
+
+
+class ErrorRate:
+    """
+    Error counts per (template, minute), accumulated batch by batch so a
+    streamed file never needs all its timestamps in memory at once. Memory
+    grows with templates x minutes, not with entries; `histogram()`
+    re-buckets the counts to minutes, hours or days.
+    """
+
+    def __init__(self, log_format: Optional[str] = None):
+        self.log_format = log_format
+        self.cells: Counter = Counter()
+        self.errors = 0
+
+    def add(self, entries: Sequence[Union[Dict[str, str], str]], templates: Sequence[str]) -> None:
+        errors = error_mask(entries)
+        count = int(errors.sum())
+        if not count:
+            return
+        self.errors += count
+        rows = np.flatnonzero(errors)
+        error_entries = [entries[i] for i in rows]
+        epochs = parse_timestamps(timestamp_column(error_entries), log_format=self.log_format)
+        minutes = histogram(epochs, [templates[i] for i in rows], "minute")
+        for template, start, cell_count in zip(minutes.templates[minutes.template_ids].tolist(),
+                                               minutes.bucket_starts.tolist(), minutes.counts.tolist()):
+            self.cells[(template, start)] += cell_count
+
+    def histogram(self, bucket: str = "minute") -> Histogram:
+        templates = [template for template, _ in self.cells]
+        starts = np.fromiter((start for _, start in self.cells), dtype=np.int64, count=len(self.cells))
+        counts = np.fromiter(self.cells.values(), dtype=np.int64, count=len(self.cells))
+        return histogram(starts, templates, bucket, weights=counts)
+
+    def columns(self) -> Dict[str, List[Any]]:
+        """The minute cells as columns, e.g. to store them with a snapshot."""
+        return {
+            "template": [template for template, _ in self.cells],
+            "minute": [start for _, start in self.cells],
+            "count": list(self.cells.values()),
+        }
+
+    @classmethod
+    def from_rows(cls, rows: Sequence[Dict[str, Any]], errors: int = 0) -> "ErrorRate":
+        """Rebuilds the counts from the rows of `columns()` (as read back from a snapshot)."""
+        error_rate = cls()
+        error_rate.errors = errors
+        for row in rows:
+            error_rate.cells[(row["template"], row["minute"])] += row["count"]
+        return error_rate